@@ -1,5 +1,3 @@
-import os
-import pickle
 from threading import Thread
 from kivy.app import App
 from kivy.properties import StringProperty, BooleanProperty
@@ -13,14 +11,17 @@ from kivy.uix.popup import Popup
 from kivy.uix.progressbar import ProgressBar
 from kivy.utils import get_color_from_hex
 from kivy.metrics import dp
-from OSRSScraper import OSRSScraper
-from utils import generate_item_suggestions, train_model, format_suggestions, save_model, load_model
+from ingest_service import IngestService
+from utils import train_model, format_budget_sweep, format_suggestions
+from model_registry import get_registry
+from suggestion_cache import SuggestionCache
 from config import Config
 from kivy.clock import Clock
 
 class OSRSGrandExchangeApp(App):
     suggestions_text = StringProperty("")
     use_rl = BooleanProperty(False)
+    model_registry = get_registry(Config.MODEL_FILE)
 
     def build(self):
         print("Building the app layout...")
@@ -106,6 +107,14 @@ class OSRSGrandExchangeApp(App):
         scroll_view.add_widget(scroll_layout)
         return scroll_view
 
+    def on_start(self):
+        self.ingest_service = IngestService(Config).start()
+        # Repeat clicks between snapshots are answered from the cache.
+        self.suggestion_cache = SuggestionCache(self.ingest_service.store, self.model_registry, feature_engine=self.ingest_service.feature_engine)
+
+    def on_stop(self):
+        self.ingest_service.stop()
+
     def on_use_rl_switch(self, instance, value):
         print(f"RL switch toggled: {value}")
         self.use_rl = value
@@ -128,34 +137,27 @@ class OSRSGrandExchangeApp(App):
     def fetch_prices_and_generate_suggestions_thread(self, starting_gold):
         try:
             print("Fetching item prices...")
-            scraper = OSRSScraper(Config)
-            try:
-                items_data = scraper.scrape_data()
-                self.progress_bar.value = 50
-            except Exception as e:
-                print(f"Error fetching item data: {e}")
-                self.show_error_popup("An error occurred while fetching item data.")
-                return
+            # Snapshots come from the ingest service; clicks never trigger a scrape.
+            items_data = self.ingest_service.wait_for_snapshot(timeout=Config.SNAPSHOT_WAIT_TIMEOUT)
+            self.progress_bar.value = 50
 
             if items_data is not None and len(items_data) > 0:
                 print("Generating item suggestions...")
-                model_file = "model.pkl"
-                if os.path.exists(model_file):
-                    model = load_model(model_file)
-                    if model is None:
-                        print("Failed to load the model. Using default suggestions.")
-                else:
-                    print("Model file not found. Using default suggestions.")
-                    model = None
+                model = self.model_registry.get(kind="regressor")
+                if model is None:
+                    print("No trained model available. Using default suggestions.")
 
-                suggestions = generate_item_suggestions(items_data, starting_gold, model)
+                if len(starting_gold) > 1:
+                    results = self.suggestion_cache.sweep_latest(starting_gold)
+                    self.progress_bar.value = 80
+                    self.suggestions_text = f"Budget Sensitivity:\n{format_budget_sweep(starting_gold, results)}"
+                    return
+                _, suggestions = self.suggestion_cache.suggest_latest(starting_gold[0])
                 self.progress_bar.value = 80
 
                 if suggestions:
                     print("Item suggestions generated.")
                     self.suggestions_text = f"Item Suggestions:\n{format_suggestions(suggestions)}"
-                    if model is not None:
-                        save_model(model, model_file)
                 else:
                     print("No item suggestions found.")
                     self.suggestions_text = "No item suggestions found. Please check the input data and model."
@@ -180,33 +182,32 @@ class OSRSGrandExchangeApp(App):
     def train_model_thread(self):
         try:
             print("Fetching item data for training...")
-            scraper = OSRSScraper(Config)
-            try:
-                items_data = scraper.scrape_data()
-                self.progress_bar.value = 50
-            except Exception as e:
-                print(f"Error fetching item data: {e}")
-                self.show_error_popup("An error occurred while fetching item data.")
-                return
+            # Snapshots come from the ingest service; clicks never trigger a scrape.
+            items_data = self.ingest_service.wait_for_snapshot(timeout=Config.SNAPSHOT_WAIT_TIMEOUT)
+            self.progress_bar.value = 50
 
             if items_data is not None and len(items_data) > 0:
                 print("Training the model...")
-                model_file = "model.pkl"
                 if self.use_rl:
                     # Train the reinforcement learning model
                     from osrs_rl.trainer import OSRSTrainer
                     trainer = OSRSTrainer(items_data)
                     trainer.train()
                     model = trainer.agent
+                    kind = "rl"
                 else:
                     # Train the normal model
-                    model = train_model(items_data, epochs=20)
+                    model = train_model(items_data, feature_engine=self.ingest_service.feature_engine)
+                    kind = "regressor"
 
                 self.progress_bar.value = 80
-                with open(model_file, "wb") as file:
-                    pickle.dump(model, file)
+                if model is None:
+                    print("Model training failed.")
+                    self.suggestions_text = "Model training failed. The previous model is still in use."
+                    return
+                metadata = self.model_registry.publish(model, kind=kind)
                 print("Model training completed.")
-                self.suggestions_text = "Model training completed. The trained model has been saved."
+                self.suggestions_text = f"Model training completed. Model version {metadata['version']} has been saved."
             else:
                 print("Error fetching item prices or item mapping.")
                 self.suggestions_text = "Error fetching item prices or item mapping. Please check the data source."
@@ -219,10 +220,12 @@ class OSRSGrandExchangeApp(App):
             self.train_button.disabled = False
 
     def validate_starting_gold(self):
+        # One amount, or several separated by commas or spaces for a
+        # budget-sensitivity table. Returns the list of amounts.
         print("Validating starting gold input...")
         try:
-            starting_gold = int(self.starting_gold_input.text)
-            if starting_gold > 0:
+            starting_gold = [int(value) for value in self.starting_gold_input.text.replace(",", " ").split()]
+            if starting_gold and all(value > 0 for value in starting_gold):
                 self.starting_gold_error.text = ""
                 return starting_gold
             else:
@@ -0,0 +1,256 @@
+import time
+
+import numpy as np
+
+from config import Config
+
+METHODS = ("greedy", "exact")
+
+
+class Allocation:
+    # A basket: rows (indices into the arrays passed to allocate) with the
+    # quantity to buy of each, ordered by total profit.
+
+    def __init__(self, rows, quantities, profit, cost, method):
+        order = np.argsort(-(profit[rows] * quantities), kind="stable") if len(rows) else rows
+        self.rows = rows[order]
+        self.quantities = quantities[order]
+        self.item_profit = profit[self.rows] * self.quantities
+        self.item_cost = cost[self.rows] * self.quantities
+        self.method = method
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def total_profit(self):
+        return float(self.item_profit.sum())
+
+    @property
+    def total_cost(self):
+        return float(self.item_cost.sum())
+
+
+def quantity_bounds(snapshot, starting_gold, max_quantity=1000, volume_share=None, horizon=None, max_share=None):
+    # Upper bound on the quantity of each item: its buy limit, what the gold
+    # buys, the per-item cap, a share of the volume traded over the holding
+    # horizon (on the thinner side of the book), and optionally a share of
+    # the capital. volume_share=0 disables the liquidity cap.
+    volume_share = Config.ALLOCATION_VOLUME_SHARE if volume_share is None else volume_share
+    horizon = Config.ALLOCATION_HORIZON if horizon is None else horizon
+    buy_price = snapshot.column("low_price")
+    budget = starting_gold if max_share is None else starting_gold * max_share
+    affordable = np.where(buy_price > 0, budget // np.maximum(buy_price, 1), 0)
+    upper = np.minimum(np.minimum(snapshot.column("buy_limit"), affordable), max_quantity)
+    if volume_share:
+        windows = horizon / Config.FIVE_MINUTE_POLL_INTERVAL
+        traded = np.minimum(snapshot.column("high_volume"), snapshot.column("low_volume"))
+        upper = np.minimum(upper, np.floor(traded * windows * volume_share))
+    return np.maximum(upper, 0)
+
+
+def _greedy_fill(profit, cost, upper, capital):
+    # Fractional-knapsack order (profit per gold spent), rounded down: take
+    # every item whole while the gold lasts, then spend what is left on the
+    # next items that still fit.
+    order = np.argsort(-(profit / cost), kind="stable")
+    quantities = np.zeros(len(profit))
+    spend = np.cumsum(upper[order] * cost[order])
+    whole = np.searchsorted(spend, capital, side="right")
+    quantities[order[:whole]] = upper[order[:whole]]
+    remaining = capital - (spend[whole - 1] if whole else 0.0)
+    rest = order[whole:]
+    cheapest_after = np.minimum.accumulate(cost[rest][::-1])[::-1]
+    for position, row in enumerate(rest):
+        if remaining < cheapest_after[position]:
+            break
+        if remaining < cost[row]:
+            continue
+        quantities[row] = min(upper[row], remaining // cost[row])
+        remaining -= quantities[row] * cost[row]
+    return quantities
+
+
+def _greedy_items(profit, cost, upper, capital, max_items):
+    # At most max_items items. Two cheap baskets, keeping the better one:
+    # repeatedly take the item that adds the most profit with the gold left,
+    # or refill the max_items largest contributors of the unconstrained
+    # greedy basket in profit-per-gold order.
+    quantities = np.zeros(len(profit))
+    available = np.ones(len(profit), dtype=bool)
+    remaining = capital
+    for _ in range(max_items):
+        quantity = np.minimum(upper, remaining // cost)
+        gain = np.where(available, profit * quantity, 0.0)
+        row = int(np.argmax(gain))
+        if gain[row] <= 0:
+            break
+        quantities[row] = quantity[row]
+        available[row] = False
+        remaining -= quantity[row] * cost[row]
+
+    filled = _greedy_fill(profit, cost, upper, capital)
+    if np.count_nonzero(filled) > max_items:
+        largest = np.argsort(-(profit * filled), kind="stable")[:max_items]
+        filled = np.zeros(len(profit))
+        filled[largest] = _greedy_fill(profit[largest], cost[largest], upper[largest], capital)
+    return filled if profit @ filled > profit @ quantities else quantities
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _branch_and_bound(profit, cost, lower, upper, capital, value, used, max_items, best_value, deadline):
+    # Depth-first search over the core items in profit-per-gold order, with
+    # the LP relaxation (and, under max_items, the best remaining standalone
+    # profits) as the bound. Quantities are tried from the largest down; the
+    # bound only falls as a quantity shrinks, so a branch stops at the first
+    # quantity that cannot win. Returns the best quantities found, or None
+    # if nothing beat best_value.
+    order = np.argsort(-(profit / cost), kind="stable")
+    p, c = profit[order].tolist(), cost[order].tolist()
+    lo, hi = lower[order].tolist(), upper[order].tolist()
+    count = len(p)
+    x = lo[:]
+    best = None
+    capital -= sum(ci * li for ci, li in zip(c, lo))
+    value += sum(pi * li for pi, li in zip(p, lo))
+    used += sum(1 for li in lo if li > 0)
+    epsilon = 1e-9 * max(best_value, 1.0)
+    checks = 0
+
+    def bound(i, cap):
+        total = 0.0
+        for j in range(i, count):
+            room = hi[j] - lo[j]
+            if room * c[j] <= cap:
+                total += room * p[j]
+                cap -= room * c[j]
+            else:
+                return total + cap / c[j] * p[j]
+        return total
+
+    def cardinality_bound(i, cap, slots):
+        gains = sorted((min(hi[j] - lo[j], cap // c[j]) * p[j] for j in range(i, count) if lo[j] == 0), reverse=True)
+        extra = sum((hi[j] - lo[j]) * p[j] for j in range(i, count) if lo[j] > 0)
+        return sum(gains[:slots]) + extra
+
+    def search(i, cap, value, used):
+        nonlocal best, best_value, checks
+        if value > best_value + epsilon:
+            best_value, best = value, x[:]
+        if i == count:
+            return
+        checks += 1
+        if checks % 256 == 0 and time.perf_counter() > deadline:
+            raise _Timeout()
+        slots = None if max_items is None else max_items - used
+        top = min(hi[i] - lo[i], cap // c[i])
+        if slots is not None and slots <= 0 and lo[i] == 0:
+            top = 0
+        for extra in range(int(top), -1, -1):
+            opened = 1 if extra > 0 and lo[i] == 0 else 0
+            rest = cap - extra * c[i]
+            gained = value + extra * p[i]
+            if gained + bound(i + 1, rest) <= best_value + epsilon:
+                break
+            if slots is not None and gained + cardinality_bound(i + 1, rest, slots - opened) <= best_value + epsilon:
+                continue
+            x[i] = lo[i] + extra
+            search(i + 1, rest, value + extra * p[i], used + opened)
+        x[i] = lo[i]
+
+    try:
+        search(0, capital, value, used)
+    except _Timeout:
+        print("Allocation search ran out of time; using the best basket found.")
+    if best is None:
+        return None
+    quantities = np.zeros(len(profit))
+    quantities[order] = best
+    return quantities
+
+
+def _exact(profit, cost, upper, capital, max_items, greedy, time_limit):
+    # Reduced-cost fixing around the LP solution, then branch and bound on
+    # what is left. With lam the profit per gold of the LP break item, any
+    # basket that beats the greedy one satisfies
+    #     sum(|profit - lam * cost| * |q - q_lp|) < LP bound - greedy profit
+    # which pins nearly every item to its LP quantity. The LP bound also
+    # holds under max_items, so the same fixing applies there.
+    deadline = time.perf_counter() + time_limit
+    order = np.argsort(-(profit / cost), kind="stable")
+    spend = np.cumsum(upper[order] * cost[order])
+    whole = np.searchsorted(spend, capital, side="right")
+    lp = np.zeros(len(profit))
+    lp[order[:whole]] = upper[order[:whole]]
+    if whole == len(order):
+        if max_items is None or np.count_nonzero(lp) <= max_items:
+            return lp  # everything fits: the LP solution is integral
+        brk, lam, bound = None, 0.0, profit @ lp
+    else:
+        brk = order[whole]
+        lam = profit[brk] / cost[brk]
+        bound = profit @ lp + (capital - (spend[whole - 1] if whole else 0.0)) * lam
+    best_value = profit @ greedy
+    gap = bound - best_value + 1e-9 * max(bound, 1.0)
+
+    reduced = np.abs(profit - lam * cost)
+    slack = np.floor(np.divide(gap, reduced, out=np.full(len(profit), np.inf), where=reduced > 0))
+    lower = np.clip(lp - slack, 0, upper)
+    upper_core = np.clip(lp + slack, 0, upper)
+    if brk is not None:
+        lower[brk], upper_core[brk] = 0, upper[brk]
+    core = np.flatnonzero(lower < upper_core)
+    fixed = np.flatnonzero(lower == upper_core)
+    used = np.count_nonzero(lower[fixed])
+    if max_items is not None and used > max_items:
+        return greedy  # no basket within max_items can beat the greedy one
+    solved = _branch_and_bound(
+        profit[core], cost[core], lower[core], upper_core[core],
+        capital - cost[fixed] @ lower[fixed], profit[fixed] @ lower[fixed], used,
+        max_items, best_value, deadline
+    )
+    if solved is None:
+        return greedy
+    quantities = np.zeros(len(profit))
+    quantities[fixed] = lower[fixed]
+    quantities[core] = solved
+    return quantities
+
+
+def allocate(profit, cost, upper, capital, max_items=None, method=None, time_limit=None):
+    # Chooses how many of each item to buy to maximize total profit with
+    # total cost within capital and each quantity within upper. max_items
+    # limits how many distinct items the basket holds.
+    #
+    #   greedy  profit-per-gold order (the fractional knapsack, rounded
+    #           down), or best-gain-first when max_items is set; O(n log n)
+    #   exact   optimal basket: reduced-cost fixing around the LP solution,
+    #           then branch and bound on the few items left; if time_limit
+    #           runs out, the best basket found so far
+    method = method or Config.ALLOCATION_METHOD
+    if method not in METHODS:
+        raise ValueError(f"Unknown allocation method: {method}")
+    profit = np.asarray(profit, dtype=np.float64)
+    cost = np.asarray(cost, dtype=np.float64)
+    upper = np.floor(np.asarray(upper, dtype=np.float64))
+
+    candidates = np.flatnonzero((profit > 0) & (cost > 0) & (upper > 0) & (cost <= capital))
+    if not len(candidates) or (max_items is not None and max_items <= 0):
+        return Allocation(np.zeros(0, dtype=np.int64), np.zeros(0), profit, cost, method)
+    p, c, u = profit[candidates], cost[candidates], upper[candidates]
+
+    if max_items is None:
+        quantities = _greedy_fill(p, c, u, capital)
+    else:
+        quantities = _greedy_items(p, c, u, capital, max_items)
+    if method == "exact":
+        quantities = _exact(
+            p, c, u, capital, max_items, quantities,
+            time_limit if time_limit is not None else Config.ALLOCATION_TIME_LIMIT
+        )
+
+    chosen = np.flatnonzero(quantities > 0)
+    return Allocation(candidates[chosen], quantities[chosen], profit, cost, method)
@@ -0,0 +1,142 @@
+import asyncio
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+
+class ApiError(Exception):
+    pass
+
+
+class OSRSApiClient:
+    def __init__(self, base_url=None, timeout=None, max_retries=None, backoff_base=None, backoff_max=None, pool_size=None):
+        self.base_url = (base_url or Config.API_BASE_URL).rstrip("/")
+        self.timeout = timeout if timeout is not None else Config.REQUEST_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else Config.MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else Config.BACKOFF_BASE
+        self.backoff_max = backoff_max if backoff_max is not None else Config.BACKOFF_MAX
+        pool_size = pool_size if pool_size is not None else Config.HTTP_POOL_SIZE
+
+        # A single pooled, keep-alive session; requests decodes gzip transparently.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": Config.USER_AGENT,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+    def url(self, endpoint):
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def backoff_delay(self, attempt):
+        # Full jitter: uniform in [0, min(max, base * 2**attempt)].
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _check_response(self, response):
+        if response.status_code >= 500 or response.status_code == 429:
+            raise requests.exceptions.HTTPError(f"{response.status_code} for {response.url}", response=response)
+        response.raise_for_status()
+        return response
+
+    def _should_retry(self, error):
+        # Client errors other than rate limiting will not improve on retry.
+        response = getattr(error, "response", None)
+        if response is None:
+            return True
+        return not (400 <= response.status_code < 500 and response.status_code != 429)
+
+    def get(self, endpoint, params=None, headers=None):
+        # Blocking GET with retries. Returns the requests.Response.
+        url = self.url(endpoint)
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                return self._check_response(response)
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                if not self._should_retry(e):
+                    break
+                if attempt + 1 < self.max_retries:
+                    delay = self.backoff_delay(attempt)
+                    print(f"Error fetching {url}: {e}. Retrying in {delay:.2f} seconds...")
+                    time.sleep(delay)
+        raise ApiError(f"Request to {url} failed: {last_error}")
+
+    async def get_async(self, endpoint, params=None, headers=None):
+        url = self.url(endpoint)
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                response = await asyncio.to_thread(
+                    self.session.get, url, params=params, headers=headers, timeout=self.timeout
+                )
+                return self._check_response(response)
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                if not self._should_retry(e):
+                    break
+                if attempt + 1 < self.max_retries:
+                    delay = self.backoff_delay(attempt)
+                    print(f"Error fetching {url}: {e}. Retrying in {delay:.2f} seconds...")
+                    await asyncio.sleep(delay)
+        raise ApiError(f"Request to {url} failed: {last_error}")
+
+    async def get_json_async(self, endpoint, params=None):
+        response = await self.get_async(endpoint, params=params)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ApiError(f"Error parsing data from {self.url(endpoint)}: {e}")
+
+    async def fetch_latest_async(self):
+        return (await self.get_json_async("latest"))["data"]
+
+    async def fetch_5m_async(self):
+        return (await self.get_json_async("5m"))["data"]
+
+    async def fetch_5m_window_async(self):
+        # The /5m data with the timestamp of the window it covers.
+        payload = await self.get_json_async("5m")
+        return payload["data"], payload.get("timestamp")
+
+    async def fetch_mapping_async(self):
+        return await self.get_json_async("mapping")
+
+    async def fetch_all_async(self, include_mapping=True):
+        # Fetch every endpoint concurrently; a failed endpoint yields None
+        # instead of cancelling the others. "5m_timestamp" is the /5m window.
+        tasks = [self.fetch_latest_async(), self.fetch_5m_window_async()]
+        if include_mapping:
+            tasks.append(self.fetch_mapping_async())
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        names = ["latest", "5m", "mapping"]
+        data = {"5m_timestamp": None}
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"Error fetching {name}: {result}")
+                data[name] = None
+            elif name == "5m":
+                data["5m"], data["5m_timestamp"] = result
+            else:
+                data[name] = result
+        return data
+
+    def fetch_all(self, include_mapping=True):
+        return asyncio.run(self.fetch_all_async(include_mapping))
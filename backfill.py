@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import time
+
+from api_client import OSRSApiClient, ApiError
+from config import Config
+from data_manager import DataManager
+from mapping_cache import MappingCache
+from snapshot import GE_TAX_FACTOR
+
+TIMESTEPS = {"5m": 300, "1h": 3600, "6h": 21600}
+
+
+def timeseries_rows(item_id, points):
+    # Converts /timeseries points into price rows using the same taxed
+    # prices as live snapshots, so backfilled and observed ticks line up.
+    rows = []
+    for point in points:
+        average_high_price = point.get("avgHighPrice")
+        average_low_price = point.get("avgLowPrice")
+        rows.append((
+            item_id,
+            int(point["timestamp"]),
+            int(average_high_price * GE_TAX_FACTOR) if average_high_price else None,
+            int(average_low_price * GE_TAX_FACTOR) if average_low_price else None,
+            point.get("highPriceVolume") or 0,
+            point.get("lowPriceVolume") or 0
+        ))
+    return rows
+
+
+class RateLimiter:
+    # Spaces request starts at least 1/rate seconds apart.
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BackfillCheckpoint:
+    # Item ids already loaded, per timestep, persisted as JSON.
+
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+        self.completed = {}
+        try:
+            with open(checkpoint_file) as file:
+                self.completed = {timestep: set(ids) for timestep, ids in json.load(file).items()}
+            print(f"Resuming backfill from checkpoint {checkpoint_file}.")
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            print(f"Error reading backfill checkpoint, starting over: {e}")
+
+    def done(self, timestep):
+        return self.completed.setdefault(timestep, set())
+
+    def mark(self, timestep, item_ids):
+        self.done(timestep).update(item_ids)
+
+    def save(self):
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump({timestep: sorted(ids) for timestep, ids in self.completed.items()}, file)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def clear(self):
+        self.completed = {}
+        try:
+            os.remove(self.checkpoint_file)
+        except FileNotFoundError:
+            pass
+
+
+class Backfiller:
+    def __init__(self, config=Config, api_client=None, data_manager=None, concurrency=None, rate=None,
+                 flush_every=None, checkpoint_file=None):
+        self.config = config
+        self.api_client = api_client or OSRSApiClient(config.API_BASE_URL, pool_size=concurrency or config.BACKFILL_CONCURRENCY)
+        self.data_manager = data_manager or DataManager(config.DB_FILE)
+        self.concurrency = concurrency or config.BACKFILL_CONCURRENCY
+        self.rate = rate if rate is not None else config.BACKFILL_RATE
+        self.flush_every = flush_every or config.BACKFILL_FLUSH_EVERY
+        self.checkpoint = BackfillCheckpoint(checkpoint_file or config.BACKFILL_CHECKPOINT_FILE)
+
+    def item_ids(self):
+        mapping = MappingCache(self.config.MAPPING_CACHE_FILE, self.config.MAPPING_CACHE_TTL).get_mapping(self.api_client)
+        if not mapping:
+            raise RuntimeError("Item mapping is empty (fetch failed and nothing is cached); nothing to backfill.")
+        return sorted(mapping)
+
+    def flush(self, timestep, rows, item_ids):
+        # Rows are committed before the checkpoint, so a crash in between only
+        # re-fetches items whose rows are already (idempotently) stored.
+        if rows:
+            if timestep == "5m":
+                written = self.data_manager.insert_prices_bulk(rows)
+            else:
+                written = self.data_manager.insert_history_bulk(TIMESTEPS[timestep], rows)
+            if written != len(rows):
+                raise RuntimeError("Bulk load failed; checkpoint not advanced.")
+        self.checkpoint.mark(timestep, item_ids)
+        self.checkpoint.save()
+
+    async def _fetch_item(self, timestep, item_id, semaphore, limiter):
+        async with semaphore:
+            await limiter.acquire()
+            payload = await self.api_client.get_json_async("timeseries", params={"timestep": timestep, "id": item_id})
+        return item_id, timeseries_rows(item_id, payload.get("data") or [])
+
+    async def run_async(self, timestep, item_ids):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiter = RateLimiter(self.rate)
+        pending_rows = []
+        pending_ids = []
+        failed = []
+        total_rows = 0
+        start = time.monotonic()
+
+        futures = [self._fetch_item(timestep, item_id, semaphore, limiter) for item_id in item_ids]
+        for number, future in enumerate(asyncio.as_completed(futures), start=1):
+            try:
+                item_id, rows = await future
+            except (ApiError, ValueError) as e:
+                print(f"Error backfilling item: {e}")
+                failed.append(e)
+                continue
+            except BaseException:
+                # Anything else (including Ctrl-C) ends the run; keep what
+                # was fetched so the next run resumes after it.
+                await asyncio.to_thread(self.flush, timestep, pending_rows, pending_ids)
+                raise
+            pending_rows.extend(rows)
+            pending_ids.append(item_id)
+            if len(pending_ids) >= self.flush_every:
+                total_rows += len(pending_rows)
+                await asyncio.to_thread(self.flush, timestep, pending_rows, pending_ids)
+                pending_rows, pending_ids = [], []
+                elapsed = time.monotonic() - start
+                print(f"Backfill {timestep}: {number}/{len(item_ids)} items, {total_rows} rows, {number / elapsed:.1f} items/s.")
+        total_rows += len(pending_rows)
+        await asyncio.to_thread(self.flush, timestep, pending_rows, pending_ids)
+        return total_rows, failed
+
+    def run(self, timesteps=("5m",), restart=False):
+        if restart:
+            self.checkpoint.clear()
+        self.data_manager.create_tables()
+        all_ids = self.item_ids()
+        summary = {}
+        for timestep in timesteps:
+            if timestep not in TIMESTEPS:
+                raise ValueError(f"Unknown timestep: {timestep}")
+            done = self.checkpoint.done(timestep)
+            item_ids = [item_id for item_id in all_ids if item_id not in done]
+            print(f"Backfilling {timestep} history for {len(item_ids)} items ({len(done)} already done).")
+            start = time.monotonic()
+            rows, failed = asyncio.run(self.run_async(timestep, item_ids))
+            elapsed = time.monotonic() - start
+            print(f"Backfill {timestep} finished: {rows} rows in {elapsed:.1f}s, {len(failed)} items failed.")
+            summary[timestep] = {"items": len(item_ids) - len(failed), "rows": rows, "failed": len(failed), "seconds": elapsed}
+        if "5m" in timesteps:
+            print("Backtests read the price store; run `python main.py store-import --rebuild` to include the 5m history.")
+        self.data_manager.close()
+        return summary
@@ -0,0 +1,411 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import Config
+from feature_engine import FeatureEngine, model_schema, schema_of
+from price_store import DAY, PriceStore
+from snapshot import FEATURE_COLUMNS, FEATURE_INDEX, GE_TAX_FACTOR, ItemSnapshot, NameColumn
+
+BUY_LIMIT_WINDOW = 4 * 60 * 60
+
+
+class MarketChunk:
+    # One day of ticks as dense (steps, items) arrays on a fixed time grid.
+    # Prices and volumes are 0 where an item did not trade in a step.
+
+    def __init__(self, timestamps, item_ids, buy_limit, high_price, low_price, high_volume, low_volume):
+        self.timestamps = timestamps
+        self.item_ids = item_ids
+        self.buy_limit = buy_limit
+        self.high_price = high_price
+        self.low_price = low_price
+        self.high_volume = high_volume
+        self.low_volume = low_volume
+        self._potential_profit = None
+        self._tradeable = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def potential_profit(self):
+        # Cached: every strategy in a replay scores the same chunk.
+        if self._potential_profit is None:
+            self._potential_profit = self.high_price * GE_TAX_FACTOR - self.low_price
+        return self._potential_profit
+
+    def tradeable(self):
+        if self._tradeable is None:
+            self._tradeable = (self.high_price > 0) & (self.low_price > 0)
+        return self._tradeable
+
+    def features(self, mask):
+        # FEATURE_COLUMNS rows for the (step, item) cells in mask, derived the
+        # way build_snapshot_columns derives them from a /5m window.
+        high = self.high_price[mask]
+        low = self.low_price[mask]
+        average = np.maximum(np.trunc(high / GE_TAX_FACTOR), 1)
+        potential_profit = high * GE_TAX_FACTOR - low
+        columns = {
+            "high_price": high,
+            "low_price": low,
+            "high_volume": self.high_volume[mask],
+            "low_volume": self.low_volume[mask],
+            "avg_price_5m": average,
+            "price_fluctuation": np.abs(high - average) / average * 100,
+            "buy_limit": np.broadcast_to(self.buy_limit, mask.shape)[mask],
+            "roi": potential_profit / average,
+        }
+        return np.column_stack([columns[name] for name in FEATURE_COLUMNS])
+
+    def tick_snapshot(self, step, columns):
+        # The given item columns at one step as an unnamed ItemSnapshot, with
+        # the tick columns a FeatureEngine reads.
+        features = np.zeros((len(columns), len(FEATURE_COLUMNS)))
+        for name in ("high_price", "low_price", "high_volume", "low_volume"):
+            features[:, FEATURE_INDEX[name]] = getattr(self, name)[step, columns]
+        names = NameColumn(np.zeros(0, dtype=np.uint8), np.zeros(len(columns) + 1, dtype=np.int64))
+        return ItemSnapshot(self.item_ids[columns], names, features, np.zeros(len(columns)), int(self.timestamps[step]))
+
+
+class Strategy:
+    # Scores every (step, item) cell of a chunk at once. Each step the
+    # account buys the top_k items with a positive score, best first; held
+    # items are sold as soon as the market absorbs them. Subclasses (or
+    # FunctionStrategy) override scores().
+
+    name = "strategy"
+
+    def __init__(self, top_k=5, max_quantity=1000):
+        self.top_k = top_k
+        self.max_quantity = max_quantity
+
+    def scores(self, chunk):
+        raise NotImplementedError
+
+    def params(self):
+        return {"top_k": self.top_k, "max_quantity": self.max_quantity}
+
+
+class HeuristicStrategy(Strategy):
+    # generate_item_suggestions without a model: rank by potential profit
+    # times the buy limit, keeping items above min_total_profit.
+
+    name = "heuristic"
+
+    def __init__(self, min_total_profit=1000000, top_k=5, max_quantity=1000):
+        super().__init__(top_k, max_quantity)
+        self.min_total_profit = min_total_profit
+
+    def scores(self, chunk):
+        potential_profit = chunk.potential_profit
+        total_profit = potential_profit * np.minimum(chunk.buy_limit, self.max_quantity)
+        keep = chunk.tradeable() & (potential_profit > 0) & (total_profit > self.min_total_profit)
+        return np.where(keep, total_profit, 0.0)
+
+    def params(self):
+        return dict(super().params(), min_total_profit=self.min_total_profit)
+
+
+class ModelStrategy(Strategy):
+    # generate_item_suggestions with a model: items the model predicts a
+    # profit for, ranked by total profit. Only cells with a positive margin
+    # are sent to the model, which keeps a year of ticks affordable. For a
+    # model trained with streaming features, a FeatureEngine replays the
+    # ticks step by step, as the ingest service would have seen them.
+
+    name = "model"
+
+    def __init__(self, model, min_total_profit=100, top_k=5, max_quantity=1000):
+        super().__init__(top_k, max_quantity)
+        self.model = model
+        self.min_total_profit = min_total_profit
+        self.stream = schema_of(model) != model_schema()
+        self.feature_engine = None
+        self.replayed_until = None
+
+    def _stream_features(self, chunk, keep):
+        # Streaming features of the keep cells, in chunk.features(keep) order.
+        # A chunk that does not follow the last one starts a new replay.
+        if self.feature_engine is None or chunk.timestamps[0] <= self.replayed_until:
+            self.feature_engine = FeatureEngine()
+        tradeable = chunk.tradeable()
+        parts = []
+        for step in range(len(chunk)):
+            columns = np.flatnonzero(tradeable[step])
+            if len(columns):
+                self.feature_engine.update(chunk.tick_snapshot(step, columns))
+            kept = np.flatnonzero(keep[step])
+            if len(kept):
+                parts.append(self.feature_engine.features(chunk.tick_snapshot(step, kept)))
+        self.replayed_until = int(chunk.timestamps[-1])
+        if not parts:
+            return np.zeros((0, len(self.feature_engine.columns)))
+        return np.nan_to_num(np.vstack(parts))
+
+    def scores(self, chunk):
+        from utils import predict_profit
+
+        potential_profit = chunk.potential_profit
+        total_profit = potential_profit * np.minimum(chunk.buy_limit, self.max_quantity)
+        keep = chunk.tradeable() & (potential_profit > 0) & (total_profit > self.min_total_profit)
+        scores = np.zeros(keep.shape)
+        # Every chunk is replayed, so the feature state has no gaps.
+        stream = self._stream_features(chunk, keep) if self.stream else None
+        if keep.any():
+            features = chunk.features(keep)
+            if stream is not None:
+                features = np.hstack([features, stream])
+            predictions = predict_profit(self.model, features)
+            scores[keep] = np.where(predictions > 0, total_profit[keep], 0.0)
+        return scores
+
+    def params(self):
+        return dict(super().params(), min_total_profit=self.min_total_profit, model=type(self.model).__name__)
+
+
+class FunctionStrategy(Strategy):
+    # Wraps func(chunk) -> (steps, items) scores. func must be a module-level
+    # function to be usable in a parameter sweep.
+
+    def __init__(self, func, name=None, top_k=5, max_quantity=1000, **params):
+        super().__init__(top_k, max_quantity)
+        self.func = func
+        self.name = name or func.__name__
+        self.extra = params
+
+    def scores(self, chunk):
+        return self.func(chunk, **self.extra)
+
+    def params(self):
+        return dict(super().params(), **self.extra)
+
+
+class Backtester:
+    # Replays the price store for several accounts at once. An account is a
+    # strategy with its own starting gold; all account state is stacked into
+    # (accounts, items) arrays, so each time step is a fixed number of array
+    # operations however many strategies are compared.
+    #
+    # Market model:
+    #   - buys fill at low_price, sells at high_price less the GE tax;
+    #   - an order for q units against v traded units fills each unit with
+    #     probability min(1, participation * v / q); by default the expected
+    #     fill is used, with a seed the fill is drawn binomially;
+    #   - at most buy_limit units per item in any rolling 4-hour window;
+    #   - orders are cut to the cash on hand, best-ranked item first.
+
+    def __init__(self, store=None, buy_limits=None, step=None, participation=None, seed=None):
+        self.store = store if store is not None else PriceStore(Config.PRICE_STORE_DIR)
+        self.buy_limits = buy_limits if buy_limits is not None else load_buy_limits()
+        self.step = step or Config.BACKTEST_STEP
+        self.participation = participation if participation is not None else Config.BACKTEST_PARTICIPATION
+        self.rng = np.random.default_rng(seed) if seed is not None else None
+
+    def iter_chunks(self, start=None, end=None):
+        item_ids = self.store.item_ids(start, end)
+        # Dense id -> column lookup; a gather is much cheaper than a search per tick.
+        column_of = np.zeros(int(item_ids.max()) + 1 if len(item_ids) else 1, dtype=np.int64)
+        column_of[item_ids] = np.arange(len(item_ids))
+        buy_limit = np.array([self.buy_limits.get(item_id, 0) for item_id in item_ids.tolist()], dtype=np.float64)
+        steps = DAY // self.step
+        for day, columns in self.store.iter_days(start, end):
+            # Filled item-major, so the (item, timestamp) order of a sealed
+            # partition becomes a sequential write; the chunk sees the
+            # (steps, items) transpose, which costs nothing.
+            flat = column_of[columns["item_id"]] * steps + (np.asarray(columns["timestamp"]) - day * DAY) // self.step
+            dense = []
+            for name in ("high_price", "low_price", "high_volume", "low_volume"):
+                values = np.zeros((len(item_ids), steps))
+                values.ravel()[flat] = columns[name]
+                dense.append(values.T)
+            high_price, low_price, high_volume, low_volume = dense
+            # Ticks imported from SQLite can carry NaN prices for one side.
+            for values in (high_price, low_price):
+                values[np.isnan(values)] = 0
+            timestamps = day * DAY + np.arange(steps, dtype=np.int64) * self.step
+            yield MarketChunk(timestamps, item_ids, buy_limit, high_price, low_price, high_volume, low_volume)
+
+    def _candidates(self, strategies, chunk, width):
+        # (accounts, steps, width) item indices ranked by score, with a mask
+        # of which entries are real candidates.
+        candidates = np.zeros((len(strategies), len(chunk), width), dtype=np.int64)
+        valid = np.zeros(candidates.shape, dtype=bool)
+        for account, strategy in enumerate(strategies):
+            scores = strategy.scores(chunk)
+            missing = np.isnan(scores)
+            if missing.any():
+                scores = np.where(missing, 0.0, scores)
+            k = min(strategy.top_k, scores.shape[1])
+            if k <= 0:
+                continue
+            step, item = np.nonzero(scores > 0)
+            if len(step) <= scores.size // 16:
+                # Few positive cells: rank them within each step directly.
+                order = np.lexsort((-scores[step, item], step))
+                step, item = step[order], item[order]
+                first = np.searchsorted(step, step)
+                rank = np.arange(len(step)) - first
+                keep = rank < k
+                candidates[account, step[keep], rank[keep]] = item[keep]
+                valid[account, step[keep], rank[keep]] = True
+                continue
+            scores = np.ascontiguousarray(scores)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else np.tile(np.arange(k), (len(chunk), 1))
+            order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            candidates[account, :, :k] = top
+            valid[account, :, :k] = np.take_along_axis(scores, top, axis=1) > 0
+        return candidates, valid
+
+    def _fill(self, ordered, volume):
+        capacity = self.participation * volume
+        if self.rng is None:
+            return np.floor(np.minimum(ordered, capacity))
+        probability = np.divide(capacity, ordered, out=np.zeros_like(capacity), where=ordered > 0)
+        return self.rng.binomial(ordered.astype(np.int64), np.minimum(probability, 1.0)).astype(np.float64)
+
+    def run(self, strategies, starting_gold, start=None, end=None):
+        # strategies: list of Strategy; starting_gold: one amount or one per
+        # strategy. Returns one result dict per account.
+        gold = np.broadcast_to(np.asarray(starting_gold, dtype=np.float64), (len(strategies),)).copy()
+        accounts = len(strategies)
+        width = max([strategy.top_k for strategy in strategies] + [1])
+        window = max(BUY_LIMIT_WINDOW // self.step, 1)
+        rows = np.arange(accounts)[:, None]
+        max_quantity = np.array([[strategy.max_quantity] for strategy in strategies], dtype=np.float64)
+
+        cash = gold.copy()
+        holdings = bought_window = last_value = None
+        # Purchases per step as (accounts, items, filled), expired after window steps.
+        ring = [None] * window
+        buys = np.zeros(accounts, dtype=np.int64)
+        units_bought = np.zeros(accounts)
+        units_sold = np.zeros(accounts)
+        tax_paid = np.zeros(accounts)
+        equity_curve = []
+        step_index = 0
+
+        for chunk in self.iter_chunks(start, end):
+            items = len(chunk.item_ids)
+            if holdings is None:
+                holdings = np.zeros((accounts, items))
+                bought_window = np.zeros((accounts, items))
+                last_value = np.zeros(items)
+                held = np.zeros(0, dtype=np.int64)  # account * items + item of open positions
+            candidates, valid = self._candidates(strategies, chunk, width)
+            high_price = chunk.high_price
+            buy_price = chunk.low_price
+            buy_limit = chunk.buy_limit
+
+            for t in range(len(chunk)):
+                # Sell what the market takes this step; positions are sparse.
+                if len(held):
+                    held_account, held_item = np.divmod(held, items)
+                    quantity = holdings[held_account, held_item]
+                    price = high_price[t, held_item]
+                    sold = np.where(price > 0, np.minimum(self._fill(quantity, chunk.high_volume[t, held_item]), quantity), 0.0)
+                    holdings[held_account, held_item] = quantity - sold
+                    held = held[quantity > sold]
+                    cash += np.bincount(held_account, sold * price * GE_TAX_FACTOR, accounts)
+                    tax_paid += np.bincount(held_account, sold * price * (1 - GE_TAX_FACTOR), accounts)
+                    units_sold += np.bincount(held_account, sold, accounts)
+
+                # Expire purchases older than the buy limit window.
+                slot = step_index % window
+                if ring[slot] is not None:
+                    bought_window[ring[slot][0], ring[slot][1]] -= ring[slot][2]
+                    ring[slot] = None
+                step_index += 1
+
+                # Buy the ranked candidates within limits, volume and cash.
+                items_t = candidates[:, t]
+                price = buy_price[t, items_t]
+                remaining = buy_limit[items_t] - bought_window[rows, items_t]
+                ordered = np.where(valid[:, t] & (price > 0), np.clip(remaining, 0, max_quantity), 0.0)
+                if not ordered.any():
+                    continue
+                filled = self._fill(ordered, chunk.low_volume[t, items_t])
+                cost = filled * price
+                spent_before = np.cumsum(cost, axis=1) - cost
+                budget = np.clip(cash[:, None] - spent_before, 0, None)
+                filled = np.minimum(filled, np.floor(np.divide(budget, price, out=np.zeros_like(budget), where=price > 0)))
+                cash -= (filled * price).sum(axis=1)
+                holdings[rows, items_t] += filled
+                bought_window[rows, items_t] += filled
+                ring[slot] = (np.broadcast_to(rows, items_t.shape), items_t, filled)
+                held = np.union1d(held, (rows * items + items_t)[filled > 0])
+                buys += (filled > 0).sum(axis=1)
+                units_bought += filled.sum(axis=1)
+
+            # Mark holdings to the last sell price seen for each item.
+            seen = high_price > 0
+            last_step = len(chunk) - 1 - np.argmax(seen[::-1], axis=0)
+            last_value = np.where(seen.any(axis=0), high_price[last_step, np.arange(items)] * GE_TAX_FACTOR, last_value)
+            equity_curve.append((int(chunk.timestamps[0]), cash + holdings @ last_value))
+
+        equity = np.array([value for _, value in equity_curve]).reshape(-1, accounts)
+        final = equity[-1] if len(equity) else cash
+        peak = np.maximum.accumulate(np.vstack([gold, equity]), axis=0)
+        drawdown = ((peak - np.vstack([gold, equity])) / np.where(peak > 0, peak, 1)).max(axis=0)
+        results = []
+        for account, strategy in enumerate(strategies):
+            results.append({
+                "strategy": strategy.name,
+                "params": strategy.params(),
+                "starting_gold": float(gold[account]),
+                "final_equity": float(final[account]),
+                "profit": float(final[account] - gold[account]),
+                "return_pct": float((final[account] / gold[account] - 1) * 100) if gold[account] else 0.0,
+                "max_drawdown_pct": float(drawdown[account] * 100),
+                "buys": int(buys[account]),
+                "units_bought": int(units_bought[account]),
+                "units_sold": int(units_sold[account]),
+                "tax_paid": float(tax_paid[account]),
+                "equity_curve": [(day, float(value[account])) for day, value in equity_curve],
+            })
+        return results
+
+
+def load_buy_limits(db_file=None):
+    # {item_id: buy_limit} from the items table.
+    from data_manager import DataManager
+
+    rows = DataManager(db_file or Config.DB_FILE).get_all_items()
+    return {int(row[0]): int(row[9] or 0) for row in rows}
+
+
+def _run_sweep_group(store_root, buy_limits, step, participation, seed, cases, start, end):
+    strategies = [strategy for strategy, _ in cases]
+    gold = [gold for _, gold in cases]
+    backtester = Backtester(PriceStore(store_root), buy_limits, step, participation, seed)
+    return backtester.run(strategies, gold, start, end)
+
+
+def sweep(strategy_class, grid, starting_gold, store_root=None, start=None, end=None,
+          processes=None, buy_limits=None, step=None, participation=None, seed=None):
+    # Backtests strategy_class(**params) for every combination in grid
+    # (a dict of parameter lists) and every starting gold amount. Cases are
+    # split into one group per process; each group is a single multi-account
+    # replay reading the memory-mapped store. Results are sorted by profit.
+    keys = sorted(grid)
+    cases = [
+        (strategy_class(**dict(zip(keys, values))), gold)
+        for values in itertools.product(*(grid[key] for key in keys))
+        for gold in np.atleast_1d(starting_gold).tolist()
+    ]
+    store_root = store_root or Config.PRICE_STORE_DIR
+    buy_limits = buy_limits if buy_limits is not None else load_buy_limits()
+    processes = max(1, min(processes or os.cpu_count() or 1, len(cases)))
+    groups = [cases[index::processes] for index in range(processes)]
+    args = (store_root, buy_limits, step, participation, seed)
+    if processes == 1:
+        results = _run_sweep_group(*args, cases, start, end)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_run_sweep_group, *args, group, start, end) for group in groups]
+            results = [result for future in futures for result in future.result()]
+    return sorted(results, key=lambda result: result["profit"], reverse=True)
@@ -0,0 +1,560 @@
+# benchmarks.py
+#
+# Micro-benchmarks for the hot paths. Everything runs on synthetic data, so
+# no network access or trained model is needed:
+#
+#     python benchmarks.py              # run all benchmarks
+#     python benchmarks.py snapshot     # run one
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+
+def synthetic_api_payloads(num_items=4000, seed=42):
+    rng = random.Random(seed)
+    item_ids = [2 + 3 * i for i in range(num_items)]
+    data_latest = {}
+    data_5m = {}
+    item_mapping = {}
+    for item_id in item_ids:
+        price = rng.randint(10, 5_000_000)
+        data_latest[str(item_id)] = {
+            "high": int(price * rng.uniform(1.0, 1.1)), "highTime": 0,
+            "low": price, "lowTime": 0
+        }
+        if rng.random() < 0.8:
+            traded = rng.random() < 0.9
+            data_5m[str(item_id)] = {
+                "avgHighPrice": int(price * rng.uniform(1.0, 1.15)) if traded else None,
+                "highPriceVolume": rng.randint(0, 5000),
+                "avgLowPrice": price if traded else None,
+                "lowPriceVolume": rng.randint(0, 5000),
+            }
+        item_mapping[item_id] = {"id": item_id, "name": f"Item {item_id}", "limit": rng.choice([None, 50, 100, 1000, 10000])}
+    return data_latest, data_5m, item_mapping
+
+
+def synthetic_snapshot(num_items=4000, seed=42):
+    from snapshot import build_snapshot
+
+    # Roughly 70% of generated items survive the snapshot filters.
+    snapshot = build_snapshot(*synthetic_api_payloads(int(num_items * 1.5), seed))
+    return snapshot.take(slice(0, num_items))
+
+
+def timed(func, repeat=20):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(name, seconds, baseline=None):
+    line = f"{name:<40} {seconds * 1000:10.3f} ms"
+    if baseline is not None and seconds > 0:
+        line += f"   ({baseline / seconds:6.1f}x)"
+    print(line)
+
+
+def legacy_snapshot_loop(data_latest, data_5m, item_mapping):
+    # The per-item loop scrape_data used before snapshot.py.
+    items_data = []
+    for item_id in set(data_latest.keys()) | set(data_5m.keys()):
+        item_data_5m = data_5m.get(item_id, {})
+        mapping = item_mapping.get(int(item_id), {})
+        average_high_price = item_data_5m.get('avgHighPrice', 0)
+        average_low_price = item_data_5m.get('avgLowPrice', 0)
+        high_price = int(average_high_price * 0.99) if average_high_price else 0
+        low_price = int(average_low_price * 0.99) if average_low_price else 0
+        average_price_5m = int(average_high_price) if average_high_price else 0
+        if high_price > 0 and low_price > 0 and average_price_5m > 0:
+            potential_profit = high_price * 0.99 - low_price
+            items_data.append({
+                "Item ID": item_id,
+                "Item Name": mapping.get('name', "Unknown Item"),
+                "high_price": high_price,
+                "high_volume": item_data_5m.get('highPriceVolume', 0),
+                "low_price": low_price,
+                "low_volume": item_data_5m.get('lowPriceVolume', 0),
+                "avg_price_5m": average_price_5m,
+                "potential_profit": potential_profit,
+                "price_fluctuation": abs(high_price - average_price_5m) / average_price_5m * 100,
+                "buy_limit": mapping.get('limit', 0),
+                "roi": potential_profit / average_price_5m
+            })
+    return items_data
+
+
+def bench_snapshot():
+    from snapshot import build_snapshot, build_snapshot_columns
+
+    data_latest, data_5m, item_mapping = synthetic_api_payloads()
+    print(f"Snapshot build: {len(data_latest)} items in /latest, {len(data_5m)} in /5m")
+    legacy_time, legacy = timed(lambda: legacy_snapshot_loop(data_latest, data_5m, item_mapping))
+    columns_time, columns = timed(lambda: build_snapshot_columns(data_latest, data_5m, item_mapping))
+    dicts_time, _ = timed(lambda: build_snapshot(data_latest, data_5m, item_mapping).to_items())
+    assert len(legacy) == len(columns["item_id"])
+    report("legacy per-item loop", legacy_time)
+    report("vectorized columns", columns_time, legacy_time)
+    report("vectorized columns + dicts", dicts_time, legacy_time)
+
+
+def bench_snapshot_memory():
+    import gc
+    import tracemalloc
+    from snapshot import build_snapshot
+
+    def retained(build):
+        # Memory a snapshot keeps alive once the API payloads are gone,
+        # including names and ids it shares with them.
+        payloads = synthetic_api_payloads()
+        build(*payloads)  # so lazy imports are not counted
+        del payloads
+        gc.collect()
+        tracemalloc.start()
+        payloads = synthetic_api_payloads()
+        result = build(*payloads)
+        del payloads
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return result, size
+
+    legacy, legacy_bytes = retained(legacy_snapshot_loop)
+    snapshot, snapshot_bytes = retained(build_snapshot)
+    print(f"Snapshot memory: {len(legacy)} items")
+    print(f"{'list of dicts':<40} {legacy_bytes / 1024:10.1f} KiB")
+    print(f"{'ItemSnapshot':<40} {snapshot_bytes / 1024:10.1f} KiB   ({legacy_bytes / snapshot_bytes:6.1f}x)")
+    assert len(snapshot) == len(legacy)
+
+
+def legacy_generate_item_suggestions(items_data, starting_gold, model):
+    # generate_item_suggestions before the persisted pipeline and top-k selection.
+    from sklearn.preprocessing import StandardScaler
+    from snapshot import FEATURE_COLUMNS
+
+    X = np.array([[item[name] for name in FEATURE_COLUMNS] for item in items_data])
+    predictions = model.predict(StandardScaler().fit_transform(X))
+    suggestions = []
+    for i, item in enumerate(items_data):
+        if predictions[i] > 0:
+            item["Predicted Profit"] = predictions[i]
+            max_quantity = min(item["buy_limit"], starting_gold // item["low_price"], 1000)
+            item["Max Quantity"] = max_quantity
+            item["Total Profit"] = item["potential_profit"] * max_quantity
+            if item["Total Profit"] > 100:
+                suggestions.append(item)
+    suggestions.sort(key=lambda x: x["Total Profit"], reverse=True)
+    return suggestions[:5]
+
+
+def bench_suggestions():
+    import contextlib
+    import io
+    from sklearn.ensemble import RandomForestRegressor
+    import utils
+
+    snapshot = synthetic_snapshot(4000)
+    X, y = utils.prepare_training_data(snapshot)
+    pipeline = utils.build_pipeline(RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=1)).fit(X, y)
+    regressor = pipeline.named_steps["regressor"]
+    items_data = snapshot.to_items()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy_time, _ = timed(lambda: legacy_generate_item_suggestions(items_data, 100_000_000, regressor), repeat=10)
+        predict_time, _ = timed(lambda: pipeline.predict(snapshot.features), repeat=10)
+        suggest_time, suggestions = timed(lambda: utils.generate_item_suggestions(snapshot, 100_000_000, pipeline), repeat=10)
+    print(f"Suggestion latency: {len(snapshot)} items, RandomForest(50 trees)")
+    report("legacy dict loop + per-batch scaler", legacy_time)
+    report("pipeline.predict only", predict_time)
+    report("generate_item_suggestions", suggest_time, legacy_time)
+    assert len(suggestions) == 5
+
+
+def bench_startup():
+    import os
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    probe = "import sys; {0}; print(','.join(m for m in ('kivy', 'sklearn', 'keras', 'tensorflow') if m in sys.modules))"
+    cases = [
+        ("interpreter only", "pass"),
+        ("import main", "import main"),
+        ("main + scrape path", "import main; from OSRSScraper import OSRSScraper"),
+        ("main + suggest path", "import main; import utils, model_registry"),
+        ("main + compiled suggest path", "import main; import utils, inference"),
+    ]
+    print("Startup time (fresh interpreter, best of 5)")
+    for name, statement in cases:
+        def run():
+            return subprocess.run(
+                [sys.executable, "-c", probe.format(statement)],
+                cwd=root, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        seconds, heavy = timed(run, repeat=5)
+        print(f"{name:<40} {seconds * 1000:10.1f} ms   heavy modules: {heavy or 'none'}")
+
+
+def bench_features():
+    from feature_engine import FeatureEngine
+    from snapshot import ItemSnapshot
+
+    snapshot = synthetic_snapshot(4000)
+    rng = np.random.default_rng(42)
+    ticks = 288  # one day of 5m windows
+    snapshots = []
+    for tick in range(ticks):
+        features = snapshot.features.copy()
+        features[:, :2] *= np.exp(rng.normal(0, 0.01, (len(snapshot), 2)))
+        snapshots.append(ItemSnapshot(snapshot.item_ids, snapshot.names, features, snapshot.potential_profit, tick * 300))
+
+    def replay():
+        # Recomputing volatility from the full history, as a batch job would.
+        mids = np.array([(s.column("high_price") + s.column("low_price")) / 2 for s in snapshots])
+        return np.diff(np.log(mids), axis=0).std(axis=0, ddof=1)
+
+    engine = FeatureEngine()
+    for past in snapshots:
+        engine.update(past)
+    latest = snapshots[-1]
+    volatility = engine.features(latest)[:, engine.columns.index("volatility")]
+    assert np.allclose(volatility, replay())
+
+    def incremental():
+        engine.last_timestamp[:] -= 1  # let the same snapshot apply again
+        engine.update(latest)
+        return engine.features(latest)
+
+    replay_time, _ = timed(replay, repeat=5)
+    update_time, _ = timed(incremental, repeat=20)
+    print(f"Streaming features: {len(snapshot)} items, {ticks} ticks of history")
+    report("full history replay (volatility only)", replay_time)
+    report("FeatureEngine.update + features", update_time, replay_time)
+
+
+def bench_backtest():
+    import tempfile
+    from backtest import Backtester, HeuristicStrategy
+    from price_store import DAY, PriceStore
+
+    num_items, days = 4000, 7
+    rng = np.random.default_rng(42)
+    item_ids = np.arange(1, num_items + 1) * 2
+    base = rng.lognormal(8, 2, num_items)
+    buy_limits = dict(zip(item_ids.tolist(), rng.integers(10, 10000, num_items).tolist()))
+    with tempfile.TemporaryDirectory() as root:
+        store = PriceStore(root)
+        for step in range(days * DAY // 300):
+            active = rng.random(num_items) < 0.5
+            high = np.trunc(base * 1.02 * np.exp(rng.normal(0, 0.01, num_items)))[active]
+            low = np.trunc(base * np.exp(rng.normal(0, 0.01, num_items)))[active]
+            volumes = rng.integers(0, 500, (2, num_items))[:, active]
+            store.append(item_ids[active], 1_600_000_000 + step * 300, high, low, volumes[0], volumes[1])
+        store.seal(include_current=True)
+
+        backtester = Backtester(store, buy_limits)
+        one_time, _ = timed(lambda: backtester.run([HeuristicStrategy()], 100_000_000), repeat=1)
+        strategies = [HeuristicStrategy(threshold) for threshold in (1e4, 1e5, 1e6, 1e7)]
+        four_time, _ = timed(lambda: backtester.run(strategies, 100_000_000), repeat=1)
+    print(f"Backtest: {num_items} items, {days} days of 5m ticks")
+    report("1 strategy", one_time)
+    report("4 strategies in one replay", four_time)
+    print(f"{'1 strategy, projected to one year':<40} {one_time * 365 / days:10.1f} s")
+
+
+def bench_allocation():
+    from allocation import allocate, quantity_bounds
+
+    snapshot = synthetic_snapshot(4000)
+    profit, cost = snapshot.potential_profit, snapshot.column("low_price")
+    print(f"Capital allocation: {len(snapshot)} items, at most 5 items per basket")
+    for gold in (10_000_000, 1_000_000_000):
+        # The old sizing: each item on its own (buy limit, what the gold
+        # buys, at most 1000), then the 5 largest totals.
+        quantity = quantity_bounds(snapshot, gold, volume_share=0)
+        top = np.argsort(-(profit * quantity))[:5]
+        print(f"  {gold:,} gold; independent top 5 would spend {cost[top] @ quantity[top]:,.0f}")
+        upper = quantity_bounds(snapshot, gold)
+        for method in ("greedy", "exact"):
+            allocate(profit, cost, upper, gold, 5, method)  # warm up the allocation path before timing
+            seconds, basket = timed(lambda: allocate(profit, cost, upper, gold, 5, method), repeat=5)
+            print(f"  {method:<38} {seconds * 1000:10.3f} ms   profit {basket.total_profit:,.0f}, spends {basket.total_cost:,.0f}")
+
+
+def legacy_replay(agent, memory, batch_size):
+    # The old OSRSAgent.replay: one predict per sampled transition for the
+    # target, one for the current Q-values and one fit per transition.
+    for state, action, reward, next_state, done in random.sample(memory, batch_size):
+        target = reward
+        if not done:
+            target = reward + agent.gamma * np.amax(agent.model.predict(next_state, verbose=0)[0])
+        target_f = agent.model.predict(state, verbose=0)
+        target_f[0][action] = target
+        agent.model.fit(state, target_f, epochs=1, verbose=0)
+
+
+def bench_rl_replay():
+    from osrs_rl.agent import OSRSAgent
+
+    state_size, batch_size, transitions = 9, 128, 5000
+    rng = np.random.default_rng(42)
+    states = rng.normal(size=(transitions + 1, state_size)).astype(np.float32)
+    actions = rng.integers(0, 2, transitions)
+    rewards = rng.normal(size=transitions).astype(np.float32)
+    dones = rng.random(transitions) < 0.01
+    memory = [
+        (states[i:i + 1], actions[i], rewards[i], states[i + 1:i + 2], dones[i])
+        for i in range(transitions)
+    ]
+
+    print(f"RL replay: batch of {batch_size}, {transitions} transitions in memory")
+    agent = OSRSAgent(state_size, 2)
+    for transition in memory:
+        agent.remember(*transition)
+    legacy_time, _ = timed(lambda: legacy_replay(agent, memory, batch_size), repeat=3)
+    report("per-sample predict + fit", legacy_time)
+    print(f"{'':<40} {1 / legacy_time:10.1f} steps/s")
+    for name, prioritized, target_update in (
+        ("ReplayBuffer, batched", False, 0),
+        ("ReplayBuffer, prioritized + target net", True, 100),
+    ):
+        agent = OSRSAgent(state_size, 2, prioritized=prioritized, target_update=target_update)
+        for transition in memory:
+            agent.remember(*transition)
+        agent.replay(batch_size)  # build the predict and train functions
+        seconds, _ = timed(lambda: agent.replay(batch_size), repeat=20)
+        report(name, seconds, legacy_time)
+        print(f"{'':<40} {1 / seconds:10.1f} steps/s")
+
+
+def bench_rollout():
+    from osrs_rl.environment import OSRSEnvironment, VectorOSRSEnv
+
+    snapshot = synthetic_snapshot(4000)
+    num_envs, gold = 64, 100_000_000
+    actions = np.random.default_rng(42).integers(0, 2, (len(snapshot), num_envs))
+
+    def scalar_episode():
+        env = OSRSEnvironment(snapshot)
+        env.reset()
+        env.cash = gold
+        for action in actions[:, 0]:
+            env.step(action)
+
+    def vector_episodes():
+        env = VectorOSRSEnv(snapshot, num_envs, starting_cash=gold)
+        env.reset()
+        for batch in actions:
+            env.step(batch)
+
+    scalar_time, _ = timed(scalar_episode, repeat=3)
+    vector_time, _ = timed(vector_episodes, repeat=3)
+    print(f"Environment rollouts: {len(snapshot)} steps per episode, no policy")
+    report("OSRSEnvironment, 1 episode", scalar_time)
+    print(f"{'':<40} {len(snapshot) / scalar_time:10.0f} steps/s")
+    report(f"VectorOSRSEnv, {num_envs} episodes", vector_time)
+    print(f"{'':<40} {len(snapshot) * num_envs / vector_time:10.0f} steps/s")
+
+
+def bench_inference():
+    import contextlib
+    import io
+    from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+    from inference import FallbackRegressor, MLPPolicy, export_model, measure_fallback_rows
+    import utils
+
+    snapshot = synthetic_snapshot(4000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y = utils.prepare_training_data(snapshot)
+    print(f"Inference: {len(snapshot)} items and a batch of 5")
+    for name, regressor in (
+        ("RandomForest(50 trees, depth 10)", RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=1)),
+        ("RandomForest(100 trees, unlimited depth)", RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=1)),
+        ("GradientBoosting(200 trees, depth 5)", GradientBoostingRegressor(n_estimators=200, max_depth=5, random_state=42)),
+        ("GradientBoosting(500 trees, depth 3)", GradientBoostingRegressor(n_estimators=500, max_depth=3, random_state=42)),
+        ("GradientBoosting(200 trees, depth 8)", GradientBoostingRegressor(n_estimators=200, max_depth=8, random_state=42)),
+    ):
+        pipeline = utils.build_pipeline(regressor).fit(X, y)
+        compiled = export_model(pipeline)
+        assert np.allclose(compiled.predict(X), pipeline.predict(X))
+        # As `export` does: large batches go to scikit-learn where it is faster.
+        fallback_rows, _ = measure_fallback_rows(compiled, pipeline, X)
+        served = FallbackRegressor(compiled, lambda: pipeline, fallback_rows) if fallback_rows else compiled
+        print(f"  {name}: {compiled.depth} levels, {compiled._cut} from bit tables, fallback from {fallback_rows} rows")
+        for rows in (len(X), 5):
+            sklearn_time, _ = timed(lambda: pipeline.predict(X[:rows]), repeat=5)
+            compiled_time, _ = timed(lambda: compiled.predict(X[:rows]), repeat=5)
+            report(f"    sklearn pipeline, {rows} rows", sklearn_time)
+            report(f"    compiled, {rows} rows", compiled_time, sklearn_time)
+            if served is not compiled:
+                report(f"    compiled with fallback, {rows} rows", timed(lambda: served.predict(X[:rows]), repeat=5)[0], sklearn_time)
+
+    # The OSRSAgent network shape; Keras predict is typically ~1 ms per call.
+    rng = np.random.default_rng(42)
+    policy = MLPPolicy([
+        (rng.normal(size=(9, 24)), np.zeros(24), "relu"),
+        (rng.normal(size=(24, 24)), np.zeros(24), "relu"),
+        (rng.normal(size=(24, 2)), np.zeros(2), "linear"),
+    ])
+    states = rng.normal(size=(64, 9)).astype(np.float32)
+    print("  MLP policy 9-24-24-2")
+    report("    compiled, 1 state", timed(lambda: policy.predict(states[:1]), repeat=100)[0])
+    report("    compiled, 64 states", timed(lambda: policy.predict(states), repeat=100)[0])
+
+
+def bench_suggestion_server():
+    import contextlib
+    import http.client
+    import io
+    import threading
+    from sklearn.ensemble import RandomForestRegressor
+    from ingest_service import SnapshotStore
+    from suggestion_server import SuggestionService, serve_suggestions
+    import utils
+
+    snapshot = synthetic_snapshot(4000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y = utils.prepare_training_data(snapshot)
+    pipeline = utils.build_pipeline(RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=1)).fit(X, y)
+    store = SnapshotStore()
+    store.publish(snapshot)
+    clients, per_client = 16, 25
+    golds = np.geomspace(1e6, 1e9, per_client)
+
+    def sequential():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for gold in golds:
+                utils.generate_item_suggestions(snapshot, gold, pipeline)
+
+    def concurrent(request):
+        threads = [threading.Thread(target=request) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print(f"Suggestion serving: {len(snapshot)} items, RandomForest(50 trees), {clients} clients x {per_client} requests")
+    sequential_time, _ = timed(sequential, repeat=1)
+    report("generate_item_suggestions, per request", sequential_time / per_client)
+
+    service = SuggestionService(store, model=pipeline, model_version=1).start()
+    server, address = serve_suggestions(service, port=0)
+    host, port = address[len("http://"):].rsplit(":", 1)
+
+    def direct():
+        for gold in golds:
+            service.suggest(gold, timeout=30)
+
+    def over_http():
+        connection = http.client.HTTPConnection(host, int(port))
+        for gold in golds:
+            connection.request("GET", f"/suggest?gold={gold:.0f}")
+            response = connection.getresponse()
+            response.read()
+            assert response.status == 200
+        connection.close()
+
+    try:
+        for name, request in (("SuggestionService.suggest", direct), ("HTTP /suggest", over_http)):
+            service.latency = type(service.latency)(clients * per_client)
+            seconds, _ = timed(lambda: concurrent(request), repeat=1)
+            metrics = service.metrics()
+            report(f"{name}, per request", seconds / (clients * per_client), sequential_time / per_client)
+            print(
+                f"{'':<40} {clients * per_client / seconds:10.0f} req/s   p50 {metrics['latency_p50_ms']:.1f} ms, "
+                f"p99 {metrics['latency_p99_ms']:.1f} ms, batch {metrics['batch_size_avg']:.1f}"
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.stop()
+
+
+def bench_suggestion_cache():
+    import contextlib
+    import io
+    from sklearn.ensemble import RandomForestRegressor
+    from ingest_service import SnapshotStore
+    from suggestion_cache import SuggestionCache
+    import utils
+
+    snapshot = synthetic_snapshot(4000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y = utils.prepare_training_data(snapshot)
+    pipeline = utils.build_pipeline(RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=1)).fit(X, y)
+    store = SnapshotStore()
+    store.publish(snapshot)
+    cache = SuggestionCache(store)
+    version = store.version
+
+    def cold():
+        cache.invalidate()
+        return cache.suggest(snapshot, version, pipeline, 1, 100_000_000)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_time, _ = timed(lambda: utils.generate_item_suggestions(snapshot, 100_000_000, pipeline), repeat=5)
+    cold_time, _ = timed(cold, repeat=5)
+    cache.suggest(snapshot, version, pipeline, 1, 100_000_000)
+    other_gold_time, _ = timed(lambda: cache.suggest(snapshot, version, pipeline, 1, 250_000_000), repeat=1)
+    hit_time, _ = timed(lambda: cache.suggest(snapshot, version, pipeline, 1, 100_400_000), repeat=100)
+    print(f"Suggestion cache: {len(snapshot)} items, RandomForest(50 trees)")
+    report("generate_item_suggestions", generate_time)
+    report("cache miss, new snapshot", cold_time, generate_time)
+    report("cache miss, new gold bucket", other_gold_time, generate_time)
+    report("cache hit", hit_time, generate_time)
+
+
+def bench_budget_sweep():
+    import contextlib
+    import io
+    from sklearn.ensemble import RandomForestRegressor
+    import utils
+
+    snapshot = synthetic_snapshot(4000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y = utils.prepare_training_data(snapshot)
+    pipeline = utils.build_pipeline(RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=1)).fit(X, y)
+    print(f"Budget sweep: {len(snapshot)} items, RandomForest(50 trees)")
+    for budgets in (np.geomspace(1e6, 1e9, 4), np.geomspace(1e6, 1e9, 16)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop_time, looped = timed(lambda: [utils.generate_item_suggestions(snapshot, gold, pipeline) for gold in budgets], repeat=3)
+            sweep_time, swept = timed(lambda: utils.sweep_budgets(snapshot, budgets, pipeline), repeat=3)
+        assert swept == looped
+        report(f"  {len(budgets)} budgets, one call per budget", loop_time)
+        report(f"  {len(budgets)} budgets, sweep_budgets", sweep_time, loop_time)
+
+
+BENCHMARKS = {
+    "snapshot": bench_snapshot,
+    "snapshot_memory": bench_snapshot_memory,
+    "suggestions": bench_suggestions,
+    "startup": bench_startup,
+    "features": bench_features,
+    "backtest": bench_backtest,
+    "allocation": bench_allocation,
+    "rl_replay": bench_rl_replay,
+    "rollout": bench_rollout,
+    "inference": bench_inference,
+    "suggestion_server": bench_suggestion_server,
+    "suggestion_cache": bench_suggestion_cache,
+    "budget_sweep": bench_budget_sweep,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all). One of: {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
@@ -0,0 +1,231 @@
+import threading
+import time
+
+from config import Config
+
+HOUR = 3600
+DAY = 86400
+
+RAW_RESOLUTION = 300
+RESOLUTIONS = (RAW_RESOLUTION, HOUR, DAY)
+
+# {conflict} is REPLACE to recompute a bucket, or IGNORE to only add the
+# buckets an item is missing (when the finer rows it came from are pruned).
+ROLLUP_HOUR_SQL = """
+    INSERT OR {conflict} INTO price_rollups (
+        item_id, resolution, bucket, open, high, low, close, low_avg, high_volume, low_volume, ticks
+    )
+    SELECT
+        p.item_id, 3600, :bucket,
+        (SELECT high_price FROM prices f
+         WHERE f.item_id = p.item_id AND f.timestamp >= :start AND f.timestamp < :end AND f.high_price IS NOT NULL
+         ORDER BY f.timestamp LIMIT 1),
+        MAX(p.high_price),
+        MIN(p.high_price),
+        (SELECT high_price FROM prices l
+         WHERE l.item_id = p.item_id AND l.timestamp >= :start AND l.timestamp < :end AND l.high_price IS NOT NULL
+         ORDER BY l.timestamp DESC LIMIT 1),
+        AVG(p.low_price),
+        SUM(p.high_volume),
+        SUM(p.low_volume),
+        COUNT(*)
+    FROM prices p
+    WHERE p.timestamp >= :start AND p.timestamp < :end
+    GROUP BY p.item_id
+"""
+
+ROLLUP_DAY_SQL = """
+    INSERT OR {conflict} INTO price_rollups (
+        item_id, resolution, bucket, open, high, low, close, low_avg, high_volume, low_volume, ticks
+    )
+    SELECT
+        h.item_id, 86400, :bucket,
+        (SELECT open FROM price_rollups f
+         WHERE f.item_id = h.item_id AND f.resolution = 3600 AND f.bucket >= :start AND f.bucket < :end AND f.open IS NOT NULL
+         ORDER BY f.bucket LIMIT 1),
+        MAX(h.high),
+        MIN(h.low),
+        (SELECT close FROM price_rollups l
+         WHERE l.item_id = h.item_id AND l.resolution = 3600 AND l.bucket >= :start AND l.bucket < :end AND l.close IS NOT NULL
+         ORDER BY l.bucket DESC LIMIT 1),
+        SUM(h.low_avg * h.ticks) / SUM(h.ticks),
+        SUM(h.high_volume),
+        SUM(h.low_volume),
+        SUM(h.ticks)
+    FROM price_rollups h
+    WHERE h.resolution = 3600 AND h.bucket >= :start AND h.bucket < :end
+    GROUP BY h.item_id
+"""
+
+NEXT_TICK_SQL = "SELECT MIN(timestamp) FROM prices WHERE timestamp >= ?"
+NEXT_HOURLY_SQL = "SELECT MIN(bucket) FROM price_rollups WHERE resolution = 3600 AND bucket >= ?"
+
+# Run by writers in the same transaction as their ticks: ticks stamped
+# before hourly_next (backfill, late /5m windows) widen the dirty_from ..
+# dirty_until range, and the compactor recomputes the buckets in it.
+MARK_DIRTY_SQL = (
+    """
+    INSERT INTO compaction_state (name, value)
+    SELECT 'dirty_from', :first FROM compaction_state WHERE name = 'hourly_next' AND :first < value
+    ON CONFLICT (name) DO UPDATE SET value = MIN(value, excluded.value)
+    """,
+    """
+    INSERT INTO compaction_state (name, value)
+    SELECT 'dirty_until', MIN(:last, value - 1) FROM compaction_state WHERE name = 'hourly_next' AND :first < value
+    ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)
+    """,
+)
+
+
+class Compactor:
+    # Rolls 5m ticks older than rollup_after into 1h buckets, 1h buckets into
+    # 1d buckets, and prunes raw ticks and hourly buckets past their
+    # retention. Each step handles one bucket in its own short transaction so
+    # the ingest writer is never blocked for long. The cursors jump over
+    # empty buckets; ticks written behind them are tracked by dirty_from.
+
+    def __init__(self, data_manager, rollup_after=None, raw_retention=None, hourly_retention=None):
+        self.data_manager = data_manager
+        self.rollup_after = rollup_after if rollup_after is not None else Config.ROLLUP_AFTER
+        self.raw_retention = raw_retention if raw_retention is not None else Config.RAW_RETENTION
+        self.hourly_retention = hourly_retention if hourly_retention is not None else Config.HOURLY_RETENTION
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _state(self, conn, name):
+        row = conn.execute("SELECT value FROM compaction_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn, name, value):
+        conn.execute("INSERT OR REPLACE INTO compaction_state (name, value) VALUES (?, ?)", (name, value))
+
+    def _next_bucket(self, conn, query, cursor, size):
+        # The first bucket at or after cursor that holds rows, so empty
+        # stretches are skipped in one step; None when there are none.
+        row = conn.execute(query, (cursor,)).fetchone()
+        return max(cursor, row[0] - row[0] % size) if row[0] is not None else None
+
+    def _rollup(self, conn, sql, bucket, size, keep_existing=False):
+        params = {"bucket": bucket, "start": bucket, "end": bucket + size}
+        conn.execute(sql.format(conflict="IGNORE" if keep_existing else "REPLACE"), params)
+
+    def _step_dirty(self, conn):
+        # Recomputes the oldest hour with ticks in the dirty range and, if it
+        # was rolled already, its day. Below the prune cursors the other rows
+        # of the bucket are gone, so only missing buckets are added and the
+        # late rows are pruned straight away.
+        if self._state(conn, "dirty_from") is None:
+            return False
+        with conn:
+            # Writers widen the range concurrently; hold the write lock from
+            # reading it to moving it on.
+            conn.execute("BEGIN IMMEDIATE")
+            dirty_from, dirty_until = self._state(conn, "dirty_from"), self._state(conn, "dirty_until")
+            if dirty_from is None:
+                return False
+            hourly_next = self._state(conn, "hourly_next")
+            raw_pruned = self._state(conn, "raw_pruned_before")
+            daily_next = self._state(conn, "daily_next")
+            hourly_pruned = self._state(conn, "hourly_pruned_before")
+            until = min(dirty_until if dirty_until is not None else dirty_from, (hourly_next or 0) - 1)
+            bucket = self._next_bucket(conn, NEXT_TICK_SQL, dirty_from - dirty_from % HOUR, HOUR)
+            if bucket is None or bucket > until:
+                conn.execute("DELETE FROM compaction_state WHERE name IN ('dirty_from', 'dirty_until')")
+                return True
+            raw_gone = raw_pruned is not None and bucket < raw_pruned
+            self._rollup(conn, ROLLUP_HOUR_SQL, bucket, HOUR, keep_existing=raw_gone)
+            if raw_gone:
+                conn.execute("DELETE FROM prices WHERE timestamp >= ? AND timestamp < ?", (bucket, bucket + HOUR))
+            day = bucket - bucket % DAY
+            if daily_next is not None and day < daily_next:
+                hourly_gone = hourly_pruned is not None and day < hourly_pruned
+                self._rollup(conn, ROLLUP_DAY_SQL, day, DAY, keep_existing=hourly_gone)
+                if hourly_gone:
+                    conn.execute(
+                        "DELETE FROM price_rollups WHERE resolution = 3600 AND bucket >= ? AND bucket < ?",
+                        (day, day + DAY)
+                    )
+            self._set_state(conn, "dirty_from", bucket + HOUR)
+        return True
+
+    def _step_hour(self, conn, now):
+        bucket = self._next_bucket(conn, NEXT_TICK_SQL, self._state(conn, "hourly_next") or 0, HOUR)
+        if bucket is None or bucket + HOUR > now - self.rollup_after:
+            return False
+        with conn:
+            self._rollup(conn, ROLLUP_HOUR_SQL, bucket, HOUR)
+            self._set_state(conn, "hourly_next", bucket + HOUR)
+        return True
+
+    def _step_day(self, conn):
+        hourly_next = self._state(conn, "hourly_next")
+        bucket = self._next_bucket(conn, NEXT_HOURLY_SQL, self._state(conn, "daily_next") or 0, DAY)
+        if bucket is None or hourly_next is None or bucket + DAY > hourly_next:
+            return False
+        with conn:
+            self._rollup(conn, ROLLUP_DAY_SQL, bucket, DAY)
+            self._set_state(conn, "daily_next", bucket + DAY)
+        return True
+
+    def _step_prune(self, conn, now):
+        # Raw ticks go only once rolled up; hourly buckets once rolled into days.
+        did_work = False
+        raw_limit = min(now - self.raw_retention, self._state(conn, "hourly_next") or 0)
+        raw_pruned = self._next_bucket(conn, NEXT_TICK_SQL, self._state(conn, "raw_pruned_before") or 0, HOUR)
+        if raw_pruned is not None and raw_pruned + HOUR <= raw_limit:
+            with conn:
+                conn.execute("DELETE FROM prices WHERE timestamp >= ? AND timestamp < ?", (raw_pruned, raw_pruned + HOUR))
+                self._set_state(conn, "raw_pruned_before", raw_pruned + HOUR)
+            did_work = True
+        hourly_limit = min(now - self.hourly_retention, self._state(conn, "daily_next") or 0)
+        hourly_pruned = self._next_bucket(conn, NEXT_HOURLY_SQL, self._state(conn, "hourly_pruned_before") or 0, DAY)
+        if hourly_pruned is not None and hourly_pruned + DAY <= hourly_limit:
+            with conn:
+                conn.execute(
+                    "DELETE FROM price_rollups WHERE resolution = 3600 AND bucket >= ? AND bucket < ?",
+                    (hourly_pruned, hourly_pruned + DAY)
+                )
+                self._set_state(conn, "hourly_pruned_before", hourly_pruned + DAY)
+            did_work = True
+        return did_work
+
+    def run_once(self, max_steps=None, now=None):
+        # Runs up to max_steps small transactions; returns how many did work.
+        max_steps = max_steps if max_steps is not None else Config.COMPACTION_STEPS
+        now = now if now is not None else int(time.time())
+        conn = self.data_manager.open_connection()
+        steps = 0
+        try:
+            while steps < max_steps and not self.stop_event.is_set():
+                if not (self._step_dirty(conn) or self._step_hour(conn, now) or self._step_day(conn) or self._step_prune(conn, now)):
+                    break
+                steps += 1
+        finally:
+            conn.close()
+        if steps:
+            print(f"Compaction: {steps} steps completed.")
+        return steps
+
+    def _loop(self, interval):
+        while not self.stop_event.is_set():
+            try:
+                steps = self.run_once()
+            except Exception as e:
+                print(f"Error during compaction: {e}")
+                steps = 0
+            # Keep going while there is a backlog, otherwise wait for new data.
+            self.stop_event.wait(0.1 if steps else interval)
+
+    def start(self, interval=None):
+        if self.thread is None:
+            self.stop_event.clear()
+            interval = interval if interval is not None else Config.COMPACTION_INTERVAL
+            self.thread = threading.Thread(target=self._loop, args=(interval,), name="compactor", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
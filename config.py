@@ -12,4 +12,92 @@ class Config:
     EPSILON = 0.3  # epsilon is the probability of choosing a random action
     ALPHA = 0.3  # alpha is a learning rate
     GAMMA = 0.9
-    MIN_PROFIT_THRESHOLD = 0  # minimum profit threshold in GP after taxes
\ No newline at end of file
+    MIN_PROFIT_THRESHOLD = 0  # minimum profit threshold in GP after taxes
+
+    DB_FILE = "osrs_data.db"
+    PRICE_STORE_DIR = "price_store"  # memory-mapped columnar tick history
+
+    # Prices API client
+    API_BASE_URL = "https://prices.runescape.wiki/api/v1/osrs"
+    USER_AGENT = "GrandExchangeAI - https://github.com/Drlordbasil/GrandExchangeAI"
+    REQUEST_TIMEOUT = 10  # seconds per request
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5  # seconds, doubled on each retry
+    BACKOFF_MAX = 8
+    HTTP_POOL_SIZE = 8
+
+    # Item mapping cache
+    MAPPING_CACHE_FILE = "item_mapping.cache"
+    MAPPING_CACHE_TTL = 24 * 60 * 60  # seconds before the mapping is revalidated
+
+    # Model training
+    MODEL_FILE = "model.pkl"
+    SEARCH_STRATEGY = "random"  # "random" (time-budgeted), "halving" or "grid"
+    SEARCH_N_JOBS = -1  # -1 uses every core
+    SEARCH_TIME_BUDGET = 30  # seconds across all candidate models
+    SEARCH_N_ITER = 20  # candidates sampled per model
+    SEARCH_CV = 3
+    SEARCH_CACHE_FILE = "model_search_cache.pkl"
+    COMPILED_MODEL_FILE = "model.npz"  # NumPy-only export of MODEL_FILE (python main.py export)
+
+    # Ingestion service
+    LATEST_POLL_INTERVAL = 60  # seconds between /latest polls
+    FIVE_MINUTE_POLL_INTERVAL = 300  # /5m publishes one window every 5 minutes
+    FIVE_MINUTE_POLL_DELAY = 15  # seconds after a window closes before polling it
+    POLL_RETRY_DELAY = 15  # seconds before retrying a failed poll
+    INGEST_QUEUE_SIZE = 4  # /5m windows waiting for the DB writer; the poller waits when this many are queued
+    SNAPSHOT_WAIT_TIMEOUT = 60  # seconds the UI waits for the first snapshot
+
+    # Historical backfill
+    BACKFILL_CONCURRENCY = 8  # requests in flight
+    BACKFILL_RATE = 20  # requests per second
+    BACKFILL_FLUSH_EVERY = 200  # items per bulk load and checkpoint
+    BACKFILL_CHECKPOINT_FILE = "backfill_checkpoint.json"
+
+    # Rollups and retention
+    ROLLUP_AFTER = 2 * 24 * 60 * 60  # 5m ticks older than this roll into 1h/1d buckets
+    RAW_RETENTION = 14 * 24 * 60 * 60  # raw 5m ticks kept this long
+    HOURLY_RETENTION = 180 * 24 * 60 * 60  # 1h buckets kept this long; 1d buckets are kept forever
+    COMPACTION_INTERVAL = 300  # seconds between compaction passes once caught up
+    COMPACTION_STEPS = 24  # buckets rolled or pruned per pass, one transaction each
+    SERIES_MAX_POINTS = 2000  # get_price_series picks the finest resolution under this
+
+    # Streaming features
+    FEATURE_HORIZONS = (60 * 60, 6 * 60 * 60, 24 * 60 * 60)  # EMA horizons in seconds
+    FEATURE_STATE_FILE = "feature_state.npz"
+    FEATURE_CHECKPOINT_EVERY = 12  # snapshots between feature state checkpoints
+
+    # Backtesting
+    BACKTEST_STEP = 300  # seconds per simulated step (the /5m window)
+    BACKTEST_PARTICIPATION = 0.1  # share of a step's traded volume an order can take
+
+    # Capital allocation
+    ALLOCATION_METHOD = "greedy"  # "greedy" (fractional knapsack order) or "exact" (integer program)
+    ALLOCATION_VOLUME_SHARE = 0.1  # share of traded volume one basket may take; 0 disables the cap
+    ALLOCATION_HORIZON = 4 * 60 * 60  # seconds of trading volume counted towards the liquidity cap
+    ALLOCATION_TIME_LIMIT = 0.5  # seconds before the exact solver settles for its best basket
+    ALLOCATION_MIN_ITEM_PROFIT = 100  # suggested items must earn at least this at their allocated quantity
+
+    # Suggestion serving and caching
+    SUGGEST_HOST = "127.0.0.1"
+    SUGGEST_PORT = 8766
+    SUGGEST_BATCH_WINDOW = 0.002  # seconds a micro-batch waits for more requests after the first
+    SUGGEST_MAX_BATCH = 64  # requests scored together at most
+    SUGGEST_MAX_TOP = 50  # largest top a request may ask for
+    SUGGEST_TIMEOUT = 10  # seconds before a request is answered with an error
+    SUGGEST_LATENCY_WINDOW = 10000  # recent requests the p50/p99 latency covers
+    SUGGESTION_CACHE_SIZE = 1024  # baskets kept per snapshot and model
+    SUGGESTION_GOLD_DIGITS = 3  # significant figures of gold that share a cached basket; 0 caches exact amounts
+
+    # Reinforcement learning
+    RL_MEMORY_SIZE = 50000  # transitions kept in the replay buffer
+    RL_PRIORITIZED_REPLAY = False
+    RL_PRIORITY_ALPHA = 0.6  # how strongly priorities skew sampling
+    RL_PRIORITY_BETA = 0.4  # importance-sampling correction
+    RL_TARGET_UPDATE = 0  # replays between target network syncs; 0 disables the target network
+    # Rollout processes. 1 trains in-process; more collects episodes in a
+    # spawned process pool (also `main.py train --rl --workers N`).
+    RL_WORKERS = 1
+    RL_ENVS_PER_WORKER = 8  # episodes each worker steps in lockstep
+    RL_SYNC_EVERY = 4  # replays between weight syncs to the workers
+    RL_POLICY_FILE = "osrs_rl_policy.npz"  # NumPy-only export of the agent's network
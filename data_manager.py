@@ -1,14 +1,224 @@
+import itertools
 import sqlite3
+import threading
+import time
+
+from compaction import DAY, HOUR, MARK_DIRTY_SQL, RAW_RESOLUTION, RESOLUTIONS
+from config import Config
+from snapshot import ItemSnapshot, diff_snapshots
+
+ITEM_COLUMNS = (
+    "id", "name", "high_price", "high_volume", "low_price", "low_volume",
+    "avg_price_5m", "potential_profit", "price_fluctuation", "buy_limit", "roi"
+)
+
+
+PRICE_COLUMNS = (
+    "item_id", "timestamp", "high_price", "low_price", "high_volume", "low_volume"
+)
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def _rebucket(rows, resolution):
+    # Merges time-ordered (bucket, open, high, low, close, low_avg,
+    # high_volume, low_volume) rows into buckets of the given resolution.
+    merged = []
+    for bucket, group in itertools.groupby(rows, key=lambda row: row[0] - row[0] % resolution):
+        group = list(group)
+        opens = [row[1] for row in group if row[1] is not None]
+        highs = [row[2] for row in group if row[2] is not None]
+        lows = [row[3] for row in group if row[3] is not None]
+        closes = [row[4] for row in group if row[4] is not None]
+        low_avgs = [row[5] for row in group if row[5] is not None]
+        merged.append((
+            bucket,
+            opens[0] if opens else None,
+            max(highs) if highs else None,
+            min(lows) if lows else None,
+            closes[-1] if closes else None,
+            sum(low_avgs) / len(low_avgs) if low_avgs else None,
+            sum(row[6] or 0 for row in group),
+            sum(row[7] or 0 for row in group),
+        ))
+    return merged
+
+
+def _migrate_v1(cursor):
+    # Baseline schema as it shipped before migrations existed.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            high_price REAL,
+            high_volume INTEGER,
+            low_price REAL,
+            low_volume INTEGER,
+            avg_price_5m REAL,
+            potential_profit REAL,
+            price_fluctuation REAL,
+            buy_limit INTEGER,
+            roi REAL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prices (
+            id INTEGER PRIMARY KEY,
+            item_id INTEGER,
+            timestamp TEXT,
+            price REAL,
+            volume INTEGER,
+            FOREIGN KEY (item_id) REFERENCES items (id)
+        )
+    """)
+
+
+def _migrate_v2(cursor):
+    # Integer epoch timestamps, split high/low columns and a table clustered
+    # on (item_id, timestamp) so per-item range scans never touch other items.
+    cursor.execute("""
+        CREATE TABLE prices_v2 (
+            item_id INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            high_price INTEGER,
+            low_price INTEGER,
+            high_volume INTEGER,
+            low_volume INTEGER,
+            PRIMARY KEY (item_id, timestamp)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO prices_v2 (item_id, timestamp, high_price, high_volume)
+        SELECT
+            item_id,
+            CASE
+                WHEN typeof(timestamp) = 'integer' THEN timestamp
+                WHEN timestamp GLOB '[0-9]*' AND timestamp NOT GLOB '*[^0-9]*' THEN CAST(timestamp AS INTEGER)
+                ELSE CAST(strftime('%s', timestamp) AS INTEGER)
+            END,
+            CAST(price AS INTEGER),
+            volume
+        FROM prices
+        WHERE item_id IS NOT NULL AND timestamp IS NOT NULL
+        ORDER BY id
+    """)
+    cursor.execute("DROP TABLE prices")
+    cursor.execute("ALTER TABLE prices_v2 RENAME TO prices")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_prices_timestamp ON prices (timestamp)")
+
+
+def _migrate_v3(cursor):
+    # Coarser /timeseries history (1h, 6h) loaded by the backfill, which
+    # get_price_series serves before an item's first tick. 5m history goes
+    # straight into prices.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_history (
+            item_id INTEGER NOT NULL,
+            timestep INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            high_price INTEGER,
+            low_price INTEGER,
+            high_volume INTEGER,
+            low_volume INTEGER,
+            PRIMARY KEY (item_id, timestep, timestamp)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migrate_v4(cursor):
+    # OHLCV rollups of the 5m ticks (open/high/low/close track high_price)
+    # and the compaction job's progress markers.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            item_id INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            open INTEGER,
+            high INTEGER,
+            low INTEGER,
+            close INTEGER,
+            low_avg REAL,
+            high_volume INTEGER,
+            low_volume INTEGER,
+            ticks INTEGER,
+            PRIMARY KEY (item_id, resolution, bucket)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_rollups_bucket ON price_rollups (resolution, bucket)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS compaction_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    """)
+
+
+MIGRATIONS = (
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def item_row(item_data):
+    return (
+        int(item_data["Item ID"]),
+        item_data["Item Name"],
+        item_data.get("high_price", 0),
+        item_data.get("high_volume", 0),
+        item_data.get("low_price", 0),
+        item_data.get("low_volume", 0),
+        item_data.get("avg_price_5m", 0),
+        item_data.get("potential_profit", 0),
+        item_data.get("price_fluctuation", 0),
+        item_data.get("buy_limit", 0),
+        item_data.get("roi", 0)
+    )
+
+
+def price_row(item_data, timestamp):
+    return (
+        int(item_data["Item ID"]),
+        int(timestamp),
+        item_data["high_price"],
+        item_data.get("low_price"),
+        item_data["high_volume"],
+        item_data.get("low_volume")
+    )
+
+
+INSERT_PRICE_SQL = f"""
+    INSERT OR REPLACE INTO prices ({", ".join(PRICE_COLUMNS)})
+    VALUES ({", ".join("?" * len(PRICE_COLUMNS))})
+"""
+
 
 class DataManager:
     def __init__(self, db_name):
         self.db_name = db_name
         self.conn = None
         self.cursor = None
+        self.bulk_conn = None
+        self.bulk_lock = threading.Lock()
+
+    def open_connection(self, **kwargs):
+        conn = sqlite3.connect(self.db_name, **kwargs)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_name)
+            self.conn = self.open_connection()
             self.cursor = self.conn.cursor()
             print(f"Connected to the database: {self.db_name}")
         except sqlite3.Error as e:
@@ -22,63 +232,74 @@ class DataManager:
             except sqlite3.Error as e:
                 print(f"Error disconnecting from the database: {e}")
 
+    def get_bulk_connection(self):
+        # One long-lived connection shared by all bulk writes of this manager.
+        if self.bulk_conn is None:
+            self.bulk_conn = self.open_connection(check_same_thread=False)
+            print(f"Opened bulk connection to the database: {self.db_name}")
+        return self.bulk_conn
+
+    def close(self):
+        with self.bulk_lock:
+            if self.bulk_conn is not None:
+                try:
+                    self.bulk_conn.close()
+                    print("Closed bulk connection to the database.")
+                except sqlite3.Error as e:
+                    print(f"Error closing bulk connection: {e}")
+                finally:
+                    self.bulk_conn = None
+
     def create_tables(self):
+        self.migrate()
+
+    def get_schema_version(self):
+        conn = sqlite3.connect(self.db_name)
         try:
-            self.connect()
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS items (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT,
-                    high_price REAL,
-                    high_volume INTEGER,
-                    low_price REAL,
-                    low_volume INTEGER,
-                    avg_price_5m REAL,
-                    potential_profit REAL,
-                    price_fluctuation REAL,
-                    buy_limit INTEGER,
-                    roi REAL
-                )
-            """)
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS prices (
-                    id INTEGER PRIMARY KEY,
-                    item_id INTEGER,
-                    timestamp TEXT,
-                    price REAL,
-                    volume INTEGER,
-                    FOREIGN KEY (item_id) REFERENCES items (id)
-                )
-            """)
-            self.conn.commit()
-            print("Tables created successfully.")
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+
+    def migrate(self):
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_name, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target_version, migration in MIGRATIONS:
+                if target_version <= version:
+                    continue
+                print(f"Migrating database {self.db_name} to schema version {target_version}...")
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    # Re-check under the write lock in case another process migrated first.
+                    if cursor.execute("PRAGMA user_version").fetchone()[0] >= target_version:
+                        cursor.execute("COMMIT")
+                        continue
+                    migration(cursor)
+                    cursor.execute(f"PRAGMA user_version = {target_version}")
+                    cursor.execute("COMMIT")
+                except sqlite3.Error:
+                    cursor.execute("ROLLBACK")
+                    raise
+                version = target_version
+            print(f"Database schema is at version {version}.")
+            return version
         except sqlite3.Error as e:
-            print(f"Error creating tables: {e}")
+            print(f"Error migrating database: {e}")
+            return None
         finally:
-            self.disconnect()
+            if conn is not None:
+                conn.close()
 
     def insert_item(self, item_data):
         try:
             self.connect()
-            self.cursor.execute("""
-                INSERT OR REPLACE INTO items (
-                    id, name, high_price, high_volume, low_price, low_volume,
-                    avg_price_5m, potential_profit, price_fluctuation, buy_limit, roi
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                item_data["Item ID"],
-                item_data["Item Name"],
-                item_data.get("high_price", 0),
-                item_data.get("high_volume", 0),
-                item_data.get("low_price", 0),
-                item_data.get("low_volume", 0),
-                item_data.get("avg_price_5m", 0),
-                item_data.get("potential_profit", 0),
-                item_data.get("price_fluctuation", 0),
-                item_data.get("buy_limit", 0),
-                item_data.get("roi", 0)
-            ))
+            self.cursor.execute(f"""
+                INSERT OR REPLACE INTO items ({", ".join(ITEM_COLUMNS)})
+                VALUES ({", ".join("?" * len(ITEM_COLUMNS))})
+            """, item_row(item_data))
             self.conn.commit()
             print(f"Item inserted/updated successfully. Item ID: {item_data['Item ID']}")
         except sqlite3.Error as e:
@@ -86,13 +307,10 @@ class DataManager:
         finally:
             self.disconnect()
 
-    def insert_price(self, item_id, timestamp, price, volume):
+    def insert_price(self, item_id, timestamp, high_price, high_volume, low_price=None, low_volume=None):
         try:
             self.connect()
-            self.cursor.execute("""
-                INSERT INTO prices (item_id, timestamp, price, volume)
-                VALUES (?, ?, ?, ?)
-            """, (item_id, timestamp, price, volume))
+            self._insert_prices(self.conn, [(int(item_id), int(timestamp), high_price, low_price, high_volume, low_volume)])
             self.conn.commit()
             print(f"Price inserted successfully. Item ID: {item_id}")
         except sqlite3.Error as e:
@@ -115,12 +333,21 @@ class DataManager:
         finally:
             self.disconnect()
 
-    def get_prices(self, item_id):
+    def get_prices(self, item_id, start=None, end=None):
+        # Returns (item_id, timestamp, high_price, low_price, high_volume, low_volume)
+        # rows ordered by time; start/end are inclusive epoch seconds.
+        query = f"SELECT {', '.join(PRICE_COLUMNS)} FROM prices WHERE item_id = ?"
+        params = [int(item_id)]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(int(start))
+        if end is not None:
+            query += " AND timestamp <= ?"
+            params.append(int(end))
+        query += " ORDER BY timestamp"
         try:
             self.connect()
-            self.cursor.execute("""
-                SELECT * FROM prices WHERE item_id = ?
-            """, (item_id,))
+            self.cursor.execute(query, params)
             prices = self.cursor.fetchall()
             print(f"Prices retrieved successfully. Item ID: {item_id}")
             return prices
@@ -128,4 +355,238 @@ class DataManager:
             print(f"Error retrieving prices: {e}")
             return []
         finally:
-            self.disconnect()
\ No newline at end of file
+            self.disconnect()
+
+    def iter_price_chunks(self, chunk_size=500000):
+        # Streams the whole prices table in chunks of raw rows.
+        conn = self.open_connection()
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(PRICE_COLUMNS)} FROM prices")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def get_latest_prices(self, item_id, limit=1):
+        try:
+            self.connect()
+            self.cursor.execute(f"""
+                SELECT {", ".join(PRICE_COLUMNS)} FROM prices
+                WHERE item_id = ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """, (int(item_id), int(limit)))
+            prices = self.cursor.fetchall()
+            print(f"Latest prices retrieved successfully. Item ID: {item_id}")
+            return prices
+        except sqlite3.Error as e:
+            print(f"Error retrieving latest prices: {e}")
+            return []
+        finally:
+            self.disconnect()
+
+    def choose_resolution(self, start, end, max_points=None):
+        # The finest resolution that both still covers start (raw ticks and
+        # hourly buckets are pruned past retention) and returns at most
+        # max_points buckets; daily buckets are never pruned.
+        max_points = max_points if max_points is not None else Config.SERIES_MAX_POINTS
+        try:
+            self.connect()
+            self.cursor.execute("SELECT name, value FROM compaction_state")
+            state = dict(self.cursor.fetchall())
+        except sqlite3.Error as e:
+            print(f"Error reading compaction state: {e}")
+            state = {}
+        finally:
+            self.disconnect()
+        covered_from = {
+            RAW_RESOLUTION: state.get("raw_pruned_before"),
+            HOUR: state.get("hourly_pruned_before"),
+            DAY: None,
+        }
+        for resolution in RESOLUTIONS:
+            covers = covered_from[resolution] is None or start >= covered_from[resolution]
+            if covers and (end - start) / resolution <= max_points:
+                return resolution, state
+        return DAY, state
+
+    def get_price_series(self, item_id, start, end, max_points=None):
+        # Returns (resolution, rows) where rows are (bucket, open, high, low,
+        # close, low_avg, high_volume, low_volume) ordered by time. Whatever
+        # has not been rolled up to that resolution yet is bucketed on the fly
+        # from the next finer level, so the range always reaches the present,
+        # and backfilled 1h/6h history covers what lies before the first tick.
+        start, end = int(start), int(end)
+        resolution, state = self.choose_resolution(start, end, max_points)
+        raw_query = """
+            SELECT timestamp, high_price, high_price, high_price, high_price, low_price, high_volume, low_volume
+            FROM prices WHERE item_id = ? AND timestamp >= ? AND timestamp <= ?
+            ORDER BY timestamp
+        """
+        rolled_until = {DAY: state.get("daily_next"), HOUR: state.get("hourly_next")}
+        try:
+            self.connect()
+            rows = []
+            cursor_from = start - start % resolution
+            for level in (DAY, HOUR):
+                if level > resolution or rolled_until[level] is None:
+                    continue
+                self.cursor.execute("""
+                    SELECT bucket, open, high, low, close, low_avg, high_volume, low_volume
+                    FROM price_rollups
+                    WHERE item_id = ? AND resolution = ? AND bucket >= ? AND bucket <= ? AND bucket < ?
+                    ORDER BY bucket
+                """, (int(item_id), level, cursor_from, end, rolled_until[level]))
+                rows.extend(_rebucket(self.cursor.fetchall(), resolution))
+                cursor_from = max(cursor_from, rolled_until[level])
+            if cursor_from <= end:
+                self.cursor.execute(raw_query, (int(item_id), max(start, cursor_from), end))
+                rows.extend(_rebucket(self.cursor.fetchall(), resolution))
+            return resolution, self._history_rows(item_id, start, rows[0][0] if rows else end + 1, resolution) + rows
+        except sqlite3.Error as e:
+            print(f"Error retrieving price series: {e}")
+            return resolution, []
+        finally:
+            self.disconnect()
+
+    def _history_rows(self, item_id, start, until, resolution):
+        # Backfilled /timeseries points for the part of a series before its
+        # first tick or rollup, finest timestep first: each coarser timestep
+        # only fills in before the finer one starts.
+        self.cursor.execute("SELECT DISTINCT timestep FROM price_history WHERE item_id = ?", (int(item_id),))
+        history = []
+        for (timestep,) in sorted(self.cursor.fetchall()):
+            self.cursor.execute("""
+                SELECT timestamp, high_price, high_price, high_price, high_price, low_price, high_volume, low_volume
+                FROM price_history
+                WHERE item_id = ? AND timestep = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp
+            """, (int(item_id), timestep, start, until))
+            points = self.cursor.fetchall()
+            if points:
+                history[:0] = points
+                until = points[0][0]
+        return _rebucket(history, resolution)
+
+    def upsert_items_bulk(self, items_data):
+        return self.save_snapshot(items_data, None)
+
+    def insert_prices_bulk(self, price_rows):
+        # price_rows: iterable of (item_id, timestamp, high_price, low_price, high_volume, low_volume)
+        price_rows = list(price_rows)
+        try:
+            with self.bulk_lock:
+                conn = self.get_bulk_connection()
+                start = time.perf_counter()
+                with conn:
+                    self._insert_prices(conn, price_rows)
+                elapsed = time.perf_counter() - start
+            self._report_rate("prices", len(price_rows), elapsed)
+            return len(price_rows)
+        except sqlite3.Error as e:
+            print(f"Error inserting prices in bulk: {e}")
+            return 0
+
+    def insert_history_bulk(self, timestep, price_rows):
+        # Like insert_prices_bulk, for a coarser timestep given in seconds.
+        price_rows = [(row[0], timestep) + tuple(row[1:]) for row in price_rows]
+        try:
+            with self.bulk_lock:
+                conn = self.get_bulk_connection()
+                start = time.perf_counter()
+                with conn:
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO price_history (
+                            item_id, timestep, timestamp, high_price, low_price, high_volume, low_volume
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, price_rows)
+                elapsed = time.perf_counter() - start
+            self._report_rate("price_history", len(price_rows), elapsed)
+            return len(price_rows)
+        except sqlite3.Error as e:
+            print(f"Error inserting price history in bulk: {e}")
+            return 0
+
+    def save_snapshot(self, items_data, timestamp):
+        # Upserts every item and, unless timestamp is None, appends one price tick
+        # per item. Everything is written in a single transaction. items_data
+        # is an ItemSnapshot or a list of item dicts.
+        try:
+            if isinstance(items_data, ItemSnapshot):
+                item_rows = items_data.db_item_rows()
+                price_rows = items_data.db_price_rows(timestamp) if timestamp is not None else []
+            else:
+                item_rows = [item_row(item_data) for item_data in items_data]
+                price_rows = []
+                if timestamp is not None:
+                    price_rows = [
+                        price_row(item_data, timestamp)
+                        for item_data in items_data
+                    ]
+        except KeyError as e:
+            print(f"Error saving snapshot: Missing key - {e}")
+            return 0
+
+        if self._write_rows(item_rows, price_rows) is None:
+            return 0
+        return len(item_rows)
+
+    def save_snapshot_changes(self, snapshot, previous, timestamp, masks=None):
+        # Writes only items whose values differ from the previous snapshot and
+        # only ticks whose 5m values changed. Returns row counts. masks is a
+        # precomputed diff_snapshots(previous, snapshot) result.
+        item_mask, tick_mask = masks if masks is not None else diff_snapshots(previous, snapshot)
+        changed = snapshot.take(item_mask)
+        ticks = snapshot.take(tick_mask)
+        item_rows = changed.db_item_rows()
+        price_rows = ticks.db_price_rows(timestamp) if timestamp is not None else []
+        stats = {
+            "items_changed": len(item_rows),
+            "items_skipped": len(snapshot) - len(item_rows),
+            "ticks_written": len(price_rows),
+            "ticks_skipped": len(snapshot) - len(price_rows) if timestamp is not None else 0,
+        }
+        if (item_rows or price_rows) and self._write_rows(item_rows, price_rows) is None:
+            return None
+        print(
+            f"Snapshot diff: {stats['items_changed']} items changed, {stats['items_skipped']} unchanged; "
+            f"{stats['ticks_written']} ticks written, {stats['ticks_skipped']} skipped."
+        )
+        return stats
+
+    def _insert_prices(self, conn, price_rows):
+        # Ticks older than the compactor's hourly cursor mark their hour for
+        # recomputation in the same transaction.
+        conn.executemany(INSERT_PRICE_SQL, price_rows)
+        if price_rows:
+            timestamps = [row[1] for row in price_rows]
+            for sql in MARK_DIRTY_SQL:
+                conn.execute(sql, {"first": min(timestamps), "last": max(timestamps)})
+
+    def _write_rows(self, item_rows, price_rows):
+        try:
+            with self.bulk_lock:
+                conn = self.get_bulk_connection()
+                start = time.perf_counter()
+                with conn:
+                    if item_rows:
+                        conn.executemany(f"""
+                            INSERT OR REPLACE INTO items ({", ".join(ITEM_COLUMNS)})
+                            VALUES ({", ".join("?" * len(ITEM_COLUMNS))})
+                        """, item_rows)
+                    if price_rows:
+                        self._insert_prices(conn, price_rows)
+                elapsed = time.perf_counter() - start
+            self._report_rate("items/prices", len(item_rows) + len(price_rows), elapsed)
+            return elapsed
+        except sqlite3.Error as e:
+            print(f"Error saving snapshot: {e}")
+            return None
+
+    def _report_rate(self, label, rows, elapsed):
+        rate = rows / elapsed if elapsed > 0 else float("inf")
+        print(f"Wrote {rows} {label} rows in {elapsed:.3f}s ({rate:,.0f} rows/s).")
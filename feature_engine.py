@@ -0,0 +1,237 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from config import Config
+from snapshot import FEATURE_COLUMNS
+
+STATE_FORMAT = 1
+
+
+def stream_feature_columns(horizons):
+    columns = [f"ema_{horizon}s" for horizon in horizons]
+    columns += [f"ema_gap_{horizon}s" for horizon in horizons]
+    columns += ["volatility", "spread", "spread_ema", "volume_momentum", "time_since_trade"]
+    return tuple(columns)
+
+
+def model_schema(stream=False, horizons=None):
+    # A model's input columns: the snapshot features, followed by the
+    # streaming features for the configured horizons when stream is set.
+    columns = list(FEATURE_COLUMNS)
+    if stream:
+        horizons = horizons if horizons is not None else Config.FEATURE_HORIZONS
+        columns += stream_feature_columns([int(horizon) for horizon in horizons])
+    return columns
+
+
+def schema_of(model):
+    # The schema a model was trained on: from its metadata (compiled
+    # models), otherwise from how many columns it was fitted on.
+    metadata = getattr(model, "metadata", None) or {}
+    if metadata.get("feature_schema"):
+        return list(metadata["feature_schema"])
+    return model_schema(stream=getattr(model, "n_features_in_", 0) > len(FEATURE_COLUMNS))
+
+
+def model_inputs(snapshot, schema, feature_engine=None):
+    # The matrix a model with this schema predicts from. Streaming columns
+    # come from feature_engine, NaN (items it has not seen) as 0, the same
+    # as in training.
+    schema = list(schema)
+    if schema == list(FEATURE_COLUMNS):
+        return snapshot.features
+    if schema != model_schema(stream=True):
+        raise ValueError(f"Unsupported feature schema: {schema}")
+    if feature_engine is None:
+        print("No feature engine state; streaming features are 0.")
+        stream = np.zeros((len(snapshot), len(schema) - len(FEATURE_COLUMNS)))
+    else:
+        now = snapshot.timestamp if snapshot.timestamp is not None else time.time()
+        stream = np.nan_to_num(feature_engine.features(snapshot, now))
+    return np.hstack([snapshot.features, stream])
+
+
+class FeatureEngine:
+    # Running per-item temporal features, updated in one vectorized pass per
+    # snapshot. State lives in arrays indexed like the sorted item_ids array,
+    # so applying a snapshot is one searchsorted plus elementwise updates:
+    #
+    #   ema_{h}s          time-decayed EMA of the mid price per horizon h
+    #   ema_gap_{h}s      (mid - ema) / ema
+    #   volatility        Welford standard deviation of log mid-price returns
+    #   spread            (high - low) / mid of the latest tick
+    #   spread_ema        spread smoothed over the shortest horizon
+    #   volume_momentum   short volume EMA / long volume EMA - 1
+    #   time_since_trade  seconds since the item last traded any volume
+    #
+    # A snapshot is applied at most once per item and timestamp, so repeated
+    # /latest polls over the same /5m window do not skew the statistics.
+
+    STATE_ARRAYS = (
+        "item_ids", "last_timestamp", "last_trade", "last_mid", "mid_ema", "volume_ema",
+        "spread", "spread_ema", "return_count", "return_mean", "return_m2"
+    )
+
+    def __init__(self, horizons=None, checkpoint_file=None):
+        self.horizons = np.asarray(horizons if horizons is not None else Config.FEATURE_HORIZONS, dtype=np.float64)
+        self.checkpoint_file = checkpoint_file
+        self.columns = stream_feature_columns(self.horizons.astype(np.int64).tolist())
+        self.lock = threading.Lock()
+        self._allocate(np.zeros(0, dtype=np.int64))
+        if checkpoint_file:
+            self.load()
+
+    def _allocate(self, item_ids):
+        count = len(item_ids)
+        self.item_ids = item_ids
+        self.last_timestamp = np.full(count, -np.inf)
+        self.last_trade = np.full(count, np.nan)
+        self.last_mid = np.full(count, np.nan)
+        self.mid_ema = np.full((count, len(self.horizons)), np.nan)
+        self.volume_ema = np.full((count, 2), np.nan)
+        self.spread = np.full(count, np.nan)
+        self.spread_ema = np.full(count, np.nan)
+        self.return_count = np.zeros(count, dtype=np.int64)
+        self.return_mean = np.zeros(count)
+        self.return_m2 = np.zeros(count)
+
+    def _grow(self, item_ids):
+        # New items are rare (game updates), so merging them in reallocates
+        # the state once rather than reserving spare capacity.
+        new_ids = np.setdiff1d(item_ids, self.item_ids)
+        if not len(new_ids):
+            return
+        old = {name: getattr(self, name) for name in self.STATE_ARRAYS}
+        self._allocate(np.union1d(self.item_ids, new_ids))
+        rows = np.searchsorted(self.item_ids, old["item_ids"])
+        for name in self.STATE_ARRAYS[1:]:
+            getattr(self, name)[rows] = old[name]
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def update(self, snapshot, timestamp=None):
+        # Applies one snapshot; returns the number of items updated.
+        timestamp = float(timestamp if timestamp is not None else snapshot.timestamp)
+        if not len(snapshot):
+            return 0
+        with self.lock:
+            self._grow(snapshot.item_ids)
+            rows = np.searchsorted(self.item_ids, snapshot.item_ids)
+            fresh = timestamp > self.last_timestamp[rows]
+            rows = rows[fresh]
+            if not len(rows):
+                return 0
+
+            high = snapshot.column("high_price")[fresh]
+            low = snapshot.column("low_price")[fresh]
+            volume = (snapshot.column("high_volume") + snapshot.column("low_volume"))[fresh]
+            mid = (high + low) / 2
+            dt = timestamp - self.last_timestamp[rows]
+            first = ~np.isfinite(dt)
+
+            # Time-aware decay: a longer gap moves the EMA further.
+            alpha = -np.expm1(-dt[:, None] / self.horizons[None, :])
+            alpha[first] = 1.0
+            ema = self.mid_ema[rows]
+            ema = np.where(np.isnan(ema), mid[:, None], ema + alpha * (mid[:, None] - ema))
+            self.mid_ema[rows] = ema
+
+            volume_alpha = alpha[:, [0, -1]]
+            volume_ema = self.volume_ema[rows]
+            self.volume_ema[rows] = np.where(
+                np.isnan(volume_ema), volume[:, None], volume_ema + volume_alpha * (volume[:, None] - volume_ema)
+            )
+
+            spread = np.divide(high - low, mid, out=np.zeros_like(mid), where=mid > 0)
+            spread_ema = self.spread_ema[rows]
+            self.spread[rows] = spread
+            self.spread_ema[rows] = np.where(np.isnan(spread_ema), spread, spread_ema + alpha[:, 0] * (spread - spread_ema))
+
+            # Welford's update over log returns, only where both mids are valid.
+            last_mid = self.last_mid[rows]
+            valid = (last_mid > 0) & (mid > 0)
+            returns = np.log(np.where(valid, mid, 1.0) / np.where(valid, last_mid, 1.0))
+            count = self.return_count[rows] + valid
+            delta = returns - self.return_mean[rows]
+            mean = self.return_mean[rows] + np.where(valid, delta / np.maximum(count, 1), 0.0)
+            self.return_m2[rows] += np.where(valid, delta * (returns - mean), 0.0)
+            self.return_mean[rows] = mean
+            self.return_count[rows] = count
+
+            self.last_mid[rows] = np.where(mid > 0, mid, last_mid)
+            self.last_trade[rows] = np.where(volume > 0, timestamp, self.last_trade[rows])
+            self.last_timestamp[rows] = timestamp
+            return len(rows)
+
+    def features(self, snapshot, now=None):
+        # (n, len(self.columns)) float64 block aligned with snapshot's rows;
+        # items the engine has never seen get NaN.
+        now = float(now if now is not None else snapshot.timestamp)
+        result = np.full((len(snapshot), len(self.columns)), np.nan)
+        with self.lock:
+            if not len(self.item_ids) or not len(snapshot):
+                return result
+            rows = np.minimum(np.searchsorted(self.item_ids, snapshot.item_ids), len(self.item_ids) - 1)
+            known = self.item_ids[rows] == snapshot.item_ids
+            rows = rows[known]
+            horizons = len(self.horizons)
+            ema = self.mid_ema[rows]
+            last_mid = self.last_mid[rows][:, None]
+            volume_ema = self.volume_ema[rows]
+            count = self.return_count[rows]
+            block = np.empty((len(rows), len(self.columns)))
+            block[:, :horizons] = ema
+            block[:, horizons:2 * horizons] = np.divide(last_mid - ema, ema, out=np.zeros_like(ema), where=ema > 0)
+            block[:, 2 * horizons] = np.sqrt(np.divide(self.return_m2[rows], count - 1, out=np.zeros(len(rows)), where=count > 1))
+            block[:, 2 * horizons + 1] = self.spread[rows]
+            block[:, 2 * horizons + 2] = self.spread_ema[rows]
+            block[:, 2 * horizons + 3] = np.divide(
+                volume_ema[:, 0], volume_ema[:, 1], out=np.ones(len(rows)), where=volume_ema[:, 1] > 0
+            ) - 1
+            block[:, 2 * horizons + 4] = now - self.last_trade[rows]
+        result[known] = block
+        return result
+
+    def save(self, checkpoint_file=None):
+        checkpoint_file = checkpoint_file or self.checkpoint_file
+        with self.lock:
+            state = {name: getattr(self, name) for name in self.STATE_ARRAYS}
+            state["horizons"] = self.horizons
+            state["format"] = np.array(STATE_FORMAT)
+            # Write-then-rename so a crash never leaves a torn checkpoint.
+            directory = os.path.dirname(os.path.abspath(checkpoint_file))
+            fd, tmp_file = tempfile.mkstemp(prefix=".features-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    np.savez(file, **state)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_file, checkpoint_file)
+            except Exception:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                raise
+        print(f"Saved feature state for {len(self.item_ids)} items to {checkpoint_file}.")
+
+    def load(self, checkpoint_file=None):
+        checkpoint_file = checkpoint_file or self.checkpoint_file
+        try:
+            with np.load(checkpoint_file) as state:
+                if int(state["format"]) != STATE_FORMAT or not np.array_equal(state["horizons"], self.horizons):
+                    print(f"Feature state in {checkpoint_file} uses different settings. Starting fresh.")
+                    return False
+                with self.lock:
+                    for name in self.STATE_ARRAYS:
+                        setattr(self, name, state[name].copy())
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading feature state: {e}")
+            return False
+        print(f"Loaded feature state for {len(self.item_ids)} items from {checkpoint_file}.")
+        return True
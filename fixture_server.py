@@ -0,0 +1,96 @@
+# fixture_server.py
+#
+# Serves recorded API responses from a directory so the scraper and
+# backfill code can be exercised without touching the live prices API:
+#
+#     python fixture_server.py tests/fixtures/ --port 8765
+#     OSRSApiClient(base_url="http://127.0.0.1:8765")
+#
+# GET /latest is answered with tests/fixtures/latest.json and
+# GET /timeseries?id=2&timestep=5m with tests/fixtures/timeseries_id=2_timestep=5m.json.
+
+import argparse
+import gzip
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def fixture_name(path):
+    parts = urlsplit(path)
+    name = parts.path.strip("/").replace("/", "_") or "index"
+    query = sorted(parse_qsl(parts.query))
+    if query:
+        name += "_" + "_".join(f"{key}={value}" for key, value in query)
+    return name + ".json"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    fixture_dir = "fixtures"
+    delay = 0
+    # (path, status) of every request served, when set to a list.
+    requests = None
+
+    def send_response(self, code, message=None):
+        if self.requests is not None:
+            self.requests.append((self.path, code))
+        super().send_response(code, message)
+
+    def do_GET(self):
+        file_path = os.path.join(self.fixture_dir, fixture_name(self.path))
+        if not os.path.isfile(file_path):
+            self.send_error(404, f"No fixture for {self.path}")
+            return
+        with open(file_path, "rb") as file:
+            body = file.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        if self.delay:
+            threading.Event().wait(self.delay)
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(fixture_dir, host="127.0.0.1", port=0, delay=0, requests=None):
+    # Starts the server on a daemon thread; port=0 picks a free port.
+    # requests, if a list, collects (path, status) per request. Returns
+    # (server, base_url). Call server.shutdown() when done.
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {
+        "fixture_dir": fixture_dir, "delay": delay, "requests": requests
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("fixture_dir")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0, help="Artificial latency per response (seconds)")
+    args = parser.parse_args()
+
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"fixture_dir": args.fixture_dir, "delay": args.delay})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Serving fixtures from {args.fixture_dir} on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,462 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# NumPy-only inference for exported models. export_model turns a trained
+# scikit-learn pipeline (StandardScaler + tree ensemble) or a Keras Dense
+# stack into plain arrays; the classes here evaluate them batched with
+# nothing but NumPy, so a serving process never imports sklearn or Keras
+# (unless a FallbackRegressor hands it batches that sklearn predicts faster).
+# Exporting only reads the fitted attributes, so it does not import them
+# either.
+
+COMPILED_FORMAT = "osrs-compiled-model/1"
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+# Bit-vector types for the top levels of each tree, by how many levels
+# they cover (a tree cut at depth d has at most 2 ** d frontier nodes).
+BIT_TYPES = {1: np.uint8, 2: np.uint8, 3: np.uint8, 4: np.uint16, 5: np.uint32, 6: np.uint64}
+
+# Index of the lowest set bit of every 16-bit word (words are never 0).
+_words = np.arange(1 << 16)
+LOWEST_BIT = (np.frexp((_words & -_words).astype(np.float64))[1] - 1).astype(np.int64)
+del _words
+
+
+class CompiledRegressor:
+    # Standard scaling followed by a sum of trees:
+    #     prediction = offset + scale * reduce(tree values)
+    # with reduce the mean (random forests) or the sum (gradient boosting).
+    # All trees share flat node arrays; a tree is the nodes from its root.
+    # Leaves have left == right == -1. Like scikit-learn, inputs are compared as
+    # float32 so predictions match exactly.
+
+    kind = "regressor"
+
+    def __init__(self, feature, threshold, left, right, value, roots, depth, missing_left=None,
+                 reduce="mean", scale=1.0, offset=0.0, mean=None, std=None, metadata=None,
+                 table_bytes=1 << 25):
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.depth = int(depth)
+        # Where NaN inputs go at each split; scikit-learn before 1.3 sent them right.
+        self.missing_left = np.zeros(len(self.left), dtype=bool) if missing_left is None else np.asarray(missing_left, dtype=bool)
+        self.reduce = reduce
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.std = None if std is None else np.asarray(std, dtype=np.float64)
+        self.metadata = metadata or {}
+        # Evaluation arrays: int32 indices halve the memory traffic per pass.
+        leaf = self.left < 0
+        nodes = np.arange(len(self.left), dtype=np.int32)
+        self._feature = np.where(leaf, 0, self.feature).astype(np.int32)
+        self._threshold = np.where(leaf, np.inf, self.threshold)
+        self._missing_left = self.missing_left | leaf
+        self._children = np.column_stack([np.where(leaf, nodes, self.left), np.where(leaf, nodes, self.right)]).astype(np.int32).ravel()
+        self._build_top_levels(table_bytes)
+
+    def _build_top_levels(self, table_bytes):
+        # The top cut levels of every tree are evaluated QuickScorer-style
+        # instead of walked. Within its tree, a node at depth k on path p
+        # (left 0, right 1) owns bits [p << (cut - k), (p + 1) << (cut - k))
+        # of a 2 ** cut bit word. Each split that sends a sample right clears
+        # its left child's bits, and the lowest bit left set belongs to the
+        # frontier node (depth cut, or a shallower leaf) the sample reaches.
+        # Per feature, the splits sorted by threshold give a table whose row
+        # i is every tree's word after the first i splits sent it right, so
+        # one searchsorted per feature and a row gather replace cut levels
+        # of walking. cut is the deepest level (up to 6) whose tables fit in
+        # table_bytes; 0 walks every level.
+        count, trees = len(self.left), len(self.roots)
+        node_depth = np.full(count, -1, dtype=np.int64)
+        path = np.zeros(count, dtype=np.int64)
+        level = self.roots
+        for depth in range(self.depth + 1):
+            node_depth[level] = depth
+            level = level[self.left[level] >= 0]
+            path[self.left[level]] = 2 * path[level]
+            path[self.right[level]] = 2 * path[level] + 1
+            level = np.concatenate([self.left[level], self.right[level]])
+        internal = self.left >= 0
+        self._cut = 0
+        for cut in range(min(6, self.depth), 0, -1):
+            splits = np.count_nonzero(internal & (node_depth < cut))
+            features = len(np.unique(self.feature[internal & (node_depth < cut)]))
+            if (splits + 2 * features) * trees * np.dtype(BIT_TYPES[cut]).itemsize <= table_bytes:
+                self._cut = cut
+                break
+        if not self._cut:
+            return
+        cut, bits = self._cut, BIT_TYPES[self._cut]
+        width = 1 << cut
+        tree = np.searchsorted(self.roots, np.arange(count), side="right") - 1
+
+        frontier = np.flatnonzero((node_depth == cut) | (~internal & (node_depth >= 0) & (node_depth < cut)))
+        self._frontier = np.zeros(trees * width, dtype=np.int32)
+        self._frontier[tree[frontier] * width + (path[frontier] << (cut - node_depth[frontier]))] = frontier
+        self._frontier_value = self.value[self._frontier]
+
+        top = np.flatnonzero(internal & (node_depth >= 0) & (node_depth < cut))
+        span = np.left_shift(1, cut - node_depth[top] - 1).astype(np.uint64)
+        start = (2 * path[top] << (cut - node_depth[top] - 1)).astype(np.uint64)
+        ones = np.iinfo(bits).max
+        masks = (~(((np.uint64(1) << span) - np.uint64(1)) << start) & np.uint64(ones)).astype(bits)
+
+        self._splits = []
+        for index in np.unique(self.feature[top]):
+            nodes = np.flatnonzero(self.feature[top] == index)
+            nodes = nodes[np.argsort(self.threshold[top[nodes]], kind="stable")]
+            table = np.full((len(nodes) + 2, trees), ones, dtype=bits)
+            table[np.arange(1, len(nodes) + 1), tree[top[nodes]]] = masks[nodes]
+            np.bitwise_and.accumulate(table[:-1], axis=0, out=table[:-1])
+            # Last row: where a NaN sends each tree.
+            right = nodes[~self.missing_left[top[nodes]]]
+            np.bitwise_and.at(table[-1], tree[top[right]], masks[right])
+            # x > t exactly when x > t rounded down to float32, so the
+            # searches run on float32 without converting the inputs.
+            thresholds = self.threshold[top[nodes]]
+            rounded = thresholds.astype(np.float32)
+            above = rounded > thresholds
+            rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+            self._splits.append((int(index), rounded, table))
+        self._base = np.arange(trees, dtype=np.int64) * width
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean is not None:
+            X = X - self.mean
+        if self.std is not None:
+            X = X / self.std
+        return X.astype(np.float32)
+
+    def _split_rows(self, X):
+        # Row of every top-level table for each sample: how many of that
+        # feature's splits send it right, or the NaN row.
+        columns = np.ascontiguousarray(X.T)
+        split_rows = []
+        for index, thresholds, table in self._splits:
+            rows = np.searchsorted(thresholds, columns[index], side="left")
+            rows[np.isnan(columns[index])] = len(table) - 1
+            split_rows.append(rows)
+        return split_rows
+
+    def _frontier_positions(self, split_rows, start, stop):
+        # (samples * trees,) position in _frontier of the frontier node each
+        # (sample, tree) pair of rows start:stop reaches.
+        words = None
+        for (_, _, table), rows in zip(self._splits, split_rows):
+            rows = rows[start:stop]
+            words = table[rows] if words is None else np.bitwise_and(words, table[rows], out=words)
+        if words.dtype.itemsize <= 2:
+            bit = LOWEST_BIT[words]
+        else:
+            lowest = words & (~words + words.dtype.type(1))
+            # A power of two converts to float32 exactly; its exponent is the bit.
+            bit = (lowest.astype(np.float32).view(np.int32) >> 23) - 127
+        return (bit + self._base).ravel()
+
+    def apply(self, X, chunk_pairs=1 << 16):
+        # (samples, trees) leaf index per sample and tree. The top levels
+        # come from _frontier_positions; below them every (sample, tree) pair
+        # walks down one level per pass. Leaves point back at themselves
+        # (with an infinite threshold), so pairs that finish early just stay
+        # put; every few levels, once most pairs have finished, the rest are
+        # gathered so deep trees do not walk everyone to the bottom. Rows go
+        # through in chunks of about chunk_pairs pairs to keep the working
+        # arrays in cache.
+        X = self.transform(X)
+        samples, features = X.shape
+        trees = len(self.roots)
+        leaves = np.empty((samples, trees), dtype=np.int32)
+        roots = self.roots.astype(np.int32)
+        rows = max(1, chunk_pairs // max(trees, 1))
+        remaining = self.depth - self._cut
+        split_rows = self._split_rows(X) if self._cut else None
+        for start in range(0, samples, rows):
+            block = X[start:start + rows]
+            result = leaves[start:start + rows].reshape(-1)
+            if self._cut:
+                node = self._frontier[self._frontier_positions(split_rows, start, start + len(block))]
+            else:
+                node = np.tile(roots, len(block))
+            if not remaining:
+                result[:] = node
+                continue
+            flat = block.ravel()
+            missing = np.isnan(flat).any()
+            base = np.repeat(np.arange(len(block), dtype=np.int32) * features, trees)
+            active = None
+            for level in range(remaining):
+                value = flat[base + self._feature[node]]
+                go_right = ~(value <= self._threshold[node])
+                if missing:
+                    go_right = np.where(np.isnan(value), ~self._missing_left[node], go_right)
+                node = self._children[2 * node + go_right]
+                if level % 4 == 3 and level < remaining - 1:
+                    unfinished = self._children[2 * node] != node
+                    if np.count_nonzero(unfinished) * 2 < len(node):
+                        if active is None:
+                            result[:] = node
+                            active = np.flatnonzero(unfinished)
+                        else:
+                            result[active] = node
+                            active = active[unfinished]
+                        node, base = node[unfinished], base[unfinished]
+            if active is None:
+                result[:] = node
+            else:
+                result[active] = node
+        return leaves
+
+    def predict(self, X, chunk_pairs=1 << 16):
+        # Trees that are single leaves (depth 0) have no top levels; apply
+        # returns their roots.
+        if self._cut < self.depth or not self._cut:
+            combined = np.take(self.value, self.apply(X, chunk_pairs)).sum(axis=1)
+        else:
+            # Every tree ends within the top levels: read the leaf values
+            # straight from the frontier positions.
+            X = self.transform(X)
+            trees = len(self.roots)
+            rows = max(1, chunk_pairs // max(trees, 1))
+            split_rows = self._split_rows(X)
+            combined = np.empty(len(X))
+            for start in range(0, len(X), rows):
+                stop = min(start + rows, len(X))
+                positions = self._frontier_positions(split_rows, start, stop)
+                combined[start:stop] = np.take(self._frontier_value, positions).reshape(stop - start, trees).sum(axis=1)
+        if self.reduce == "mean":
+            combined = combined / len(self.roots)
+        return self.offset + self.scale * combined
+
+    def arrays(self):
+        return {
+            "feature": self.feature, "threshold": self.threshold, "left": self.left, "right": self.right,
+            "value": self.value, "roots": self.roots, "depth": np.array(self.depth), "missing_left": self.missing_left,
+            "reduce": np.array(self.reduce), "scale": np.array(self.scale), "offset": np.array(self.offset),
+            **({"mean": self.mean} if self.mean is not None else {}),
+            **({"std": self.std} if self.std is not None else {}),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata=None):
+        return cls(
+            arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"], arrays["value"],
+            arrays["roots"], arrays["depth"], arrays["missing_left"], str(arrays["reduce"]), arrays["scale"], arrays["offset"],
+            arrays.get("mean"), arrays.get("std"), metadata
+        )
+
+
+class FallbackRegressor:
+    # A compiled regressor that hands batches of min_rows rows or more to
+    # the scikit-learn model it was exported from, loaded by load_model on
+    # first use. export records min_rows when scikit-learn predicted large
+    # batches faster (deep trees, where most levels are still walked).
+    # Without a model to load, the compiled one answers every batch.
+
+    kind = "regressor"
+
+    def __init__(self, compiled, load_model, min_rows):
+        self.compiled = compiled
+        self.metadata = compiled.metadata
+        self.load_model = load_model
+        self.min_rows = int(min_rows)
+        self.model = None
+        self.loaded = False
+
+    def predict(self, X):
+        if len(X) >= self.min_rows:
+            if not self.loaded:
+                self.model, self.loaded = self.load_model(), True
+            if self.model is not None:
+                return self.model.predict(X)
+        return self.compiled.predict(X)
+
+
+def measure_fallback_rows(compiled, model, X, repeat=3):
+    # Times compiled against model (the pipeline it was exported from) on
+    # 64, 256, 1024, ... rows of X and all of X. Returns the smallest batch
+    # size from which model was faster at every size measured, or None,
+    # with the (rows, compiled seconds, model seconds) measured.
+    def best(predict, batch):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            predict(batch)
+            times.append(time.perf_counter() - started)
+        return min(times)
+
+    sizes = [rows for rows in (64, 256, 1024) if rows < len(X)] + [len(X)]
+    timings = [(rows, best(compiled.predict, X[:rows]), best(model.predict, X[:rows])) for rows in sizes]
+    fallback_rows = None
+    for rows, compiled_seconds, model_seconds in reversed(timings):
+        if model_seconds >= compiled_seconds:
+            break
+        fallback_rows = rows
+    return fallback_rows, timings
+
+
+class MLPPolicy:
+    # Dense layers as (weights, bias, activation) triples; the Q-network of
+    # OSRSAgent without Keras.
+
+    kind = "policy"
+
+    def __init__(self, layers, metadata=None):
+        self.layers = [
+            (np.asarray(weights, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+            for weights, bias, activation in layers
+        ]
+        for _, _, activation in self.layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+        self.metadata = metadata or {}
+
+    def predict(self, states):
+        x = np.asarray(states, dtype=np.float32)
+        for weights, bias, activation in self.layers:
+            x = ACTIVATIONS[activation](x @ weights + bias)
+        return x
+
+    def act(self, states, epsilon=0.0, rng=None):
+        # Epsilon-greedy actions for a batch of states.
+        rng = rng or np.random.default_rng()
+        actions = np.argmax(self.predict(states), axis=1)
+        if epsilon > 0:
+            explore = rng.random(len(actions)) < epsilon
+            actions[explore] = rng.integers(0, self.layers[-1][1].shape[0], np.count_nonzero(explore))
+        return actions
+
+    def arrays(self):
+        arrays = {}
+        for index, (weights, bias, activation) in enumerate(self.layers):
+            arrays[f"weights_{index}"] = weights
+            arrays[f"bias_{index}"] = bias
+            arrays[f"activation_{index}"] = np.array(activation)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata=None):
+        count = sum(1 for name in arrays if name.startswith("weights_"))
+        return cls(
+            [(arrays[f"weights_{i}"], arrays[f"bias_{i}"], str(arrays[f"activation_{i}"])) for i in range(count)],
+            metadata
+        )
+
+
+COMPILED_KINDS = {cls.kind: cls for cls in (CompiledRegressor, MLPPolicy)}
+
+
+def _flatten_trees(trees):
+    # Concatenates scikit-learn tree_ structures into one set of node arrays.
+    feature, threshold, left, right, value, roots, missing_left = [], [], [], [], [], [], []
+    offset, depth = 0, 0
+    for tree in trees:
+        count = tree.node_count
+        leaf = tree.children_left < 0
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(leaf, -1, tree.children_left + offset))
+        right.append(np.where(leaf, -1, tree.children_right + offset))
+        value.append(tree.value.reshape(count, -1)[:, 0])
+        missing_left.append(getattr(tree, "missing_go_to_left", np.zeros(count, dtype=bool)).astype(bool))
+        depth = max(depth, tree.max_depth)
+        offset += count
+    return (
+        np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+        np.concatenate(right), np.concatenate(value), np.array(roots), depth, np.concatenate(missing_left)
+    )
+
+
+def _export_regressor(regressor, mean=None, std=None):
+    name = type(regressor).__name__
+    if name == "DecisionTreeRegressor":
+        return CompiledRegressor(*_flatten_trees([regressor.tree_]), mean=mean, std=std)
+    if name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        trees = [estimator.tree_ for estimator in regressor.estimators_]
+        return CompiledRegressor(*_flatten_trees(trees), reduce="mean", mean=mean, std=std)
+    if name == "GradientBoostingRegressor":
+        if getattr(regressor, "loss", "squared_error") not in ("squared_error", "ls"):
+            raise ValueError(f"Cannot export GradientBoostingRegressor with loss={regressor.loss!r}")
+        init = regressor.init_
+        if init == "zero":
+            offset = 0.0
+        elif type(init).__name__ == "DummyRegressor":
+            offset = float(np.ravel(init.constant_)[0])
+        else:
+            raise ValueError(f"Cannot export GradientBoostingRegressor with init={type(init).__name__}")
+        trees = [stage[0].tree_ for stage in regressor.estimators_]
+        return CompiledRegressor(
+            *_flatten_trees(trees), reduce="sum", scale=regressor.learning_rate, offset=offset, mean=mean, std=std
+        )
+    raise ValueError(f"Cannot export {name}")
+
+
+def export_model(model):
+    # Compiles a fitted Pipeline(scaler, tree ensemble) or a Keras Dense
+    # stack. Bare regressors saved before pipelines scale each batch on the
+    # fly, which a compiled model cannot reproduce; retrain them first.
+    if hasattr(model, "named_steps"):
+        steps = list(model.named_steps.values())
+        scaler, regressor = (steps[0], steps[-1]) if len(steps) == 2 else (None, steps[-1])
+        if len(steps) > 2 or (scaler is not None and type(scaler).__name__ != "StandardScaler"):
+            raise ValueError(f"Cannot export pipeline steps {[type(step).__name__ for step in steps]}")
+        mean = getattr(scaler, "mean_", None) if scaler is not None else None
+        std = getattr(scaler, "scale_", None) if scaler is not None else None
+        return _export_regressor(regressor, mean, std)
+    if hasattr(model, "layers"):
+        layers = []
+        for layer in model.layers:
+            if type(layer).__name__ != "Dense":
+                raise ValueError(f"Cannot export layer {type(layer).__name__}")
+            weights = layer.get_weights()
+            bias = weights[1] if len(weights) > 1 else np.zeros(weights[0].shape[1])
+            layers.append((weights[0], bias, layer.activation.__name__))
+        return MLPPolicy(layers)
+    raise ValueError(f"Cannot export {type(model).__name__}; retrain it as a pipeline")
+
+
+def save_compiled(compiled, path, metadata=None):
+    # The compiled arrays plus JSON metadata (kind, model version, ...) in
+    # one .npz, written then renamed so readers never see a partial file.
+    metadata = dict(compiled.metadata, **(metadata or {}))
+    header = json.dumps({"format": COMPILED_FORMAT, "kind": compiled.kind, "metadata": metadata})
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_file = tempfile.mkstemp(prefix=".compiled-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            np.savez(file, header=np.array(header), **compiled.arrays())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, path)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    compiled.metadata = metadata
+    print(f"Saved compiled {compiled.kind} to {path}.")
+
+
+def load_compiled(path):
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data["header"]))
+        if header.get("format") != COMPILED_FORMAT:
+            raise ValueError(f"{path} is not a compiled model")
+        arrays = {name: data[name] for name in data.files if name != "header"}
+    return COMPILED_KINDS[header["kind"]].from_arrays(arrays, header["metadata"])
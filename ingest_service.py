@@ -0,0 +1,349 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from api_client import OSRSApiClient, ApiError
+from compaction import Compactor
+from config import Config
+from data_manager import DataManager
+from feature_engine import FeatureEngine
+from mapping_cache import MappingCache
+from price_store import DAY, PriceStore
+from snapshot import ItemSnapshot, build_snapshot, diff_snapshots
+
+
+class SnapshotStore:
+    # Latest published snapshot, shared by every consumer in the process.
+    # Readers never touch the network or the database.
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.snapshot = None
+        self.version = 0
+        self.listeners = []
+
+    def publish(self, snapshot):
+        with self.condition:
+            self.snapshot = snapshot
+            self.version += 1
+            version = self.version
+            self.condition.notify_all()
+        for callback in list(self.listeners):
+            callback(snapshot, version)
+        return version
+
+    def latest(self):
+        with self.condition:
+            return self.snapshot
+
+    def latest_with_version(self):
+        with self.condition:
+            return self.snapshot, self.version
+
+    def wait_for_update(self, after_version=0, timeout=None):
+        # Blocks until a snapshot newer than after_version is published.
+        with self.condition:
+            self.condition.wait_for(lambda: self.version > after_version, timeout)
+            return self.snapshot if self.version > after_version else None
+
+    def add_listener(self, callback):
+        # callback(snapshot, version) runs after every publish.
+        self.listeners.append(callback)
+
+
+class WindowQueue:
+    # Snapshots waiting for the DB writer, keyed by /5m window, oldest
+    # first. A snapshot for a window that is still waiting replaces it (same
+    # window, same ticks); distinct windows are never dropped. With maxsize
+    # windows waiting, put blocks until the writer catches up.
+
+    def __init__(self, maxsize):
+        self.condition = threading.Condition()
+        self.pending = OrderedDict()
+        self.maxsize = maxsize
+
+    def put(self, key, item, stop_event=None):
+        # Returns True when item replaced a waiting snapshot of its window.
+        with self.condition:
+            if key in self.pending:
+                self.pending[key] = item
+                return True
+            while len(self.pending) >= self.maxsize and not (stop_event is not None and stop_event.is_set()):
+                self.condition.wait(0.5)
+            self.pending[key] = item
+            self.condition.notify_all()
+            return False
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.pending, timeout):
+                raise queue.Empty
+            _, item = self.pending.popitem(last=False)
+            self.condition.notify_all()
+            return item
+
+    def qsize(self):
+        with self.condition:
+            return len(self.pending)
+
+    def empty(self):
+        return not self.qsize()
+
+
+class IngestMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.polls = 0
+        self.poll_errors = 0
+        self.published = 0
+        self.written = 0
+        self.coalesced = 0
+        self.write_errors = 0
+        self.last_lag = None
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_write_seconds = None
+        self.last_error = None
+        self.row_counts = {}
+
+    def record_write(self, lag, write_seconds, stats):
+        with self.lock:
+            self.written += 1
+            for name, count in stats.items():
+                self.row_counts[name] = self.row_counts.get(name, 0) + count
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.last_write_seconds = write_seconds
+
+    def increment(self, name, error=None):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+            if error is not None:
+                self.last_error = str(error)
+
+    def as_dict(self, queue_depth=0):
+        with self.lock:
+            return {
+                "polls": self.polls,
+                "poll_errors": self.poll_errors,
+                "snapshots_published": self.published,
+                "snapshots_written": self.written,
+                "snapshots_coalesced": self.coalesced,
+                "write_errors": self.write_errors,
+                "queue_depth": queue_depth,
+                "ingest_lag_last": self.last_lag,
+                "ingest_lag_avg": self.total_lag / self.written if self.written else None,
+                "ingest_lag_max": self.max_lag,
+                "last_write_seconds": self.last_write_seconds,
+                "last_error": self.last_error,
+                **self.row_counts,
+            }
+
+
+class IngestService:
+    # Polls /latest and /5m on their own cadence, publishes each parsed
+    # snapshot to a SnapshotStore and hands it to a single DB-writer thread
+    # through a WindowQueue. A snapshot is published only when the /5m
+    # window or the set of /latest item ids changes.
+
+    def __init__(self, config=Config, api_client=None, data_manager=None, store=None, price_store=None, compactor=None, feature_engine=None):
+        self.config = config
+        self.api_client = api_client or OSRSApiClient(config.API_BASE_URL)
+        self.data_manager = data_manager or DataManager(config.DB_FILE)
+        self.mapping_cache = MappingCache(config.MAPPING_CACHE_FILE, config.MAPPING_CACHE_TTL)
+        self.store = store or SnapshotStore()
+        self.price_store = price_store or PriceStore(config.PRICE_STORE_DIR)
+        # Rollups run on their own thread and connection, one short
+        # transaction per bucket, so they interleave with the writer.
+        self.compactor = compactor or Compactor(self.data_manager)
+        self.feature_engine = feature_engine or FeatureEngine(checkpoint_file=config.FEATURE_STATE_FILE)
+        self.feature_updates = 0
+        self.sealed_day = None
+        self.queue = WindowQueue(config.INGEST_QUEUE_SIZE)
+        self.metrics = IngestMetrics()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.data_latest = None
+        self.latest_ids = None
+        self.data_5m = None
+        self.window_5m = None
+        self.next_latest_poll = 0.0
+        self.next_5m_poll = 0.0
+        self.previous_written = None
+
+    def start(self):
+        if self.threads:
+            return self
+        self.data_manager.create_tables()
+        if self.store.latest() is None:
+            self._seed_from_database()
+        self.stop_event.clear()
+        self.threads = [
+            threading.Thread(target=self._poll_loop, name="ingest-poller", daemon=True),
+            threading.Thread(target=self._write_loop, name="ingest-writer", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        self.compactor.start(self.config.COMPACTION_INTERVAL)
+        print("Ingest service started.")
+        return self
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        self.compactor.stop(timeout)
+        self._checkpoint_features()
+        self.data_manager.close()
+        print("Ingest service stopped.")
+
+    def _seed_from_database(self):
+        # Serve the last persisted items until the first poll completes.
+        rows = self.data_manager.get_all_items()
+        if rows:
+            # The persisted items are also the baseline for the first diff.
+            self.previous_written = ItemSnapshot.from_db_rows(rows)
+            self.store.publish(self.previous_written)
+            print(f"Seeded snapshot store with {len(rows)} items from the database.")
+
+    def latest(self):
+        return self.store.latest()
+
+    def wait_for_snapshot(self, timeout=None):
+        snapshot = self.store.latest()
+        if snapshot is not None:
+            return snapshot
+        return self.store.wait_for_update(0, timeout)
+
+    def get_metrics(self):
+        return self.metrics.as_dict(self.queue.qsize())
+
+    def _next_5m_poll_time(self, now):
+        interval = self.config.FIVE_MINUTE_POLL_INTERVAL
+        return (now // interval + 1) * interval + self.config.FIVE_MINUTE_POLL_DELAY
+
+    async def _fetch(self, endpoints):
+        payloads = await asyncio.gather(
+            *(self.api_client.get_json_async(endpoint) for endpoint in endpoints),
+            return_exceptions=True
+        )
+        return dict(zip(endpoints, payloads))
+
+    def poll_once(self):
+        # Fetches whichever endpoints are due and publishes a snapshot if
+        # anything new arrived. Returns the published snapshot or None.
+        now = time.time()
+        endpoints = []
+        if now >= self.next_latest_poll:
+            endpoints.append("latest")
+        if now >= self.next_5m_poll:
+            endpoints.append("5m")
+        if not endpoints:
+            return None
+
+        self.metrics.increment("polls")
+        payloads = asyncio.run(self._fetch(endpoints))
+        changed = False
+        for endpoint, payload in payloads.items():
+            if isinstance(payload, Exception) or "data" not in payload:
+                error = payload if isinstance(payload, Exception) else ApiError(f"No data in /{endpoint} response")
+                print(f"Error polling /{endpoint}: {error}")
+                self.metrics.increment("poll_errors", error)
+                retry_at = now + self.config.POLL_RETRY_DELAY
+                if endpoint == "latest":
+                    self.next_latest_poll = retry_at
+                else:
+                    self.next_5m_poll = retry_at
+                continue
+            if endpoint == "latest":
+                # build_snapshot only takes item ids from /latest.
+                self.data_latest = payload["data"]
+                self.next_latest_poll = now + self.config.LATEST_POLL_INTERVAL
+                latest_ids = frozenset(self.data_latest)
+                if latest_ids != self.latest_ids:
+                    self.latest_ids = latest_ids
+                    changed = True
+            else:
+                window = payload.get("timestamp")
+                self.next_5m_poll = self._next_5m_poll_time(now)
+                if window is None or window != self.window_5m:
+                    self.data_5m = payload["data"]
+                    self.window_5m = window
+                    changed = True
+        if not changed or self.data_latest is None or self.data_5m is None:
+            return None
+
+        item_mapping = self.mapping_cache.get_mapping(self.api_client)
+        snapshot = build_snapshot(self.data_latest, self.data_5m, item_mapping, self.window_5m or int(now))
+        # Features first, so suggestions for this snapshot see them.
+        self._update_features(snapshot)
+        self.store.publish(snapshot)
+        self.metrics.increment("published")
+        self._enqueue(snapshot, now)
+        return snapshot
+
+    def _update_features(self, snapshot):
+        if not self.feature_engine.update(snapshot):
+            return
+        self.feature_updates += 1
+        if self.feature_updates % self.config.FEATURE_CHECKPOINT_EVERY == 0:
+            self._checkpoint_features()
+
+    def _checkpoint_features(self):
+        try:
+            if len(self.feature_engine):
+                self.feature_engine.save()
+        except Exception as e:
+            print(f"Error saving feature state: {e}")
+
+    def _enqueue(self, snapshot, fetched_at):
+        if self.queue.put(snapshot.timestamp, (snapshot, fetched_at), self.stop_event):
+            self.metrics.increment("coalesced")
+
+    def _poll_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Error in ingest poller: {e}")
+                self.metrics.increment("poll_errors", e)
+            wait = min(self.next_latest_poll, self.next_5m_poll) - time.time()
+            self.stop_event.wait(min(max(wait, 1.0), self.config.LATEST_POLL_INTERVAL))
+
+    def _append_price_store(self, ticks, timestamp):
+        try:
+            if len(ticks):
+                self.price_store.append_snapshot(ticks, timestamp)
+            # Finished days are sorted and indexed once, on the first write of a new day.
+            day = int(timestamp // DAY)
+            if day != self.sealed_day:
+                self.price_store.seal()
+                self.sealed_day = day
+        except Exception as e:
+            print(f"Error appending to price store: {e}")
+            self.metrics.increment("write_errors", e)
+
+    def _write_loop(self):
+        # The only thread that writes snapshots to SQLite.
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                snapshot, fetched_at = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            try:
+                masks = diff_snapshots(self.previous_written, snapshot)
+                stats = self.data_manager.save_snapshot_changes(snapshot, self.previous_written, snapshot.timestamp, masks)
+                if stats is None:
+                    self.metrics.increment("write_errors")
+                    continue
+                self.previous_written = snapshot
+                self._append_price_store(snapshot.take(masks[1]), snapshot.timestamp)
+                self.metrics.record_write(time.time() - fetched_at, time.perf_counter() - start, stats)
+            except Exception as e:
+                print(f"Error writing snapshot: {e}")
+                self.metrics.increment("write_errors", e)
@@ -1,12 +1,26 @@
-
 # main.py
+#
+# Entry point. Without a subcommand the Kivy app is started; the headless
+# subcommands import only what they need, so `scrape` never loads Kivy,
+# scikit-learn or Keras:
+#
+#     python main.py                       # GUI
+#     python main.py scrape
+#     python main.py suggest --gold 100000000
+#     python main.py suggest --gold 1000000 10000000 100000000 1000000000   # budget-sensitivity table
+#     python main.py train
+#     python main.py train --rl --workers 8
+#     python main.py serve
+#     python main.py backfill --timestep 5m 1h
+#     python main.py compact
+#     python main.py backtest --gold 10000000 100000000 --min-profit 100000 1000000
+#     python main.py export                # then: python main.py suggest --gold 100000000 --compiled
+#     python main.py serve-suggestions --port 8766
 
-from kivy.core.window import Window
-from kivy.utils import get_color_from_hex
-from OSRSGrandExchangeApp import OSRSGrandExchangeApp
 import argparse
 import logging
 import sys
+import time
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
@@ -16,19 +30,387 @@ def update_rl_parameters(agent, new_params):
     agent.gamma = new_params.get('gamma', agent.gamma)
     logging.info('Updated RL parameters.')
 
-if __name__ == "__main__":
+def scrape_snapshot():
+    from config import Config
+    from OSRSScraper import OSRSScraper
+
+    scraper = OSRSScraper(Config)
+    return scraper.scrape_data()
+
+def run_gui(args):
+    from kivy.core.window import Window
+    from kivy.utils import get_color_from_hex
+    from OSRSGrandExchangeApp import OSRSGrandExchangeApp
+
+    Window.clearcolor = get_color_from_hex(args.background_color)
+    Window.size = (args.window_size[0], args.window_size[1])
+
+    app = OSRSGrandExchangeApp()
+    app.run()
+    return 0
+
+def run_scrape(args):
+    start = time.perf_counter()
+    snapshot = scrape_snapshot()
+    print(f"Scraped {len(snapshot)} items in {time.perf_counter() - start:.2f}s.")
+    return 0 if len(snapshot) else 1
+
+def load_compiled_model(path, model_file):
+    # The compiled model, or, if export found scikit-learn faster on large
+    # batches, a FallbackRegressor that loads the published model of the
+    # same version for them.
+    from config import Config
+    from inference import FallbackRegressor, load_compiled
+
+    compiled = load_compiled(path or Config.COMPILED_MODEL_FILE)
+    fallback_rows = compiled.metadata.get("fallback_rows")
+    if not fallback_rows:
+        return compiled
+
+    def load_model():
+        from model_registry import get_registry
+
+        registry = get_registry(model_file)
+        model = registry.get(kind="regressor")
+        if model is None or registry.version() != compiled.metadata.get("version"):
+            logging.warning("Published model does not match the compiled one; using the compiled model for every batch.")
+            return None
+        return model
+
+    return FallbackRegressor(compiled, load_model, fallback_rows)
+
+def load_feature_engine(snapshot):
+    # The ingest service's streaming feature state brought up to snapshot,
+    # or None if the service has never saved any. It is not saved back: the
+    # service owns the checkpoint.
+    from config import Config
+    from feature_engine import FeatureEngine
+
+    engine = FeatureEngine(checkpoint_file=Config.FEATURE_STATE_FILE)
+    if not len(engine):
+        return None
+    if snapshot.timestamp is not None:
+        engine.update(snapshot)
+    return engine
+
+def run_suggest(args):
+    snapshot = scrape_snapshot()
+    if not len(snapshot):
+        logging.error("No item data available.")
+        return 1
+
+    from utils import format_budget_sweep, format_suggestions, generate_item_suggestions, sweep_budgets
+
+    if args.no_model:
+        model = None
+    elif args.compiled is not None:
+        from feature_engine import model_schema
+
+        model = load_compiled_model(args.compiled, args.model_file)
+        if model.metadata.get("feature_schema") not in (model_schema(), model_schema(stream=True)):
+            logging.error("Compiled model feature schema does not match; run `python main.py export` again.")
+            return 1
+    else:
+        from model_registry import get_registry
+
+        model = get_registry(args.model_file).get(kind="regressor")
+    feature_engine = load_feature_engine(snapshot) if model is not None else None
+    if len(args.gold) > 1:
+        results = sweep_budgets(snapshot, args.gold, model, top_k=args.top, method=args.allocation, max_share=args.max_share, feature_engine=feature_engine)
+        print(f"Budget Sensitivity:\n{format_budget_sweep(args.gold, results)}")
+        return 0 if any(results) else 1
+
+    suggestions = generate_item_suggestions(snapshot, args.gold[0], model, top_k=args.top, method=args.allocation, max_share=args.max_share, feature_engine=feature_engine)
+    if not suggestions:
+        print("No item suggestions found.")
+        return 1
+    print(f"Item Suggestions:\n{format_suggestions(suggestions)}")
+    return 0
+
+def run_train(args):
+    snapshot = scrape_snapshot()
+    if not len(snapshot):
+        logging.error("No item data available.")
+        return 1
+    if args.rl:
+        return run_train_rl(args, snapshot)
+
+    from model_registry import get_registry
+    from model_search import HyperparameterSearch
+    from utils import build_pipeline, train_model
+
+    search = HyperparameterSearch(build_pipeline, strategy=args.strategy, n_jobs=args.n_jobs, time_budget=args.time_budget)
+    model = train_model(snapshot, search=search, feature_engine=load_feature_engine(snapshot))
+    if model is None:
+        logging.error("Model training failed.")
+        return 1
+    metadata = get_registry(args.model_file).publish(model, kind="regressor")
+    print(f"Published model version {metadata['version']}.")
+    return 0
+
+def run_train_rl(args, snapshot):
+    from model_registry import get_registry
+    from osrs_rl.trainer import OSRSTrainer
+
+    trainer = OSRSTrainer(snapshot, workers=args.workers)
+    if args.episodes:
+        trainer.episodes = args.episodes
+    trainer.train()
+    metadata = get_registry(args.model_file).publish(trainer.agent, kind="rl")
+    print(f"Published RL model version {metadata['version']}.")
+    return 0
+
+def run_serve(args):
+    from ingest_service import IngestService
+
+    service = IngestService().start()
+    print(f"Ingest service running; reporting metrics every {args.interval}s. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(args.interval)
+            print(f"Ingest metrics: {service.get_metrics()}")
+    except KeyboardInterrupt:
+        print("Stopping.")
+    finally:
+        service.stop()
+    return 0
+
+def run_serve_suggestions(args):
+    from ingest_service import IngestService
+    from suggestion_server import SuggestionService, serve_suggestions
+
+    # The ingest service keeps the snapshot current; the model stays loaded.
+    ingest = IngestService().start()
+    if args.compiled is not None:
+        model = load_compiled_model(args.compiled, args.model_file)
+        service = SuggestionService(ingest.store, model=model, model_version=model.metadata.get("version"), feature_engine=ingest.feature_engine)
+    else:
+        from model_registry import get_registry
+
+        service = SuggestionService(ingest.store, model_registry=get_registry(args.model_file), feature_engine=ingest.feature_engine)
+    service.start()
+    server, address = serve_suggestions(service, args.host, args.port, args.socket)
+    print(f"Serving suggestions on {address}; reporting metrics every {args.interval}s. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(args.interval)
+            print(f"Suggestion metrics: {service.metrics()}")
+    except KeyboardInterrupt:
+        print("Stopping.")
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.stop()
+        ingest.stop()
+    return 0
+
+def run_backfill(args):
+    from backfill import Backfiller
+
+    backfiller = Backfiller(concurrency=args.concurrency, rate=args.rate)
+    try:
+        summary = backfiller.run(args.timestep, restart=args.restart)
+    except RuntimeError as e:
+        print(f"Backfill failed: {e}")
+        return 1
+    print(f"Backfill summary: {summary}")
+    return 0 if all(result["failed"] == 0 for result in summary.values()) else 1
+
+def run_store_import(args):
+    from config import Config
+    from data_manager import DataManager
+    from price_store import PriceStore
+
+    store = PriceStore(Config.PRICE_STORE_DIR)
+    if args.rebuild:
+        store.clear()
+    store.import_from_database(DataManager(Config.DB_FILE))
+    return 0
+
+def run_compact(args):
+    from compaction import Compactor
+    from config import Config
+    from data_manager import DataManager
+
+    data_manager = DataManager(Config.DB_FILE)
+    data_manager.create_tables()
+    compactor = Compactor(data_manager)
+    total = 0
+    while True:
+        steps = compactor.run_once(args.steps)
+        total += steps
+        if steps < args.steps:
+            break
+    print(f"Compaction finished after {total} steps.")
+    return 0
+
+def run_backtest(args):
+    from backtest import HeuristicStrategy, ModelStrategy, sweep
+    from price_store import DAY
+
+    end = int(time.time())
+    start = end - args.days * DAY if args.days else None
+    grid = {"min_total_profit": args.min_profit, "top_k": args.top}
+    strategy_class = HeuristicStrategy
+    if args.model:
+        from model_registry import get_registry
+
+        model = get_registry(args.model_file).get(kind="regressor")
+        if model is None:
+            logging.error("No model available.")
+            return 1
+        grid["model"] = [model]
+        strategy_class = ModelStrategy
+
+    started = time.perf_counter()
+    results = sweep(strategy_class, grid, args.gold, start=start, end=end, processes=args.processes)
+    print(f"Backtested {len(results)} cases in {time.perf_counter() - started:.1f}s.")
+    for result in results:
+        params = ", ".join(f"{key}={value}" for key, value in sorted(result["params"].items()))
+        print(
+            f"{result['strategy']:<10} gold={result['starting_gold']:>14,.0f}  return={result['return_pct']:8.2f}%  "
+            f"drawdown={result['max_drawdown_pct']:6.2f}%  buys={result['buys']:>6}  ({params})"
+        )
+    return 0 if results else 1
+
+def run_export(args):
+    from config import Config
+    from inference import export_model, save_compiled
+
+    if args.rl:
+        from osrs_rl.agent import OSRSAgent
+
+        agent = OSRSAgent(9, 2)
+        agent.load(args.rl)
+        save_compiled(export_model(agent.model), args.output or Config.RL_POLICY_FILE, {"source": args.rl})
+        return 0
+
+    from model_registry import get_registry
+
+    registry = get_registry(args.model_file)
+    model = registry.get(kind="regressor")
+    if model is None:
+        logging.error("No model available.")
+        return 1
+    metadata = registry.get_metadata()
+    compiled = export_model(model)
+    exported = {key: metadata.get(key) for key in ("version", "kind", "model_class", "feature_schema")}
+
+    # Deep trees still walk most levels one pass at a time, which can lose
+    # to scikit-learn on a full snapshot; measure on the stored items and
+    # record from which batch size the published model should answer.
+    from data_manager import DataManager
+    from feature_engine import model_inputs
+    from inference import measure_fallback_rows
+    from snapshot import ItemSnapshot
+
+    snapshot = ItemSnapshot.from_db_rows(DataManager(Config.DB_FILE).get_all_items())
+    if len(snapshot):
+        X = model_inputs(snapshot, metadata["feature_schema"], load_feature_engine(snapshot))
+        exported["fallback_rows"], timings = measure_fallback_rows(compiled, model, X)
+        for rows, compiled_seconds, model_seconds in timings:
+            print(f"{rows:>6} rows: compiled {compiled_seconds * 1000:8.2f} ms, scikit-learn {model_seconds * 1000:8.2f} ms")
+        if exported["fallback_rows"]:
+            print(f"scikit-learn is faster from {exported['fallback_rows']} rows; --compiled loads the published model for those batches.")
+    save_compiled(compiled, args.output or Config.COMPILED_MODEL_FILE, exported)
+    print(f"Exported model version {metadata.get('version')}: {len(compiled.roots)} trees, {len(compiled.left)} nodes.")
+    return 0
+
+# The measured figures live in the README only; see `python benchmarks.py inference`.
+COMPILED_SPEED = (
+    "Faster than scikit-learn for small batches and shallow trees but not always on a full snapshot; "
+    "`export` records the batch size from which the published model answers instead. "
+    "Measure with `python benchmarks.py inference`."
+)
+
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("--window-size", nargs=2, type=int, default=[800, 600], help="Window size (width height)")
     parser.add_argument("--background-color", type=str, default="#1E1E1E", help="Background color (hex)")
-    args = parser.parse_args()
+    subparsers = parser.add_subparsers(dest="command")
 
-    Window.clearcolor = get_color_from_hex(args.background_color)
-    Window.size = (args.window_size[0], args.window_size[1])
+    subparsers.add_parser("gui", help="Start the Kivy app (default)")
+
+    subparsers.add_parser("scrape", help="Fetch and store one market snapshot")
+
+    suggest = subparsers.add_parser("suggest", help="Scrape and print flip suggestions")
+    suggest.add_argument("--gold", type=int, nargs="+", required=True, help="Starting gold; several amounts print a budget-sensitivity table")
+    suggest.add_argument("--top", type=int, default=5, help="Number of suggestions")
+    suggest.add_argument("--model-file", default=None, help="Model file (default: Config.MODEL_FILE)")
+    suggest.add_argument("--no-model", action="store_true", help="Ignore the trained model and rank by potential profit")
+    suggest.add_argument("--allocation", choices=["greedy", "exact"], default=None, help="Basket solver (default: Config.ALLOCATION_METHOD)")
+    suggest.add_argument("--max-share", type=float, default=None, help="Most of the gold one item may take, e.g. 0.25")
+    suggest.add_argument("--compiled", nargs="?", const="", default=None, metavar="FILE",
+                         help="Use a model compiled by `export` (default file: Config.COMPILED_MODEL_FILE). " + COMPILED_SPEED)
+
+    train = subparsers.add_parser("train", help="Scrape, train and publish a new model")
+    train.add_argument("--strategy", choices=["random", "halving", "grid"], default=None)
+    train.add_argument("--n-jobs", type=int, default=None)
+    train.add_argument("--time-budget", type=float, default=None, help="Search time budget in seconds")
+    train.add_argument("--model-file", default=None, help="Model file (default: Config.MODEL_FILE)")
+    train.add_argument("--rl", action="store_true", help="Train the reinforcement learning agent instead")
+    train.add_argument("--workers", type=int, default=None,
+                       help="With --rl, collect episodes in this many processes (default: Config.RL_WORKERS)")
+    train.add_argument("--episodes", type=int, default=None, help="With --rl, episodes to train")
+
+    backfill = subparsers.add_parser("backfill", help="Load /timeseries history for every item (resumable)")
+    backfill.add_argument("--timestep", nargs="+", choices=["5m", "1h", "6h"], default=["5m"])
+    backfill.add_argument("--concurrency", type=int, default=None, help="Requests in flight")
+    backfill.add_argument("--rate", type=float, default=None, help="Requests per second")
+    backfill.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+
+    store_import = subparsers.add_parser("store-import", help="Copy the SQLite prices table into the columnar price store")
+    store_import.add_argument("--rebuild", action="store_true", help="Delete the existing price store first")
 
+    compact = subparsers.add_parser("compact", help="Roll old ticks into 1h/1d buckets and prune past retention")
+    compact.add_argument("--steps", type=int, default=100, help="Transactions per pass")
+
+    backtest = subparsers.add_parser("backtest", help="Replay the price store for a grid of strategy settings")
+    backtest.add_argument("--gold", type=float, nargs="+", default=[100000000], help="Starting gold amounts")
+    backtest.add_argument("--min-profit", type=float, nargs="+", default=[1000000], help="Minimum total profit thresholds")
+    backtest.add_argument("--top", type=int, nargs="+", default=[5], help="Items bought per step")
+    backtest.add_argument("--days", type=int, default=None, help="Only replay the last N days")
+    backtest.add_argument("--model", action="store_true", help="Filter with the published model instead of the heuristic")
+    backtest.add_argument("--model-file", default=None, help="Model file (default: Config.MODEL_FILE)")
+    backtest.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per core)")
+
+    export = subparsers.add_parser("export", help="Compile the published model (or an RL policy) to NumPy arrays")
+    export.add_argument("--model-file", default=None, help="Model file (default: Config.MODEL_FILE)")
+    export.add_argument("--rl", default=None, metavar="WEIGHTS", help="Export OSRSAgent weights, e.g. osrs_rl_model.h5, instead")
+    export.add_argument("--output", default=None, help="Output file (default: Config.COMPILED_MODEL_FILE or Config.RL_POLICY_FILE)")
+
+    serve = subparsers.add_parser("serve", help="Run the ingest service until interrupted")
+    serve.add_argument("--interval", type=float, default=60, help="Seconds between metrics reports")
+
+    serve_suggestions = subparsers.add_parser("serve-suggestions", help="Serve suggestions over local HTTP until interrupted")
+    serve_suggestions.add_argument("--host", default=None, help="Host (default: Config.SUGGEST_HOST)")
+    serve_suggestions.add_argument("--port", type=int, default=None, help="Port (default: Config.SUGGEST_PORT)")
+    serve_suggestions.add_argument("--socket", default=None, help="Listen on this Unix socket instead of TCP")
+    serve_suggestions.add_argument("--model-file", default=None, help="Model file (default: Config.MODEL_FILE)")
+    serve_suggestions.add_argument("--compiled", nargs="?", const="", default=None, metavar="FILE",
+                                   help="Serve a model compiled by `export` (default file: Config.COMPILED_MODEL_FILE). " + COMPILED_SPEED)
+    serve_suggestions.add_argument("--interval", type=float, default=60, help="Seconds between metrics reports")
+    return parser
+
+COMMANDS = {
+    None: run_gui,
+    "gui": run_gui,
+    "scrape": run_scrape,
+    "suggest": run_suggest,
+    "train": run_train,
+    "serve": run_serve,
+    "serve-suggestions": run_serve_suggestions,
+    "backfill": run_backfill,
+    "store-import": run_store_import,
+    "compact": run_compact,
+    "backtest": run_backtest,
+    "export": run_export,
+}
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
     try:
-        app = OSRSGrandExchangeApp()
-        app.run()
+        sys.exit(COMMANDS[args.command](args))
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         sys.exit(1)
-
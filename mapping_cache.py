@@ -0,0 +1,121 @@
+import gzip
+import os
+import pickle
+import threading
+import time
+
+from api_client import ApiError
+
+# In-process copies shared by every MappingCache (and so every scraper) in
+# this process, keyed by cache file path.
+_memory_cache = {}
+_memory_lock = threading.Lock()
+
+
+class MappingCache:
+    def __init__(self, cache_file, ttl):
+        self.cache_file = cache_file
+        self.ttl = ttl
+
+    def _is_fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def _load_disk(self):
+        try:
+            with gzip.open(self.cache_file, "rb") as file:
+                entry = pickle.load(file)
+            print(f"Loaded item mapping cache from {self.cache_file} ({len(entry['items'])} items).")
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error loading item mapping cache: {e}")
+            return None
+
+    def _save_disk(self, entry):
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with gzip.open(tmp_file, "wb") as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Error saving item mapping cache: {e}")
+
+    def _entry(self):
+        with _memory_lock:
+            entry = _memory_cache.get(self.cache_file)
+            if entry is None:
+                entry = self._load_disk()
+                if entry is not None:
+                    _memory_cache[self.cache_file] = entry
+            return entry
+
+    def _publish(self, entry):
+        with _memory_lock:
+            _memory_cache[self.cache_file] = entry
+        self._save_disk(entry)
+
+    def get_cached(self):
+        # Fresh mapping from memory or disk, or None if a request is needed.
+        entry = self._entry()
+        return entry["items"] if self._is_fresh(entry) else None
+
+    def _revalidation_headers(self, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _handle_response(self, response, entry):
+        if response.status_code == 304 and entry is not None:
+            print("Item mapping not modified; refreshing cache timestamp.")
+            entry = dict(entry, fetched_at=time.time())
+        else:
+            items = {item['id']: item for item in response.json()}
+            entry = {
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "items": items,
+            }
+            print(f"Item mapping fetched successfully ({len(items)} items).")
+        self._publish(entry)
+        return entry["items"]
+
+    def _fallback(self, entry, error):
+        if entry is not None:
+            print(f"Error fetching item mapping: {error}. Using cached copy.")
+            return entry["items"]
+        print(f"Error fetching item mapping: {error}")
+        return {}
+
+    def get_mapping(self, api_client):
+        entry = self._entry()
+        if self._is_fresh(entry):
+            return entry["items"]
+        try:
+            response = api_client.get("mapping", headers=self._revalidation_headers(entry))
+            return self._handle_response(response, entry)
+        except (ApiError, ValueError) as e:
+            return self._fallback(entry, e)
+
+    async def get_mapping_async(self, api_client):
+        entry = self._entry()
+        if self._is_fresh(entry):
+            return entry["items"]
+        try:
+            response = await api_client.get_async("mapping", headers=self._revalidation_headers(entry))
+            return self._handle_response(response, entry)
+        except (ApiError, ValueError) as e:
+            return self._fallback(entry, e)
+
+    def clear(self):
+        with _memory_lock:
+            _memory_cache.pop(self.cache_file, None)
+        try:
+            os.remove(self.cache_file)
+        except FileNotFoundError:
+            pass
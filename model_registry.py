@@ -0,0 +1,128 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from config import Config
+from feature_engine import model_schema, schema_of
+from snapshot import FEATURE_COLUMNS
+
+REGISTRY_FORMAT = "osrs-model-registry/1"
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def wrap_model(model, metadata):
+    return {"format": REGISTRY_FORMAT, "metadata": metadata, "model": model}
+
+
+def unwrap_model(payload):
+    # Returns (model, metadata). Bare pickled models from before the
+    # registry existed are treated as version 0.
+    if isinstance(payload, dict) and payload.get("format") == REGISTRY_FORMAT:
+        return payload["model"], payload["metadata"]
+    return payload, {"version": 0, "kind": "regressor", "feature_schema": list(FEATURE_COLUMNS)}
+
+
+class ModelRegistry:
+    def __init__(self, model_file):
+        self.model_file = model_file
+        self.lock = threading.Lock()
+        self.model = None
+        self.metadata = None
+        self.loaded = False
+        self.listeners = []
+
+    def _load(self):
+        try:
+            print(f"Loading model from file: {self.model_file}")
+            with open(self.model_file, "rb") as file:
+                model, metadata = unwrap_model(pickle.load(file))
+        except FileNotFoundError:
+            print(f"Model file not found: {self.model_file}")
+            return None, None
+        except Exception as e:
+            print(f"Error occurred while loading model: {e}")
+            return None, None
+        if metadata.get("feature_schema") not in (model_schema(), model_schema(stream=True)):
+            print(f"Model feature schema {metadata.get('feature_schema')} is not supported. Ignoring model.")
+            return None, None
+        print(f"Loaded model version {metadata.get('version')} ({metadata.get('kind')}).")
+        return model, metadata
+
+    def get(self, kind=None):
+        # Loads the model on first use and serves it from memory afterwards.
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self.model, self.metadata = self._load()
+                    self.loaded = True
+        if kind is not None and self.metadata is not None and self.metadata.get("kind") != kind:
+            return None
+        return self.model
+
+    def get_metadata(self):
+        self.get()
+        return self.metadata
+
+    def version(self):
+        metadata = self.get_metadata()
+        return metadata.get("version") if metadata else None
+
+    def reload(self):
+        with self.lock:
+            self.loaded = False
+        return self.get()
+
+    def add_listener(self, callback):
+        # callback(model, metadata) runs after every publish.
+        self.listeners.append(callback)
+
+    def publish(self, model, kind="regressor", **extra):
+        with self.lock:
+            current = self.metadata
+            if not self.loaded:
+                current = self._load()[1]
+            metadata = dict(extra)
+            metadata.update({
+                "version": (current or {}).get("version", 0) + 1,
+                "kind": kind,
+                "model_class": type(model).__name__,
+                "feature_schema": schema_of(model),
+                "created_at": int(time.time()),
+            })
+
+            # Write-then-rename so readers never see a partially written file.
+            directory = os.path.dirname(os.path.abspath(self.model_file))
+            fd, tmp_file = tempfile.mkstemp(prefix=".model-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    pickle.dump(wrap_model(model, metadata), file, protocol=pickle.HIGHEST_PROTOCOL)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_file, self.model_file)
+            except Exception:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                raise
+
+            self.model = model
+            self.metadata = metadata
+            self.loaded = True
+        print(f"Published model version {metadata['version']} to {self.model_file}.")
+        for callback in list(self.listeners):
+            callback(model, metadata)
+        return metadata
+
+
+def get_registry(model_file=None):
+    # One registry (and so one in-memory model) per model file per process.
+    model_file = model_file or Config.MODEL_FILE
+    key = os.path.abspath(model_file)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ModelRegistry(model_file)
+        return registry
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import pickle
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingRandomSearchCV, ParameterSampler
+
+from config import Config
+
+SEARCH_SPACES = {
+    "RandomForestRegressor": {
+        "regressor__n_estimators": [50, 100, 200],
+        "regressor__max_depth": [None, 5, 10, 20],
+        "regressor__min_samples_split": [2, 5, 10],
+        "regressor__min_samples_leaf": [1, 2, 4],
+        "regressor__max_features": [1.0, "sqrt", 0.5],
+    },
+    "GradientBoostingRegressor": {
+        # n_estimators is an upper bound; early stopping picks the actual count.
+        "regressor__n_estimators": [200, 500],
+        "regressor__learning_rate": [0.03, 0.1, 0.2],
+        "regressor__max_depth": [3, 5, 8],
+        "regressor__min_samples_leaf": [1, 2, 4],
+        "regressor__subsample": [0.8, 1.0],
+    },
+}
+
+
+def make_regressor(name, random_state=42):
+    if name == "RandomForestRegressor":
+        return RandomForestRegressor(random_state=random_state)
+    if name == "GradientBoostingRegressor":
+        return GradientBoostingRegressor(
+            random_state=random_state,
+            n_iter_no_change=10,
+            validation_fraction=0.1,
+            tol=1e-4
+        )
+    raise ValueError(f"Unknown regressor: {name}")
+
+
+def dataset_hash(X, y, settings):
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    digest.update(repr(sorted(settings.items())).encode())
+    digest.update(repr(SEARCH_SPACES).encode())
+    return digest.hexdigest()
+
+
+class SearchCache:
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading search cache: {e}")
+            return {}
+
+    def get(self, key):
+        return self._load().get(key)
+
+    def put(self, key, result):
+        entries = self._load()
+        entries[key] = result
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_file, "wb") as file:
+                pickle.dump(entries, file)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Error saving search cache: {e}")
+
+
+class HyperparameterSearch:
+    def __init__(self, build_pipeline, strategy=None, n_jobs=None, time_budget=None, n_iter=None, cv=None,
+                 cache_file=None, random_state=42):
+        self.build_pipeline = build_pipeline
+        self.strategy = strategy or Config.SEARCH_STRATEGY
+        self.n_jobs = n_jobs if n_jobs is not None else Config.SEARCH_N_JOBS
+        self.time_budget = time_budget if time_budget is not None else Config.SEARCH_TIME_BUDGET
+        self.n_iter = n_iter if n_iter is not None else Config.SEARCH_N_ITER
+        self.cv = cv if cv is not None else Config.SEARCH_CV
+        self.random_state = random_state
+        cache_file = cache_file if cache_file is not None else Config.SEARCH_CACHE_FILE
+        self.cache = SearchCache(cache_file) if cache_file else None
+
+    def settings(self):
+        return {"strategy": self.strategy, "n_iter": self.n_iter, "cv": self.cv, "random_state": self.random_state}
+
+    def _search_random(self, pipeline, space, X, y, deadline):
+        # Evaluates sampled candidates in parallel batches until n_iter
+        # candidates are done or the time budget runs out.
+        candidates = list(ParameterSampler(space, self.n_iter, random_state=self.random_state))
+        # Negative n_jobs counts back from the CPU count as in joblib (-1 is
+        # every CPU, -2 all but one).
+        cpus = os.cpu_count() or 1
+        batch_size = max(1, cpus + 1 + self.n_jobs if self.n_jobs < 0 else self.n_jobs)
+        best_params, best_score = None, np.inf
+        for start in range(0, len(candidates), batch_size):
+            if best_params is not None and time.monotonic() >= deadline:
+                print(f"Search time budget exhausted after {start} candidates.")
+                break
+            batch = [{key: [value] for key, value in params.items()} for params in candidates[start:start + batch_size]]
+            search = GridSearchCV(
+                pipeline, batch, cv=self.cv, scoring="neg_mean_absolute_error", n_jobs=self.n_jobs, refit=False
+            )
+            search.fit(X, y)
+            if -search.best_score_ < best_score:
+                best_params, best_score = search.best_params_, -search.best_score_
+        return best_params, best_score
+
+    def _search_model(self, name, X, y, deadline):
+        pipeline = self.build_pipeline(make_regressor(name, self.random_state))
+        space = SEARCH_SPACES[name]
+        if self.strategy == "halving":
+            # Successive halving bounds cost through its resource schedule
+            # rather than the wall-clock budget.
+            search = HalvingRandomSearchCV(
+                pipeline, space, n_candidates=self.n_iter, factor=3, cv=self.cv,
+                scoring="neg_mean_absolute_error", n_jobs=self.n_jobs, random_state=self.random_state, refit=False
+            )
+            search.fit(X, y)
+            return search.best_params_, -search.best_score_
+        if self.strategy == "random":
+            return self._search_random(pipeline, space, X, y, deadline)
+        if self.strategy == "grid":
+            search = GridSearchCV(pipeline, space, cv=self.cv, scoring="neg_mean_absolute_error", n_jobs=self.n_jobs, refit=False)
+            search.fit(X, y)
+            return search.best_params_, -search.best_score_
+        raise ValueError(f"Unknown search strategy: {self.strategy}")
+
+    def search(self, X, y):
+        # Returns {"model": name, "params": {...}, "score": mae}.
+        key = dataset_hash(X, y, self.settings()) if self.cache else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                print(f"Using cached search result for dataset {key[:12]}: {cached['model']} (MAE {cached['score']:.4f})")
+                return cached
+
+        start = time.monotonic()
+        deadline = start + self.time_budget
+        best = None
+        for name in SEARCH_SPACES:
+            if best is not None and time.monotonic() >= deadline:
+                print(f"Search time budget exhausted; skipping {name}.")
+                continue
+            model_deadline = start + self.time_budget * (list(SEARCH_SPACES).index(name) + 1) / len(SEARCH_SPACES)
+            params, score = self._search_model(name, X, y, model_deadline)
+            print(f"{name}: best MAE {score:.4f} with {params}")
+            if best is None or score < best["score"]:
+                best = {"model": name, "params": params, "score": score}
+        print(f"Hyperparameter search ({self.strategy}) finished in {time.monotonic() - start:.1f}s.")
+
+        if key is not None and best is not None:
+            self.cache.put(key, best)
+        return best
+
+    def build_best(self, result):
+        pipeline = self.build_pipeline(make_regressor(result["model"], self.random_state))
+        pipeline.set_params(**result["params"])
+        return pipeline
@@ -1,52 +1,85 @@
 import numpy as np
 import random
-from keras.models import Sequential
+from keras.models import Sequential, clone_model
 from keras.layers import Dense
 from keras.optimizers import Adam
 
+from config import Config
+from osrs_rl.replay_buffer import ReplayBuffer
+
 class OSRSAgent:
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, memory_size=None, prioritized=None, target_update=None):
         self.state_size = state_size
         self.action_size = action_size
-        self.memory = []
+        prioritized = Config.RL_PRIORITIZED_REPLAY if prioritized is None else prioritized
+        self.memory = ReplayBuffer(
+            memory_size or Config.RL_MEMORY_SIZE,
+            state_size,
+            alpha=Config.RL_PRIORITY_ALPHA if prioritized else 0.0,
+            beta=Config.RL_PRIORITY_BETA
+        )
         self.gamma = 0.95
         self.epsilon = 1.0
         self.epsilon_min = 0.01
         self.epsilon_decay = 0.995
         self.learning_rate = 0.001
         self.model = self._build_model()
+        # Optional target network, synced every target_update replays (0 disables).
+        self.target_update = Config.RL_TARGET_UPDATE if target_update is None else target_update
+        self.target_model = None
+        self.replays = 0
+        if self.target_update:
+            self.target_model = clone_model(self.model)
+            self.update_target_model()
 
     def _build_model(self):
         model = Sequential()
         model.add(Dense(24, input_dim=self.state_size, activation='relu'))
         model.add(Dense(24, activation='relu'))
         model.add(Dense(self.action_size, activation='linear'))
-        model.compile(loss='mse', optimizer=Adam(lr=self.learning_rate))
+        model.compile(loss='mse', optimizer=Adam(learning_rate=self.learning_rate))
         return model
 
+    def update_target_model(self):
+        if self.target_model is not None:
+            self.target_model.set_weights(self.model.get_weights())
+
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
 
     def act(self, state):
         if np.random.rand() <= self.epsilon:
             return random.randrange(self.action_size)
-        act_values = self.model.predict(state)
+        act_values = self.model.predict(state, verbose=0)
         return np.argmax(act_values[0])
 
     def replay(self, batch_size):
-        minibatch = random.sample(self.memory, batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = reward
-            if not done:
-                target = (reward + self.gamma * np.amax(self.model.predict(next_state)[0]))
-            target_f = self.model.predict(state)
-            target_f[0][action] = target
-            self.model.fit(state, target_f, epochs=1, verbose=0)
+        # One predict and one fit for the whole minibatch. Without a target
+        # network the states and next states share a single predict call.
+        states, actions, rewards, next_states, dones, indices, weights = self.memory.sample(batch_size)
+        if self.target_model is None:
+            q_values = self.model.predict(np.concatenate([states, next_states]), batch_size=2 * batch_size, verbose=0)
+            current, following = q_values[:batch_size], q_values[batch_size:]
+        else:
+            current = self.model.predict(states, batch_size=batch_size, verbose=0)
+            following = self.target_model.predict(next_states, batch_size=batch_size, verbose=0)
+
+        rows = np.arange(batch_size)
+        targets = rewards + self.gamma * following.max(axis=1) * ~dones
+        td_errors = targets - current[rows, actions]
+        current[rows, actions] = targets
+        self.model.fit(states, current, sample_weight=weights, batch_size=batch_size, epochs=1, verbose=0)
+        self.memory.update_priorities(indices, td_errors)
+
+        self.replays += 1
+        if self.target_update and self.replays % self.target_update == 0:
+            self.update_target_model()
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
     def load(self, name):
         self.model.load_weights(name)
+        self.update_target_model()
 
     def save(self, name):
-        self.model.save_weights(name)
\ No newline at end of file
+        self.model.save_weights(name)
@@ -1,8 +1,16 @@
 import numpy as np
+from snapshot import ItemSnapshot
+
+STATE_COLUMNS = ("high_price", "low_price", "avg_price_5m", "potential_profit", "price_fluctuation", "buy_limit", "roi")
 
 class OSRSEnvironment:
     def __init__(self, items_data):
-        self.items_data = items_data
+        self.items_data = ItemSnapshot.from_items(items_data)
+        # Per-item part of the state, built once instead of on every step.
+        self.item_states = np.column_stack([self.items_data.column(name) for name in STATE_COLUMNS])
+        self.low_prices = self.items_data.column("low_price")
+        self.high_prices = self.items_data.column("high_price")
+        self.profits = self.items_data.potential_profit
         self.current_step = 0
         self.inventory = []
         self.cash = 0
@@ -14,15 +22,15 @@ class OSRSEnvironment:
         return self._get_state()
 
     def step(self, action):
-        item = self.items_data[self.current_step]
+        row = self.current_step
         if action == 0:
-            if self.cash >= item['low_price']:
-                self.inventory.append(item)
-                self.cash -= item['low_price']
+            if self.cash >= self.low_prices[row]:
+                self.inventory.append(row)
+                self.cash -= self.low_prices[row]
         elif action == 1:
-            if item in self.inventory:
-                self.inventory.remove(item)
-                self.cash += item['high_price']
+            if row in self.inventory:
+                self.inventory.remove(row)
+                self.cash += self.high_prices[row]
 
         self.current_step += 1
         done = self.current_step >= len(self.items_data)
@@ -32,22 +40,123 @@ class OSRSEnvironment:
         return next_state, reward, done, {}
 
     def _get_state(self):
-        state = [
-            self.cash,
-            len(self.inventory),
-            self.items_data[self.current_step]['high_price'],
-            self.items_data[self.current_step]['low_price'],
-            self.items_data[self.current_step]['avg_price_5m'],
-            self.items_data[self.current_step]['potential_profit'],
-            self.items_data[self.current_step]['price_fluctuation'],
-            self.items_data[self.current_step]['buy_limit'],
-            self.items_data[self.current_step]['roi']
-        ]
-        return np.array(state)
+        # After the last item the final item's features are repeated.
+        row = min(self.current_step, len(self.items_data) - 1)
+        state = np.empty(2 + len(STATE_COLUMNS))
+        state[0] = self.cash
+        state[1] = len(self.inventory)
+        state[2:] = self.item_states[row]
+        return state
 
     def _calculate_reward(self):
-        reward = 0
-        for item in self.inventory:
-            reward += item['potential_profit']
+        reward = self.profits[self.inventory].sum() if self.inventory else 0
         reward += self.cash
-        return reward
\ No newline at end of file
+        return reward
+
+class VectorOSRSEnv:
+    # num_envs independent OSRSEnvironment episodes stepped in lockstep.
+    # Holdings are an (num_envs, items) count array and the reward (cash plus
+    # the potential profit of what is held) is kept up to date on every buy
+    # and sell, so a step is a handful of array operations however many
+    # environments run.
+    #
+    # The interface follows gymnasium's vector environments: reset returns
+    # (states, info) and step returns (states, rewards, terminated,
+    # truncated, info). Finished episodes reset automatically; their last
+    # states are in info["final_observation"], flagged by
+    # info["_final_observation"]. The spaces import gymnasium on first use,
+    # so it is only needed when they are.
+
+    def __init__(self, items_data, num_envs, starting_cash=0):
+        self.items_data = ItemSnapshot.from_items(items_data)
+        self.num_envs = num_envs
+        self.starting_cash = starting_cash
+        self.item_states = np.column_stack([self.items_data.column(name) for name in STATE_COLUMNS]).astype(np.float32)
+        self.low_prices = self.items_data.column("low_price")
+        self.high_prices = self.items_data.column("high_price")
+        self.profits = self.items_data.potential_profit
+        self.num_items = len(self.items_data)
+        self.state_size = 2 + len(STATE_COLUMNS)
+        self.envs = np.arange(num_envs)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.cash = np.full(num_envs, float(starting_cash))
+        self.holdings = np.zeros((num_envs, self.num_items), dtype=np.int32)
+        self.held = np.zeros(num_envs, dtype=np.int64)
+        self.held_profit = np.zeros(num_envs)
+        self._spaces = None
+
+    def reset(self, seed=None, options=None):
+        self._reset(np.ones(self.num_envs, dtype=bool))
+        return self._get_states(), {}
+
+    def _reset(self, mask):
+        self.steps[mask] = 0
+        self.cash[mask] = self.starting_cash
+        self.holdings[mask] = 0
+        self.held[mask] = 0
+        self.held_profit[mask] = 0.0
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        rows = np.minimum(self.steps, self.num_items - 1)
+        low, high, profit = self.low_prices[rows], self.high_prices[rows], self.profits[rows]
+
+        buy = (actions == 0) & (self.cash >= low)
+        sell = (actions == 1) & (self.holdings[self.envs, rows] > 0)
+        change = buy.astype(np.int64) - sell
+        self.holdings[self.envs, rows] += change.astype(np.int32)
+        self.held += change
+        self.held_profit += change * profit
+        self.cash += np.where(buy, -low, 0.0) + np.where(sell, high, 0.0)
+
+        self.steps += 1
+        terminated = self.steps >= self.num_items
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        rewards = self.held_profit + self.cash
+        states = self._get_states()
+        info = {}
+        if terminated.any():
+            info["final_observation"] = states.copy()
+            info["_final_observation"] = terminated.copy()
+            info["final_cash"] = np.where(terminated, self.cash, np.nan)
+            self._reset(terminated)
+            states[terminated] = self._get_states()[terminated]
+        return states, rewards, terminated, truncated, info
+
+    def _get_states(self):
+        # After the last item the final item's features are repeated.
+        rows = np.minimum(self.steps, self.num_items - 1)
+        states = np.empty((self.num_envs, self.state_size), dtype=np.float32)
+        states[:, 0] = self.cash
+        states[:, 1] = self.held
+        states[:, 2:] = self.item_states[rows]
+        return states
+
+    def _build_spaces(self):
+        if self._spaces is None:
+            from gymnasium import spaces
+            from gymnasium.vector.utils import batch_space
+
+            observation = spaces.Box(-np.inf, np.inf, (self.state_size,), dtype=np.float32)
+            action = spaces.Discrete(2)
+            self._spaces = (observation, action, batch_space(observation, self.num_envs), batch_space(action, self.num_envs))
+        return self._spaces
+
+    @property
+    def single_observation_space(self):
+        return self._build_spaces()[0]
+
+    @property
+    def single_action_space(self):
+        return self._build_spaces()[1]
+
+    @property
+    def observation_space(self):
+        return self._build_spaces()[2]
+
+    @property
+    def action_space(self):
+        return self._build_spaces()[3]
+
+    def close(self):
+        pass
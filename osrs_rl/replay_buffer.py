@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    # Fixed-capacity transition memory in preallocated arrays. Once full,
+    # new transitions overwrite the oldest. With alpha > 0, sampling is
+    # proportional to priority ** alpha (prioritized experience replay) and
+    # sample() also returns importance-sampling weights; alpha = 0 samples
+    # uniformly with unit weights.
+
+    def __init__(self, capacity, state_size, alpha=0.0, beta=0.4, epsilon=1e-3, seed=None):
+        self.capacity = int(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.rng = np.random.default_rng(seed)
+        self.states = np.zeros((self.capacity, state_size), dtype=np.float32)
+        self.next_states = np.zeros((self.capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(self.capacity, dtype=np.int64)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.dones = np.zeros(self.capacity, dtype=bool)
+        self.priorities = np.zeros(self.capacity, dtype=np.float64)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def prioritized(self):
+        return self.alpha > 0
+
+    def add(self, state, action, reward, next_state, done):
+        self.add_batch(
+            np.reshape(state, (1, -1)), np.atleast_1d(action), np.atleast_1d(reward),
+            np.reshape(next_state, (1, -1)), np.atleast_1d(done)
+        )
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        count = len(actions)
+        if count > self.capacity:
+            # Only the newest transitions would survive anyway.
+            states, actions, rewards = states[-self.capacity:], actions[-self.capacity:], rewards[-self.capacity:]
+            next_states, dones = next_states[-self.capacity:], dones[-self.capacity:]
+            count = self.capacity
+        rows = (self.position + np.arange(count)) % self.capacity
+        self.states[rows] = states
+        self.actions[rows] = actions
+        self.rewards[rows] = rewards
+        self.next_states[rows] = next_states
+        self.dones[rows] = dones
+        # New transitions get the highest priority seen so they are replayed at least once.
+        self.priorities[rows] = self.priorities[:self.size].max() if self.size else 1.0
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def sample(self, batch_size):
+        # Returns (states, actions, rewards, next_states, dones, indices, weights).
+        if self.prioritized:
+            scaled = self.priorities[:self.size] ** self.alpha
+            cumulative = np.cumsum(scaled)
+            indices = np.searchsorted(cumulative, self.rng.random(batch_size) * cumulative[-1], side="right")
+            indices = np.minimum(indices, self.size - 1)
+            probabilities = scaled[indices] / cumulative[-1]
+            weights = (self.size * probabilities) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+        else:
+            indices = self.rng.choice(self.size, batch_size, replace=batch_size > self.size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        return (
+            self.states[indices], self.actions[indices], self.rewards[indices],
+            self.next_states[indices], self.dones[indices], indices, weights
+        )
+
+    def update_priorities(self, indices, td_errors):
+        if self.prioritized:
+            self.priorities[indices] = np.abs(td_errors) + self.epsilon
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.states, self.next_states, self.actions, self.rewards, self.dones, self.priorities
+        ))
@@ -0,0 +1,53 @@
+import numpy as np
+from osrs_rl.environment import VectorOSRSEnv
+
+# Rollout workers for OSRSTrainer.train_parallel. This module imports only
+# NumPy and the environment, so spawned workers start without Keras.
+
+# Per-process environments, built once by init_worker.
+_worker_env = None
+
+
+def init_worker(snapshot, num_envs):
+    global _worker_env
+    _worker_env = VectorOSRSEnv(snapshot, num_envs)
+
+
+def collect_episodes(policy, epsilon, seed, episodes=None):
+    # Runs one episode in each of the worker's environments with the given
+    # policy (an inference.MLPPolicy, so workers never load Keras) and
+    # returns the transitions, flattened step-major, and each episode's
+    # final cash. episodes keeps only that many of them, so the last batch
+    # of a run does not overshoot its episode count.
+    env = _worker_env
+    rng = np.random.default_rng(seed)
+    steps, num_envs = env.num_items, env.num_envs
+    states = np.empty((steps, num_envs, env.state_size), dtype=np.float32)
+    next_states = np.empty_like(states)
+    actions = np.empty((steps, num_envs), dtype=np.int64)
+    rewards = np.empty((steps, num_envs), dtype=np.float32)
+    dones = np.empty((steps, num_envs), dtype=bool)
+
+    state, _ = env.reset()
+    final_cash = np.zeros(num_envs)
+    for step in range(steps):
+        action = policy.act(state, epsilon, rng)
+        next_state, reward, terminated, truncated, info = env.step(action)
+        done = terminated | truncated
+        states[step] = state
+        actions[step] = action
+        rewards[step] = reward
+        dones[step] = done
+        next_states[step] = next_state
+        if done.any():
+            # Autoreset already replaced these; keep the real last states.
+            next_states[step][done] = info["final_observation"][done]
+            final_cash[done] = info["final_cash"][done]
+        state = next_state
+
+    kept = slice(None, episodes)
+    flat = (-1, env.state_size)
+    return (
+        states[:, kept].reshape(flat), actions[:, kept].ravel(), rewards[:, kept].ravel(),
+        next_states[:, kept].reshape(flat), dones[:, kept].ravel()
+    ), final_cash[kept]
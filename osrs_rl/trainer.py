@@ -1,9 +1,17 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
+from config import Config
+from inference import export_model
 from osrs_rl.agent import OSRSAgent
 from osrs_rl.environment import OSRSEnvironment
+from osrs_rl.rollout import collect_episodes, init_worker
+from snapshot import ItemSnapshot
 
 class OSRSTrainer:
-    def __init__(self, items_data):
+    def __init__(self, items_data, workers=None, envs_per_worker=None, sync_every=None):
         self.items_data = items_data
         self.state_size = 9
         self.action_size = 2
@@ -11,8 +19,18 @@ class OSRSTrainer:
         self.env = OSRSEnvironment(self.items_data)
         self.batch_size = 128
         self.episodes = 1000
+        # More than one worker is an explicit opt-in (Config.RL_WORKERS or
+        # `main.py train --rl --workers N`); by default training runs in
+        # this process.
+        self.workers = max(1, workers or Config.RL_WORKERS)
+        self.envs_per_worker = envs_per_worker or Config.RL_ENVS_PER_WORKER
+        self.sync_every = sync_every or Config.RL_SYNC_EVERY
 
     def train(self):
+        if self.workers > 1:
+            self.train_parallel()
+            return
+        started = time.perf_counter()
         for e in range(self.episodes):
             state = self.env.reset()
             state = np.reshape(state, [1, self.state_size])
@@ -28,6 +46,59 @@ class OSRSTrainer:
                     break
             if len(self.agent.memory) > self.batch_size:
                 self.agent.replay(self.batch_size)
+        print(f"Trained {self.episodes} episodes at {self.episodes / (time.perf_counter() - started):.2f} episodes/s.")
+        self.agent.save("osrs_rl_model.h5")
+
+    def train_parallel(self):
+        # Rollouts run in a process pool, each worker stepping
+        # envs_per_worker episodes in lockstep with a NumPy copy of the
+        # policy, evaluated once per step for all of them. Transitions
+        # stream back into the agent's replay buffer as each worker
+        # finishes, the agent replays once per episode collected (as in
+        # train), and workers pick up the latest policy every sync_every
+        # replays. Workers never wait for each other, so throughput grows
+        # with the number of cores.
+        snapshot = ItemSnapshot.from_items(self.items_data)
+        # TensorFlow is not fork-safe once initialized, so workers are spawned.
+        context = multiprocessing.get_context("spawn")
+        started = time.perf_counter()
+        policy = export_model(self.agent.model)
+        submitted = collected = replays = 0
+        pending = set()
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context, initializer=init_worker,
+            initargs=(snapshot, self.envs_per_worker)
+        ) as executor:
+            def submit():
+                nonlocal submitted
+                # The last batch is cut to the episodes still owed.
+                episodes = min(self.envs_per_worker, self.episodes - submitted)
+                pending.add(executor.submit(collect_episodes, policy, self.agent.epsilon, submitted, episodes))
+                submitted += episodes
+
+            while submitted < self.episodes and len(pending) < self.workers:
+                submit()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.remove(future)
+                    transitions, final_cash = future.result()
+                    self.agent.memory.add_batch(*transitions)
+                    for _ in range(len(final_cash)):
+                        if len(self.agent.memory) > self.batch_size:
+                            self.agent.replay(self.batch_size)
+                            replays += 1
+                            if replays % self.sync_every == 0:
+                                policy = export_model(self.agent.model)
+                    collected += len(final_cash)
+                    elapsed = time.perf_counter() - started
+                    print(
+                        f"Episodes: {collected}/{submitted}, Mean profit: {final_cash.mean():,.0f}, "
+                        f"{collected / elapsed:.2f} episodes/s"
+                    )
+                    if submitted < self.episodes:
+                        submit()
+        print(f"Trained {collected} episodes on {self.workers} workers at {collected / (time.perf_counter() - started):.2f} episodes/s.")
         self.agent.save("osrs_rl_model.h5")
 
     def evaluate(self):
@@ -39,4 +110,4 @@ class OSRSTrainer:
             action = self.agent.act(state)
             next_state, _, done, _ = self.env.step(action)
             state = np.reshape(next_state, [1, self.state_size])
-        print(f"Final Profit: {self.env.cash}")
\ No newline at end of file
+        print(f"Final Profit: {self.env.cash}")
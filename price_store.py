@@ -0,0 +1,362 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from config import Config
+
+DAY = 86400
+
+COLUMNS = (
+    ("timestamp", np.int64),
+    ("item_id", np.int32),
+    ("high_price", np.float64),
+    ("low_price", np.float64),
+    ("high_volume", np.int64),
+    ("low_volume", np.int64),
+)
+
+COLUMN_DTYPES = dict(COLUMNS)
+
+# Sibling directories used while a partition is resealed: SEALING while it
+# is being written, SEALED once complete, RETIRED for the replaced files.
+SEALING_SUFFIX = ".sealing"
+SEALED_SUFFIX = ".sealed"
+RETIRED_SUFFIX = ".retired"
+
+
+def _empty_columns():
+    return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+
+
+def _concat(parts):
+    if not parts:
+        return _empty_columns()
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name, _ in COLUMNS}
+
+
+def _swap_in(path):
+    # Replaces path with its complete path.sealed sibling. Each step is a
+    # rename, and rerunning it after a crash at any point finishes the swap.
+    sealed, retired = f"{path}{SEALED_SUFFIX}", f"{path}{RETIRED_SUFFIX}"
+    if os.path.exists(sealed):
+        if os.path.exists(path):
+            shutil.rmtree(retired, ignore_errors=True)
+            os.rename(path, retired)
+        os.rename(sealed, path)
+    if os.path.exists(path):
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+def _recover(root):
+    # Finishes swaps interrupted after the sealed copy was complete and
+    # drops staging directories from seals that never got that far.
+    for name in os.listdir(root):
+        day, _, suffix = name.partition(".")
+        if not day.isdigit():
+            continue
+        path = os.path.join(root, day)
+        if f".{suffix}" == SEALING_SUFFIX:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        elif f".{suffix}" in (SEALED_SUFFIX, RETIRED_SUFFIX):
+            _swap_in(path)
+            if not os.path.exists(path) and os.path.exists(f"{path}{RETIRED_SUFFIX}"):
+                os.rename(f"{path}{RETIRED_SUFFIX}", path)
+
+
+class Partition:
+    # One day of ticks: a directory holding one raw binary file per column.
+    # Appends go to the end of each file. A sealed partition is sorted by
+    # (item_id, timestamp) and has an index of where each item's rows start,
+    # so per-item reads are zero-copy memmap slices.
+
+    def __init__(self, path):
+        self.path = path
+        self.meta_file = os.path.join(path, "meta.json")
+        self.meta = {"sealed": False}
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file) as file:
+                self.meta = json.load(file)
+        self._cache = None
+        self._index = None
+
+    @property
+    def day(self):
+        return int(os.path.basename(self.path))
+
+    @property
+    def sealed(self):
+        return self.meta.get("sealed", False)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _write_meta(self):
+        tmp_file = f"{self.meta_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(self.meta, file)
+        os.replace(tmp_file, self.meta_file)
+
+    def rows(self):
+        # A crash mid-append can leave columns of different lengths; only
+        # rows present in every column count.
+        counts = []
+        for name, dtype in COLUMNS:
+            try:
+                counts.append(os.path.getsize(self._file(name)) // np.dtype(dtype).itemsize)
+            except FileNotFoundError:
+                counts.append(0)
+        return min(counts)
+
+    def columns(self):
+        rows = self.rows()
+        if self._cache is not None and self._cache[0] == rows:
+            return self._cache[1]
+        if rows == 0:
+            columns = _empty_columns()
+        else:
+            columns = {
+                name: np.memmap(self._file(name), dtype=dtype, mode="r", shape=(rows,))
+                for name, dtype in COLUMNS
+            }
+        self._cache = (rows, columns)
+        return columns
+
+    def append(self, arrays):
+        os.makedirs(self.path, exist_ok=True)
+        rows = self.rows()
+        if self.sealed:
+            # Late data for a sealed day: it becomes unsorted until resealed.
+            self.meta["sealed"] = False
+            self._write_meta()
+            self._index = None
+        for name, dtype in COLUMNS:
+            with open(self._file(name), "r+b" if os.path.exists(self._file(name)) else "wb") as file:
+                file.truncate(rows * np.dtype(dtype).itemsize)
+                file.seek(0, os.SEEK_END)
+                np.ascontiguousarray(arrays[name], dtype=dtype).tofile(file)
+        self._cache = None
+
+    def seal(self):
+        # The sorted columns, index and meta are written to a sibling
+        # directory that is then renamed over this one, so a crash leaves
+        # either the unsorted day or the sealed day, never a mix of the two.
+        # PriceStore finishes or discards an interrupted swap on open.
+        if self.sealed:
+            return
+        columns = self.columns()
+        order = np.lexsort((columns["timestamp"], columns["item_id"]))
+        sorted_columns = {name: np.asarray(columns[name])[order] for name, _ in COLUMNS}
+        staging = f"{self.path}{SEALING_SUFFIX}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, dtype in COLUMNS:
+            sorted_columns[name].astype(dtype).tofile(os.path.join(staging, f"{name}.bin"))
+        item_ids, starts = np.unique(sorted_columns["item_id"], return_index=True)
+        offsets = np.append(starts, len(order)).astype(np.int64)
+        np.save(os.path.join(staging, "index_item_ids.npy"), item_ids.astype(np.int32))
+        np.save(os.path.join(staging, "index_offsets.npy"), offsets)
+        meta = dict(self.meta, **{
+            "sealed": True,
+            "rows": int(len(order)),
+            "min_timestamp": int(sorted_columns["timestamp"].min()) if len(order) else None,
+            "max_timestamp": int(sorted_columns["timestamp"].max()) if len(order) else None,
+        })
+        with open(os.path.join(staging, "meta.json"), "w") as file:
+            json.dump(meta, file)
+        # Only a complete staging directory is ever swapped in.
+        os.rename(staging, f"{self.path}{SEALED_SUFFIX}")
+        _swap_in(self.path)
+        self.meta = meta
+        self._cache = None
+        self._index = None
+
+    def index(self):
+        if self._index is None:
+            self._index = (
+                np.load(os.path.join(self.path, "index_item_ids.npy"), mmap_mode="r"),
+                np.load(os.path.join(self.path, "index_offsets.npy"), mmap_mode="r"),
+            )
+        return self._index
+
+    def read_item(self, item_id, start=None, end=None):
+        columns = self.columns()
+        if self.sealed:
+            item_ids, offsets = self.index()
+            position = np.searchsorted(item_ids, item_id)
+            if position >= len(item_ids) or item_ids[position] != item_id:
+                return None
+            lo, hi = int(offsets[position]), int(offsets[position + 1])
+            timestamps = columns["timestamp"][lo:hi]
+            first = int(np.searchsorted(timestamps, start, side="left")) if start is not None else 0
+            last = int(np.searchsorted(timestamps, end, side="right")) if end is not None else hi - lo
+            lo, hi = lo + first, lo + last
+            if hi <= lo:
+                return None
+            return {name: columns[name][lo:hi] for name, _ in COLUMNS}
+        mask = columns["item_id"] == item_id
+        if start is not None:
+            mask &= columns["timestamp"] >= start
+        if end is not None:
+            mask &= columns["timestamp"] <= end
+        if not mask.any():
+            return None
+        return {name: columns[name][mask] for name, _ in COLUMNS}
+
+    def read_range(self, start=None, end=None):
+        columns = self.columns()
+        if start is None and end is None:
+            return columns
+        mask = np.ones(len(columns["timestamp"]), dtype=bool)
+        if start is not None:
+            mask &= columns["timestamp"] >= start
+        if end is not None:
+            mask &= columns["timestamp"] <= end
+        return {name: columns[name][mask] for name, _ in COLUMNS}
+
+
+class PriceStore:
+    # Append-only columnar tick store, partitioned by UTC day, kept next to
+    # the SQLite database. Readers get memmap-backed arrays; history never
+    # has to be loaded into Python objects.
+
+    def __init__(self, root=None):
+        self.root = root or Config.PRICE_STORE_DIR
+        self.lock = threading.Lock()
+        self.partitions = {}
+        os.makedirs(self.root, exist_ok=True)
+        _recover(self.root)
+        for name in os.listdir(self.root):
+            if name.isdigit():
+                self.partitions[int(name)] = Partition(os.path.join(self.root, name))
+
+    def _partition(self, day):
+        partition = self.partitions.get(day)
+        if partition is None:
+            partition = self.partitions[day] = Partition(os.path.join(self.root, str(day)))
+        return partition
+
+    def _days(self, start=None, end=None):
+        days = sorted(self.partitions)
+        if start is not None:
+            days = [day for day in days if day >= start // DAY]
+        if end is not None:
+            days = [day for day in days if day <= end // DAY]
+        return days
+
+    def append(self, item_ids, timestamps, high_price, low_price, high_volume, low_volume):
+        arrays = {
+            "timestamp": np.asarray(timestamps, dtype=np.int64),
+            "item_id": np.asarray(item_ids, dtype=np.int32),
+            "high_price": np.asarray(high_price, dtype=np.float64),
+            "low_price": np.asarray(low_price, dtype=np.float64),
+            "high_volume": np.asarray(high_volume, dtype=np.int64),
+            "low_volume": np.asarray(low_volume, dtype=np.int64),
+        }
+        count = len(arrays["item_id"])
+        arrays["timestamp"] = np.broadcast_to(arrays["timestamp"], (count,))
+        days = arrays["timestamp"] // DAY
+        with self.lock:
+            for day in np.unique(days):
+                mask = days == day
+                self._partition(int(day)).append({name: array[mask] for name, array in arrays.items()})
+        return count
+
+    def append_snapshot(self, snapshot, timestamp):
+        return self.append(
+            snapshot.item_ids,
+            timestamp,
+            snapshot.column("high_price"),
+            snapshot.column("low_price"),
+            snapshot.column("high_volume"),
+            snapshot.column("low_volume")
+        )
+
+    def append_rows(self, price_rows):
+        # price_rows in DataManager order: (item_id, timestamp, high, low, high_volume, low_volume).
+        if not price_rows:
+            return 0
+        item_ids, timestamps, high, low, high_volume, low_volume = zip(*price_rows)
+        as_float = lambda values: np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        as_int = lambda values: np.array([value or 0 for value in values], dtype=np.int64)
+        return self.append(item_ids, timestamps, as_float(high), as_float(low), as_int(high_volume), as_int(low_volume))
+
+    def seal(self, include_current=False):
+        # Sorts and indexes every finished day. Today's partition stays
+        # append-only unless include_current is set.
+        current_day = int(time.time() // DAY)
+        with self.lock:
+            for day in sorted(self.partitions):
+                if include_current or day < current_day:
+                    self.partitions[day].seal()
+
+    def iter_item(self, item_id, start=None, end=None):
+        # Yields one dict of column arrays per partition; slices of sealed
+        # partitions are zero-copy views of the memory-mapped files.
+        for day in self._days(start, end):
+            part = self.partitions[day].read_item(item_id, start, end)
+            if part is not None:
+                yield part
+
+    def read_item(self, item_id, start=None, end=None):
+        return _concat(list(self.iter_item(item_id, start, end)))
+
+    def iter_range(self, start=None, end=None):
+        for day in self._days(start, end):
+            yield self.partitions[day].read_range(start, end)
+
+    def iter_days(self, start=None, end=None):
+        # (day, dict of column arrays) per partition, oldest first.
+        for day in self._days(start, end):
+            yield day, self.partitions[day].read_range(start, end)
+
+    def item_ids(self, start=None, end=None):
+        # Every item id with ticks in the range; sealed partitions answer
+        # from their index without scanning the item_id column.
+        ids = []
+        for day in self._days(start, end):
+            partition = self.partitions[day]
+            if partition.sealed:
+                ids.append(np.asarray(partition.index()[0], dtype=np.int64))
+            else:
+                ids.append(np.unique(partition.columns()["item_id"]).astype(np.int64))
+        return np.unique(np.concatenate(ids)) if ids else np.zeros(0, dtype=np.int64)
+
+    def read_range(self, start=None, end=None):
+        return _concat([part for part in self.iter_range(start, end) if len(part["timestamp"])])
+
+    def latest_ticks(self, lookback_days=7):
+        # Most recent tick per item, searching back at most lookback_days partitions.
+        parts = []
+        for day in reversed(self._days()[-lookback_days:]):
+            parts.append(self.partitions[day].read_range())
+        columns = _concat([part for part in parts if len(part["timestamp"])])
+        if not len(columns["timestamp"]):
+            return columns
+        order = np.lexsort((-columns["timestamp"], columns["item_id"]))
+        item_ids = columns["item_id"][order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = item_ids[1:] != item_ids[:-1]
+        rows = order[first]
+        return {name: np.asarray(columns[name])[rows] for name, _ in COLUMNS}
+
+    def import_from_database(self, data_manager, chunk_size=500000):
+        # One-off load of the SQLite prices table; rows arrive in item order,
+        # so partitions are resealed afterwards.
+        total = 0
+        for rows in data_manager.iter_price_chunks(chunk_size):
+            total += self.append_rows(rows)
+        self.seal(include_current=True)
+        print(f"Imported {total} price rows into {self.root}.")
+        return total
+
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            self.partitions = {}
@@ -0,0 +1,293 @@
+import numpy as np
+
+GE_TAX_FACTOR = 0.99
+
+ITEM_FIELDS = (
+    "high_price", "high_volume", "low_price", "low_volume", "avg_price_5m",
+    "potential_profit", "price_fluctuation", "buy_limit", "roi"
+)
+
+FEATURE_COLUMNS = (
+    "high_price", "low_price", "high_volume", "low_volume",
+    "avg_price_5m", "price_fluctuation", "buy_limit", "roi"
+)
+
+FEATURE_INDEX = {name: index for index, name in enumerate(FEATURE_COLUMNS)}
+
+# Columns that come straight from /5m; a tick is new when any of them moves.
+TICK_COLUMNS = ("high_price", "low_price", "high_volume", "low_volume")
+
+FLOAT_FIELDS = ("potential_profit", "price_fluctuation", "roi")
+
+
+def _column(values, key, count):
+    return np.fromiter((value.get(key) or 0 for value in values), dtype=np.float64, count=count)
+
+
+def parse_endpoint(data, keys):
+    # Parses a {item_id: {key: value}} payload into an id array plus one
+    # float64 array per key.
+    count = len(data)
+    ids = np.fromiter((int(item_id) for item_id in data.keys()), dtype=np.int64, count=count)
+    values = list(data.values())
+    return ids, {key: _column(values, key, count) for key in keys}
+
+
+def align(ids, source_ids, column):
+    # Scatters column (ordered like source_ids) onto the sorted ids array;
+    # ids missing from the source stay 0.
+    aligned = np.zeros(len(ids), dtype=column.dtype)
+    aligned[np.searchsorted(ids, source_ids)] = column
+    return aligned
+
+
+def build_snapshot_columns(data_latest, data_5m, item_mapping):
+    # /latest only contributes item ids: like the original per-item loop,
+    # prices are derived from the 5m averages.
+    latest_ids, _ = parse_endpoint(data_latest, ())
+    ids_5m, five_minute = parse_endpoint(data_5m, ("avgHighPrice", "avgLowPrice", "highPriceVolume", "lowPriceVolume"))
+    ids = np.union1d(latest_ids, ids_5m)
+    columns = {key: align(ids, ids_5m, column) for key, column in five_minute.items()}
+
+    high_price = np.trunc(columns["avgHighPrice"] * GE_TAX_FACTOR)
+    low_price = np.trunc(columns["avgLowPrice"] * GE_TAX_FACTOR)
+    average_price_5m = np.trunc(columns["avgHighPrice"])
+
+    mask = (high_price > 0) & (low_price > 0) & (average_price_5m > 0)
+    ids = ids[mask]
+    high_price = high_price[mask]
+    low_price = low_price[mask]
+    average_price_5m = average_price_5m[mask]
+
+    potential_profit = high_price * GE_TAX_FACTOR - low_price
+    fluctuation = np.abs(high_price - average_price_5m) / average_price_5m
+    roi = potential_profit / average_price_5m
+
+    mapping = [item_mapping.get(item_id, {}) for item_id in ids.tolist()]
+    names = NameColumn.from_strings(item.get("name", "Unknown Item") for item in mapping)
+    buy_limit = np.fromiter((item.get("limit") or 0 for item in mapping), dtype=np.int64, count=len(mapping))
+
+    return {
+        "item_id": ids,
+        "name": names,
+        "high_price": high_price.astype(np.int64),
+        "high_volume": columns["highPriceVolume"][mask].astype(np.int64),
+        "low_price": low_price.astype(np.int64),
+        "low_volume": columns["lowPriceVolume"][mask].astype(np.int64),
+        "avg_price_5m": average_price_5m.astype(np.int64),
+        "potential_profit": potential_profit,
+        "price_fluctuation": fluctuation * 100,
+        "buy_limit": buy_limit,
+        "roi": roi,
+    }
+
+
+class NameColumn:
+    # Item names as one UTF-8 buffer plus (n + 1) offsets, instead of a
+    # Python str object per item. An int index decodes one name; an index
+    # array or boolean mask gathers a new NameColumn without decoding.
+
+    def __init__(self, data, offsets):
+        self.data = np.ascontiguousarray(data, dtype=np.uint8)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_strings(cls, names):
+        encoded = [name.encode() for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            start, end = self.offsets[index], self.offsets[index + 1]
+            return self.data[start:end].tobytes().decode()
+        return self.take(index)
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def take(self, rows):
+        rows = np.arange(len(self))[rows]
+        starts = self.offsets[:-1][rows]
+        lengths = self.offsets[1:][rows] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Byte positions of every gathered name, back to back.
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return NameColumn(self.data[positions], offsets)
+
+    def not_equal(self, other):
+        # Elementwise name != other name, for columns of the same length.
+        lengths = self.lengths()
+        differ = lengths != other.lengths()
+        same = np.flatnonzero(~differ & (lengths > 0))
+        if len(same):
+            left, right = self.take(same), other.take(same)
+            mismatched = (left.data != right.data).astype(np.int64)
+            counts = np.add.reduceat(mismatched, left.offsets[:-1])
+            differ[same] = counts > 0
+        return differ
+
+    def tolist(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[start:end].decode() for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class ItemSnapshot:
+    # Columnar view of one market snapshot. The eight model features live in
+    # one contiguous (n, 8) float64 block so models and environments can use
+    # it directly; every named column is a zero-copy view into that block.
+    # Names are a NameColumn. Rows are sorted by item id, which doubles as
+    # the id-to-row index.
+
+    def __init__(self, item_ids, names, features, potential_profit, timestamp=None):
+        if not isinstance(names, NameColumn):
+            names = NameColumn.from_strings(names)
+        order = np.argsort(item_ids, kind="stable")
+        if np.any(order != np.arange(len(order))):
+            item_ids, names = item_ids[order], names.take(order)
+            features, potential_profit = features[order], potential_profit[order]
+        self.item_ids = np.ascontiguousarray(item_ids, dtype=np.int64)
+        self.names = names
+        self.features = np.ascontiguousarray(features, dtype=np.float64)
+        self.potential_profit = np.ascontiguousarray(potential_profit, dtype=np.float64)
+        self.timestamp = timestamp
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int64), [], np.zeros((0, len(FEATURE_COLUMNS))), np.zeros(0))
+
+    @classmethod
+    def from_columns(cls, columns, timestamp=None):
+        features = np.column_stack([columns[name] for name in FEATURE_COLUMNS]) if len(columns["item_id"]) else np.zeros((0, len(FEATURE_COLUMNS)))
+        return cls(columns["item_id"], columns["name"], features, columns["potential_profit"], timestamp)
+
+    @classmethod
+    def from_items(cls, items_data):
+        if isinstance(items_data, ItemSnapshot):
+            return items_data
+        items_data = list(items_data)
+        if not items_data:
+            return cls.empty()
+        item_ids = np.array([int(item["Item ID"]) for item in items_data], dtype=np.int64)
+        names = [item.get("Item Name") or "Unknown Item" for item in items_data]
+        features = np.array([[item[name] or 0 for name in FEATURE_COLUMNS] for item in items_data], dtype=np.float64)
+        potential_profit = np.array([item.get("potential_profit", 0) for item in items_data], dtype=np.float64)
+        return cls(item_ids, names, features, potential_profit)
+
+    @classmethod
+    def from_db_rows(cls, rows):
+        # rows as returned by DataManager.get_all_items (items table order).
+        items_data = [
+            dict(zip(("Item ID", "Item Name") + ITEM_FIELDS, row))
+            for row in rows
+        ]
+        return cls.from_items(items_data)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def __getitem__(self, row):
+        # Lazily materializes one row in the legacy dict layout.
+        if isinstance(row, slice):
+            return [self.row(i) for i in range(*row.indices(len(self)))]
+        return self.row(row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.row(row)
+
+    def column(self, name):
+        if name == "potential_profit":
+            return self.potential_profit
+        return self.features[:, FEATURE_INDEX[name]]
+
+    def row(self, row):
+        item = {"Item ID": str(self.item_ids[row]), "Item Name": self.names[row]}
+        values = self.features[row].tolist()
+        for name in ITEM_FIELDS:
+            if name == "potential_profit":
+                item[name] = float(self.potential_profit[row])
+            else:
+                value = values[FEATURE_INDEX[name]]
+                item[name] = value if name in FLOAT_FIELDS else int(value)
+        return item
+
+    def row_of(self, item_id):
+        rows = self.rows_of([item_id])
+        return int(rows[0]) if rows[0] >= 0 else None
+
+    def rows_of(self, item_ids):
+        # Row index for each id, or -1 where the id is not in the snapshot.
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(item_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.item_ids, item_ids), len(self) - 1)
+        return np.where(self.item_ids[rows] == item_ids, rows, -1)
+
+    def take(self, rows):
+        # New snapshot holding the given rows (index array or boolean mask).
+        return ItemSnapshot(self.item_ids[rows], self.names.take(rows), self.features[rows], self.potential_profit[rows], self.timestamp)
+
+    def to_items(self):
+        columns = []
+        for name in ITEM_FIELDS:
+            column = self.column(name)
+            columns.append(column.tolist() if name in FLOAT_FIELDS else column.astype(np.int64).tolist())
+        keys = ("Item ID", "Item Name") + ITEM_FIELDS
+        ids = [str(item_id) for item_id in self.item_ids.tolist()]
+        return [dict(zip(keys, row)) for row in zip(ids, self.names.tolist(), *columns)]
+
+    def db_item_rows(self):
+        # Tuples in DataManager ITEM_COLUMNS order, built column-wise.
+        columns = [self.column(name).tolist() for name in ITEM_FIELDS]
+        return list(zip(self.item_ids.tolist(), self.names.tolist(), *columns))
+
+    def db_price_rows(self, timestamp):
+        count = len(self)
+        return list(zip(
+            self.item_ids.tolist(),
+            [int(timestamp)] * count,
+            self.column("high_price").tolist(),
+            self.column("low_price").tolist(),
+            self.column("high_volume").tolist(),
+            self.column("low_volume").tolist()
+        ))
+
+    @property
+    def nbytes(self):
+        return self.item_ids.nbytes + self.features.nbytes + self.potential_profit.nbytes + self.names.nbytes
+
+
+def diff_snapshots(previous, current):
+    # Compares current against previous column by column. Returns two boolean
+    # masks over current's rows: items whose stored values changed (or are
+    # new) and items whose 5m tick values changed (or are new).
+    if previous is None or len(previous) == 0:
+        everything = np.ones(len(current), dtype=bool)
+        return everything, everything.copy()
+    rows = previous.rows_of(current.item_ids)
+    found = rows >= 0
+    rows = np.where(found, rows, 0)
+    feature_changes = current.features != previous.features[rows]
+    tick_columns = [FEATURE_INDEX[name] for name in TICK_COLUMNS]
+    items_changed = (
+        feature_changes.any(axis=1)
+        | (current.potential_profit != previous.potential_profit[rows])
+        | current.names.not_equal(previous.names.take(rows))
+    )
+    ticks_changed = feature_changes[:, tick_columns].any(axis=1)
+    return ~found | items_changed, ~found | ticks_changed
+
+
+def build_snapshot(data_latest, data_5m, item_mapping, timestamp=None):
+    return ItemSnapshot.from_columns(build_snapshot_columns(data_latest, data_5m, item_mapping), timestamp)
@@ -0,0 +1,133 @@
+import math
+import threading
+from collections import OrderedDict
+
+from config import Config
+from feature_engine import model_inputs, schema_of
+from utils import predict_profit, suggest_for_budgets, suggest_for_gold
+
+
+def gold_bucket(starting_gold, digits=None):
+    # Rounds starting_gold down to `digits` significant figures, so nearby
+    # amounts share a cached basket that never spends more than was asked
+    # for (at most 10 ** (1 - digits) of it is left unspent). digits=0
+    # keeps the exact amount.
+    digits = Config.SUGGESTION_GOLD_DIGITS if digits is None else digits
+    if not digits or starting_gold <= 0:
+        return starting_gold
+    unit = 10 ** (math.floor(math.log10(starting_gold)) - digits + 1)
+    return math.floor(starting_gold / unit) * unit
+
+
+class SuggestionCache:
+    # Suggestions for the latest snapshot and model, computed at most once:
+    #
+    #   predictions  one array per (snapshot version, model version)
+    #   results      an LRU of suggestion lists keyed by the versions, the
+    #                gold bucket and the request settings
+    #
+    # Given a SnapshotStore and a ModelRegistry, it listens to both and
+    # drops everything when either publishes. The versions are part of every
+    # key as well, so a stale entry can never be served. feature_engine
+    # (the ingest service's) supplies streaming features to models trained
+    # with them; it is updated before each snapshot is published.
+
+    def __init__(self, store=None, model_registry=None, size=None, gold_digits=None, feature_engine=None):
+        self.store = store
+        self.model_registry = model_registry
+        self.feature_engine = feature_engine
+        self.size = size or Config.SUGGESTION_CACHE_SIZE
+        self.gold_digits = Config.SUGGESTION_GOLD_DIGITS if gold_digits is None else gold_digits
+        self.lock = threading.Lock()
+        self.predict_lock = threading.Lock()
+        self.results = OrderedDict()
+        self.predicted_for = None
+        self.predictions = None
+        self.hits = 0
+        self.misses = 0
+        self.predictions_computed = 0
+        self.invalidations = 0
+        if store is not None:
+            store.add_listener(lambda snapshot, version: self.invalidate())
+        if model_registry is not None:
+            model_registry.add_listener(lambda model, metadata: self.invalidate())
+
+    def invalidate(self):
+        with self.lock:
+            self.results.clear()
+            self.predicted_for = None
+            self.predictions = None
+            self.invalidations += 1
+
+    def get_predictions(self, snapshot, snapshot_version, model, model_version):
+        key = (snapshot_version, model_version)
+        with self.lock:
+            if self.predicted_for == key:
+                return self.predictions
+        # One thread predicts; the others wait for its result.
+        with self.predict_lock:
+            with self.lock:
+                if self.predicted_for == key:
+                    return self.predictions
+            predictions = None
+            if model is not None:
+                predictions = predict_profit(model, model_inputs(snapshot, schema_of(model), self.feature_engine))
+            with self.lock:
+                self.predicted_for, self.predictions = key, predictions
+                self.predictions_computed += 1
+            return predictions
+
+    def suggest(self, snapshot, snapshot_version, model, model_version, starting_gold,
+                top_k=5, method=None, max_share=None):
+        # Returns (bucket_gold, suggestions) for the bucket starting_gold
+        # falls in. The suggestions are copies the caller may change.
+        bucket = gold_bucket(starting_gold, self.gold_digits)
+        key = (snapshot_version, model_version, bucket, top_k, method or Config.ALLOCATION_METHOD, max_share)
+        with self.lock:
+            suggestions = self.results.get(key)
+            if suggestions is not None:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return bucket, [dict(item) for item in suggestions]
+            self.misses += 1
+
+        predictions = self.get_predictions(snapshot, snapshot_version, model, model_version)
+        suggestions = suggest_for_gold(snapshot, predictions, bucket, top_k, method, max_share)
+        with self.lock:
+            self.results[key] = suggestions
+            self.results.move_to_end(key)
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+        return bucket, [dict(item) for item in suggestions]
+
+    def suggest_latest(self, starting_gold, top_k=5, method=None, max_share=None):
+        # suggest() for the store's latest snapshot and the registry's model.
+        snapshot, snapshot_version = self.store.latest_with_version()
+        if snapshot is None or not len(snapshot):
+            return starting_gold, []
+        model = self.model_registry.get(kind="regressor") if self.model_registry is not None else None
+        model_version = self.model_registry.version() if model is not None else None
+        return self.suggest(snapshot, snapshot_version, model, model_version, starting_gold, top_k, method, max_share)
+
+    def sweep_latest(self, budgets, top_k=5, method=None, max_share=None):
+        # One suggestion list per budget for the latest snapshot, from the
+        # cached predictions.
+        snapshot, snapshot_version = self.store.latest_with_version()
+        if snapshot is None or not len(snapshot):
+            return [[] for _ in budgets]
+        model = self.model_registry.get(kind="regressor") if self.model_registry is not None else None
+        model_version = self.model_registry.version() if model is not None else None
+        predictions = self.get_predictions(snapshot, snapshot_version, model, model_version)
+        return suggest_for_budgets(snapshot, predictions, budgets, top_k, method, max_share)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_hit_rate": self.hits / lookups if lookups else None,
+                "cache_entries": len(self.results),
+                "predictions_computed": self.predictions_computed,
+                "cache_invalidations": self.invalidations,
+            }
@@ -0,0 +1,305 @@
+# suggestion_server.py
+#
+# Serves flip suggestions over local HTTP, on a TCP port or a Unix socket,
+# from the snapshot and model already held in memory:
+#
+#     python main.py serve-suggestions --port 8766
+#     curl 'http://127.0.0.1:8766/suggest?gold=100000000&top=5'
+#     curl --unix-socket /tmp/suggest.sock 'http://localhost/suggest?gold=100000000&method=exact'
+#     curl 'http://127.0.0.1:8766/metrics'
+#
+# POST /suggest takes the same parameters as a JSON object. Requests that
+# arrive within SUGGEST_BATCH_WINDOW of each other are scored as one
+# micro-batch: the model predicts once for the batch, then each request
+# gets its own basket for its gold amount and settings. Predictions and
+# baskets are cached until the snapshot or model changes (see
+# suggestion_cache.py), so repeat queries between ticks skip both.
+
+import json
+import os
+import queue
+import socketserver
+import stat
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from allocation import METHODS
+from config import Config
+from suggestion_cache import SuggestionCache
+
+
+def parse_suggest_params(params):
+    # Validates /suggest parameters (strings from a query or values from
+    # JSON) into keyword arguments for SuggestionService.submit.
+    try:
+        gold = float(params["gold"])
+    except KeyError:
+        raise ValueError("gold is required")
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid gold: {params['gold']!r}")
+    if not np.isfinite(gold) or gold <= 0:
+        raise ValueError("gold must be positive")
+    try:
+        top_k = int(params.get("top", 5))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid top: {params['top']!r}")
+    if not 1 <= top_k <= Config.SUGGEST_MAX_TOP:
+        raise ValueError(f"top must be between 1 and {Config.SUGGEST_MAX_TOP}")
+    method = params.get("method") or None
+    if method is not None and method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    max_share = params.get("max_share")
+    if max_share is not None and max_share != "":
+        try:
+            max_share = float(max_share)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid max_share: {max_share!r}")
+        if not 0 < max_share <= 1:
+            raise ValueError("max_share must be in (0, 1]")
+    else:
+        max_share = None
+    return {"starting_gold": gold, "top_k": top_k, "method": method, "max_share": max_share}
+
+
+class LatencyTracker:
+    # Request latencies (queued to answered) and batch sizes over the last
+    # window requests.
+
+    def __init__(self, window):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_batch(self, latencies, errors):
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.batch_sizes.append(len(latencies))
+            self.requests += len(latencies)
+            self.batches += 1
+            self.errors += errors
+
+    def as_dict(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            batch_sizes = np.array(self.batch_sizes)
+            requests, batches, errors = self.requests, self.batches, self.errors
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (None, None)
+        return {
+            "requests": requests,
+            "batches": batches,
+            "errors": errors,
+            "latency_p50_ms": p50,
+            "latency_p99_ms": p99,
+            "batch_size_avg": float(batch_sizes.mean()) if len(batch_sizes) else None,
+        }
+
+
+class SuggestionService:
+    # Answers suggestion requests from the latest snapshot in store (a
+    # SnapshotStore) and the model from model_registry, or a fixed model
+    # such as a compiled one. submit() queues a request; one thread
+    # gathers queued requests into micro-batches of up to max_batch,
+    # waiting at most batch_window after the first, and scores each batch
+    # with a single prediction, shared through cache.
+
+    def __init__(self, store, model_registry=None, model=None, model_version=None,
+                 batch_window=None, max_batch=None, latency_window=None, cache=None, feature_engine=None):
+        self.store = store
+        self.cache = cache or SuggestionCache(store, model_registry, feature_engine=feature_engine)
+        self.model_registry = model_registry
+        self.model = model
+        self.model_version = model_version
+        self.batch_window = batch_window if batch_window is not None else Config.SUGGEST_BATCH_WINDOW
+        self.max_batch = max_batch or Config.SUGGEST_MAX_BATCH
+        self.latency = LatencyTracker(latency_window or Config.SUGGEST_LATENCY_WINDOW)
+        self.queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return self
+        self.current_model()  # load the model before the first request
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._batch_loop, name="suggestion-batcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def current_model(self):
+        # (model, version); the registry serves its model from memory.
+        if self.model_registry is not None:
+            return self.model_registry.get(kind="regressor"), self.model_registry.version()
+        return self.model, self.model_version
+
+    def submit(self, starting_gold, top_k=5, method=None, max_share=None):
+        future = Future()
+        params = {"starting_gold": starting_gold, "top_k": top_k, "method": method, "max_share": max_share}
+        self.queue.put((params, future, time.perf_counter()))
+        return future
+
+    def suggest(self, starting_gold, top_k=5, method=None, max_share=None, timeout=None):
+        return self.submit(starting_gold, top_k, method, max_share).result(timeout)
+
+    def metrics(self):
+        return {**self.latency.as_dict(), **self.cache.stats()}
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while not self.stop_event.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        errors = 0
+        try:
+            snapshot, snapshot_version = self.store.latest_with_version()
+            if snapshot is None or not len(snapshot):
+                raise RuntimeError("No snapshot available yet")
+            model, model_version = self.current_model()
+            # Predict once for the batch, unless the cache already has it.
+            self.cache.get_predictions(snapshot, snapshot_version, model, model_version)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            self.latency.record_batch([time.perf_counter() - queued for _, _, queued in batch], len(batch))
+            return
+
+        latencies = []
+        for params, future, queued in batch:
+            try:
+                bucket, suggestions = self.cache.suggest(snapshot, snapshot_version, model, model_version, **params)
+                future.set_result({
+                    "snapshot_version": snapshot_version,
+                    "snapshot_timestamp": snapshot.timestamp,
+                    "model_version": model_version,
+                    "starting_gold": params["starting_gold"],
+                    "bucket_gold": bucket,
+                    "suggestions": suggestions,
+                })
+            except Exception as e:
+                errors += 1
+                future.set_exception(e)
+            latencies.append(time.perf_counter() - queued)
+        self.latency.record_batch(latencies, errors)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class SuggestionHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests from the same client.
+    protocol_version = "HTTP/1.1"
+    service = None
+    timeout_seconds = 10
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/suggest":
+            self._suggest(dict(parse_qsl(parts.query)))
+        elif parts.path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        elif parts.path == "/health":
+            snapshot, version = self.service.store.latest_with_version()
+            self._send_json(200 if snapshot is not None else 503, {"snapshot_version": version})
+        else:
+            self._send_json(404, {"error": f"Unknown path {parts.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/suggest":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        self._suggest(params)
+
+    def _suggest(self, params):
+        try:
+            kwargs = parse_suggest_params(params)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        try:
+            result = self.service.suggest(**kwargs, timeout=self.timeout_seconds)
+        except Exception as e:
+            self._send_json(503, {"error": str(e) or type(e).__name__})
+            return
+        self._send_json(200, result)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_suggestions(service, host=None, port=None, socket_path=None):
+    # Starts the HTTP server on a daemon thread, on socket_path if given or
+    # else on host:port (port=0 picks a free port). Returns (server,
+    # address). Call server.shutdown() when done.
+    handler = type("BoundSuggestionHandler", (SuggestionHandler,), {
+        "service": service, "timeout_seconds": Config.SUGGEST_TIMEOUT
+    })
+    if socket_path:
+        if os.path.lexists(socket_path):
+            # Only replace a socket left behind by a previous run, never a
+            # file that happens to be at the path.
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise FileExistsError(f"{socket_path} exists and is not a socket")
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        address = socket_path
+    else:
+        host = host or Config.SUGGEST_HOST
+        server = ThreadingHTTPServer((host, Config.SUGGEST_PORT if port is None else port), handler)
+        server.daemon_threads = True
+        address = f"http://{host}:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, name="suggestion-server", daemon=True)
+    thread.start()
+    return server, address
@@ -0,0 +1,68 @@
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from feature_engine import FeatureEngine, model_inputs, model_schema, schema_of
+from model_registry import ModelRegistry
+from snapshot import FEATURE_COLUMNS, ItemSnapshot
+from suggestion_cache import SuggestionCache
+from utils import build_pipeline, predict_profit, prepare_training_data
+
+
+def _snapshots(items=50, ticks=12, seed=0):
+    rng = np.random.default_rng(seed)
+    item_ids = np.arange(1, items + 1)
+    base = rng.uniform(100, 10000, items)
+    snapshots = []
+    for tick in range(ticks):
+        high = np.trunc(base * rng.uniform(1.0, 1.1, items))
+        low = np.trunc(base * rng.uniform(0.9, 1.0, items))
+        columns = {
+            "high_price": high, "low_price": low,
+            "high_volume": rng.integers(0, 100, items), "low_volume": rng.integers(0, 100, items),
+            "avg_price_5m": high, "price_fluctuation": np.zeros(items),
+            "buy_limit": np.full(items, 100), "roi": (high * 0.99 - low) / high,
+        }
+        features = np.column_stack([columns[name] for name in FEATURE_COLUMNS]).astype(np.float64)
+        names = [f"Item {item_id}" for item_id in item_ids]
+        snapshots.append(ItemSnapshot(item_ids, names, features, high * 0.99 - low, tick * 300))
+    return snapshots
+
+
+def _engine(snapshots):
+    engine = FeatureEngine()
+    for snapshot in snapshots:
+        engine.update(snapshot)
+    return engine
+
+
+def test_training_with_engine_records_stream_schema(tmp_path):
+    snapshots = _snapshots()
+    engine = _engine(snapshots)
+    X, y = prepare_training_data(snapshots[-1], engine)
+    assert X.shape[1] == len(model_schema(stream=True))
+    model = build_pipeline(RandomForestRegressor(n_estimators=5, random_state=0)).fit(X, y)
+    assert schema_of(model) == model_schema(stream=True)
+
+    registry = ModelRegistry(str(tmp_path / "model.pkl"))
+    metadata = registry.publish(model)
+    assert metadata["feature_schema"] == model_schema(stream=True)
+    assert ModelRegistry(registry.model_file).get(kind="regressor") is not None
+
+
+def test_suggestions_use_engine_features():
+    snapshots = _snapshots()
+    engine = _engine(snapshots)
+    latest = snapshots[-1]
+    X, y = prepare_training_data(latest, engine)
+    model = build_pipeline(RandomForestRegressor(n_estimators=5, random_state=0)).fit(X, y)
+
+    cache = SuggestionCache(feature_engine=engine)
+    predictions = cache.get_predictions(latest, 1, model, 1)
+    expected = predict_profit(model, model_inputs(latest, schema_of(model), engine))
+    np.testing.assert_allclose(predictions, expected)
+
+
+def test_training_without_engine_keeps_snapshot_schema():
+    X, _ = prepare_training_data(_snapshots(ticks=1)[0])
+    assert X.shape[1] == len(FEATURE_COLUMNS)
+    assert model_inputs(_snapshots(ticks=1)[0], model_schema()).shape[1] == len(FEATURE_COLUMNS)
@@ -0,0 +1,47 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from inference import export_model
+
+
+def _data(rows=500, features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features))
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=rows)
+    return X, y
+
+
+def _assert_matches(regressor, X, y):
+    model = Pipeline([("scaler", StandardScaler()), ("regressor", regressor)]).fit(X, y)
+    compiled = export_model(model)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=1e-9, atol=1e-9)
+    return compiled
+
+
+def test_depth_zero_constant_target():
+    X, _ = _data()
+    compiled = _assert_matches(DecisionTreeRegressor(), X, np.full(len(X), 7.5))
+    assert compiled.depth == 0
+
+
+def test_depth_zero_forest_and_boosting():
+    X, _ = _data()
+    y = np.full(len(X), -2.0)
+    _assert_matches(RandomForestRegressor(n_estimators=5, random_state=0), X, y)
+    _assert_matches(GradientBoostingRegressor(n_estimators=5, random_state=0), X, y)
+
+
+def test_depth_one():
+    X, y = _data()
+    compiled = _assert_matches(GradientBoostingRegressor(n_estimators=20, max_depth=1, random_state=0), X, y)
+    assert compiled.depth == 1
+    _assert_matches(DecisionTreeRegressor(max_depth=1), X, y)
+
+
+def test_deep_forest_with_missing_values():
+    X, y = _data()
+    X[::7, 2] = np.nan
+    _assert_matches(RandomForestRegressor(n_estimators=10, random_state=0), X, y)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from inference import MLPPolicy
+from osrs_rl.rollout import collect_episodes, init_worker
+from snapshot import FEATURE_COLUMNS, ItemSnapshot
+
+
+def _snapshot(items=20, seed=0):
+    rng = np.random.default_rng(seed)
+    features = rng.uniform(1, 1000, (items, len(FEATURE_COLUMNS)))
+    names = [f"Item {item_id}" for item_id in range(1, items + 1)]
+    return ItemSnapshot(np.arange(1, items + 1), names, features, rng.normal(0, 50, items), 0)
+
+
+def test_collect_episodes_keeps_only_requested_episodes():
+    snapshot = _snapshot()
+    init_worker(snapshot, 8)
+    rng = np.random.default_rng(1)
+    policy = MLPPolicy([(rng.normal(size=(9, 2)), np.zeros(2), "linear")])
+
+    (states, actions, rewards, next_states, dones), final_cash = collect_episodes(policy, 0.1, 0, episodes=3)
+    assert final_cash.shape == (3,)
+    assert states.shape == (len(snapshot) * 3, 9)
+    assert len(actions) == len(rewards) == len(dones) == len(next_states) == len(snapshot) * 3
+    assert dones.sum() == 3
+
+    _, final_cash = collect_episodes(policy, 0.1, 0)
+    assert final_cash.shape == (8,)
@@ -0,0 +1,106 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import mapping_cache
+from api_client import OSRSApiClient
+from backfill import Backfiller
+from config import Config
+from data_manager import DataManager
+from fixture_server import serve_fixtures
+from mapping_cache import MappingCache
+from OSRSScraper import OSRSScraper
+
+# Small payloads in the format of the prices API: five traded items, plus
+# one (id 6) that appears in /latest without a /5m trade.
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+ITEM_IDS = [2, 453, 554, 561, 11832]
+
+
+@pytest.fixture
+def fixture_api(tmp_path):
+    # (config, requests, fixture_dir): a Config pointing at a fixture server
+    # over a copy of the fixtures, with its files under tmp_path.
+    fixture_dir = tmp_path / "fixtures"
+    shutil.copytree(FIXTURES, fixture_dir)
+    requests = []
+    server, base_url = serve_fixtures(str(fixture_dir), requests=requests)
+    config = type("FixtureConfig", (Config,), {
+        "API_BASE_URL": base_url,
+        "DB_FILE": str(tmp_path / "osrs_data.db"),
+        "MAPPING_CACHE_FILE": str(tmp_path / "item_mapping.cache"),
+        "BACKFILL_CHECKPOINT_FILE": str(tmp_path / "backfill_checkpoint.json"),
+        "BACKFILL_RATE": 0,
+    })
+    yield config, requests, fixture_dir
+    server.shutdown()
+    server.server_close()
+    mapping_cache._memory_cache.pop(config.MAPPING_CACHE_FILE, None)
+
+
+def _count(db_file, table):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_second_scrape_writes_no_ticks(fixture_api, monkeypatch):
+    config, requests, _ = fixture_api
+    stats = []
+    save_changes = DataManager.save_snapshot_changes
+
+    def recording_save(self, *args, **kwargs):
+        stats.append(save_changes(self, *args, **kwargs))
+        return stats[-1]
+
+    monkeypatch.setattr(DataManager, "save_snapshot_changes", recording_save)
+    scraper = OSRSScraper(config)
+    snapshot = scraper.scrape_data()
+    assert sorted(snapshot.item_ids.tolist()) == ITEM_IDS
+    assert snapshot.timestamp == 1700000100
+    assert _count(config.DB_FILE, "prices") == len(ITEM_IDS)
+
+    # Same /5m window: nothing changed, in this scraper or a fresh one that
+    # starts from the items table.
+    scraper.scrape_data()
+    OSRSScraper(config).scrape_data()
+    assert [(s["items_changed"], s["ticks_written"]) for s in stats] == [(5, 5), (0, 0), (0, 0)]
+    assert [path for path, _ in requests].count("/mapping") == 1
+
+
+def test_mapping_warm_start_revalidates_with_etag(fixture_api):
+    config, requests, _ = fixture_api
+    with OSRSApiClient(config.API_BASE_URL) as client:
+        mapping = MappingCache(config.MAPPING_CACHE_FILE, ttl=0).get_mapping(client)
+        assert sorted(mapping) == ITEM_IDS
+
+        # A new process: nothing in memory, a stale copy with its ETag on disk.
+        mapping_cache._memory_cache.pop(config.MAPPING_CACHE_FILE)
+        warm = MappingCache(config.MAPPING_CACHE_FILE, ttl=0).get_mapping(client)
+    assert warm == mapping
+    assert requests == [("/mapping", 200), ("/mapping", 304)]
+
+
+def test_backfill_retries_only_failed_items(fixture_api, tmp_path):
+    config, requests, fixture_dir = fixture_api
+    missing = fixture_dir / "timeseries_id=561_timestep=5m.json"
+    held = tmp_path / missing.name
+    shutil.move(missing, held)
+
+    client = OSRSApiClient(config.API_BASE_URL, max_retries=1)
+    summary = Backfiller(config, api_client=client, concurrency=2).run()
+    assert summary["5m"]["failed"] == 1
+    assert summary["5m"]["items"] == len(ITEM_IDS) - 1
+    # Four points per item, one of them without a low price.
+    assert _count(config.DB_FILE, "prices") == 4 * (len(ITEM_IDS) - 1)
+
+    shutil.move(held, missing)
+    del requests[:]
+    summary = Backfiller(config, api_client=client, concurrency=2).run()
+    assert (summary["5m"]["items"], summary["5m"]["failed"], summary["5m"]["rows"]) == (1, 0, 4)
+    assert [path for path, _ in requests if path.startswith("/timeseries")] == ["/timeseries?timestep=5m&id=561"]
+    assert _count(config.DB_FILE, "prices") == 4 * len(ITEM_IDS)
@@ -1,90 +1,138 @@
 import numpy as np
 import pickle
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error
-
-def generate_item_suggestions(items_data, starting_gold, model):
+from allocation import allocate, quantity_bounds
+from config import Config
+from feature_engine import model_inputs, model_schema, schema_of
+from inference import CompiledRegressor, FallbackRegressor
+from model_registry import unwrap_model
+from snapshot import ItemSnapshot
+
+# scikit-learn is imported where it is needed, so suggesting with a compiled
+# model (see inference.py) never loads it.
+
+def is_pipeline(model):
+    from sklearn.pipeline import Pipeline
+
+    return isinstance(model, Pipeline)
+
+def build_pipeline(regressor):
+    # The scaler is fitted on training data and persisted with the model, so
+    # inference never depends on which items happen to be in a snapshot.
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("regressor", regressor)
+    ])
+
+def predict_profit(model, X):
+    # Compiled models carry the pipeline's scaler.
+    if isinstance(model, (CompiledRegressor, FallbackRegressor)) or is_pipeline(model):
+        return model.predict(X)
+    # Models saved before pipelines were introduced expect per-batch scaling.
+    from sklearn.preprocessing import StandardScaler
+
+    print("Model has no fitted preprocessing; scaling this batch. Retrain to persist a pipeline.")
+    return model.predict(StandardScaler().fit_transform(X))
+
+def generate_item_suggestions(items_data, starting_gold, model, top_k=5, method=None, max_share=None, feature_engine=None):
+    # Filters items with the model (or potential profit without one), then
+    # spreads starting_gold over at most top_k of them with allocate(), so
+    # the suggested quantities fit the budget together. feature_engine
+    # supplies the streaming features of models trained with them.
     try:
         print("Generating item suggestions...")
-        X = []
-        for item in items_data:
-            X.append([
-                item["high_price"],
-                item["low_price"],
-                item["high_volume"],
-                item["low_volume"],
-                item["avg_price_5m"],
-                item["price_fluctuation"],
-                item["buy_limit"],
-                item["roi"]
-            ])
-
-        X = np.array(X)
-        print(f"Shape of feature matrix X: {X.shape}")
-
-        scaler = StandardScaler()
-        X_normalized = scaler.fit_transform(X)
-        print(f"Shape of normalized feature matrix X_normalized: {X_normalized.shape}")
+        snapshot = ItemSnapshot.from_items(items_data)
 
+        predictions = None
         if model is None:
             print("No model available. Generating default suggestions based on potential profit.")
-            suggestions = []
-            for item in items_data:
-                if item["potential_profit"] > 0:
-                    buy_limit = item["buy_limit"]
-                    buy_price = item["low_price"]
-                    max_quantity = min(buy_limit, starting_gold // buy_price, 1000)  # Limit max quantity to 1000
-                    item["Max Quantity"] = max_quantity
-                    item["Total Profit"] = item["potential_profit"] * max_quantity
-                    if item["Total Profit"] > 1000000:  # Filter out suggestions with total profit over 1 million
-                        suggestions.append(item)
         else:
             try:
-                predictions = model.predict(X_normalized)
-                suggestions = []
-                for i, item in enumerate(items_data):
-                    prediction = predictions[i]
-                    if prediction > 0:
-                        item["Predicted Profit"] = prediction
-                        buy_limit = item["buy_limit"]
-                        buy_price = item["low_price"]
-                        max_quantity = min(buy_limit, starting_gold // buy_price, 1000)  # Limit max quantity to 1000
-                        item["Max Quantity"] = max_quantity
-                        item["Total Profit"] = item["potential_profit"] * max_quantity
-                        if item["Total Profit"] > 100:  
-                            suggestions.append(item)
+                X = model_inputs(snapshot, schema_of(model), feature_engine)
+                print(f"Shape of feature matrix X: {X.shape}")
+                predictions = predict_profit(model, X)
             except Exception as e:
                 print(f"Error occurred during model prediction: {e}")
-                suggestions = []
-
-        suggestions.sort(key=lambda x: x["Total Profit"], reverse=True)
-        return suggestions[:5]
+                return []
+        return suggest_for_gold(snapshot, predictions, starting_gold, top_k, method, max_share)
     except Exception as e:
         print(f"Error occurred in generate_item_suggestions: {e}")
         return []
 
-def prepare_training_data(items_data):
+def suggest_for_gold(snapshot, predictions, starting_gold, top_k=5, method=None, max_share=None):
+    # The part of generate_item_suggestions after prediction, so callers
+    # holding predictions for a snapshot can size baskets for any amount of
+    # gold without predicting again. predictions=None ranks by potential
+    # profit alone.
+    return suggest_for_budgets(snapshot, predictions, [starting_gold], top_k, method, max_share)[0]
+
+def suggest_for_budgets(snapshot, predictions, budgets, top_k=5, method=None, max_share=None):
+    # suggest_for_gold for every budget at once. Returns one suggestion list
+    # per budget. Quantity bounds, Max Quantity and Total Profit are
+    # (budgets, items) arrays; only the basket itself is chosen per budget,
+    # because each budget is its own knapsack (greedy takes items against
+    # the gold still left, exact searches per budget). Profit thresholds
+    # apply to the allocated quantities: what an item earns depends on what
+    # else shares the budget, so only the sign of its (predicted) profit
+    # filters it beforehand.
+    budgets = np.asarray(budgets, dtype=np.float64)
+    potential_profit = snapshot.potential_profit
+    mask = potential_profit > 0 if predictions is None else predictions > 0
+    upper = np.where(mask, quantity_bounds(snapshot, budgets[:, None], max_share=max_share), 0)
+    buy_price = snapshot.column("low_price")
+
+    quantities = np.zeros(upper.shape)
+    for row, (budget, budget_upper) in enumerate(zip(budgets, upper)):
+        basket = allocate(potential_profit, buy_price, budget_upper, budget, max_items=top_k, method=method)
+        quantities[row, basket.rows] = basket.quantities
+    total_profit = quantities * potential_profit
+    keep = (quantities > 0) & (total_profit >= Config.ALLOCATION_MIN_ITEM_PROFIT)
+
+    results = []
+    for budget_quantities, budget_profit, budget_keep in zip(quantities, total_profit, keep):
+        rows = np.flatnonzero(budget_keep)
+        suggestions = []
+        for row in rows[np.argsort(-budget_profit[rows], kind="stable")]:
+            item = snapshot.row(row)
+            if predictions is not None:
+                item["Predicted Profit"] = float(predictions[row])
+            item["Max Quantity"] = int(budget_quantities[row])
+            item["Total Profit"] = float(budget_profit[row])
+            suggestions.append(item)
+        results.append(suggestions)
+    return results
+
+def sweep_budgets(items_data, budgets, model, top_k=5, method=None, max_share=None, feature_engine=None):
+    # generate_item_suggestions for a ladder of budgets from one
+    # prediction. Returns one suggestion list per budget.
+    try:
+        print(f"Generating item suggestions for {len(budgets)} budgets...")
+        snapshot = ItemSnapshot.from_items(items_data)
+        predictions = None
+        if model is None:
+            print("No model available. Generating default suggestions based on potential profit.")
+        else:
+            try:
+                predictions = predict_profit(model, model_inputs(snapshot, schema_of(model), feature_engine))
+            except Exception as e:
+                print(f"Error occurred during model prediction: {e}")
+                return [[] for _ in budgets]
+        return suggest_for_budgets(snapshot, predictions, budgets, top_k, method, max_share)
+    except Exception as e:
+        print(f"Error occurred in sweep_budgets: {e}")
+        return [[] for _ in budgets]
+
+def prepare_training_data(items_data, feature_engine=None):
+    # With a feature_engine that has seen the items, the streaming features
+    # are appended and the model is published with that feature schema.
     try:
         print("Preparing training data...")
-        X = []
-        y = []
-        for item in items_data:
-            X.append([
-                item["high_price"],
-                item["low_price"],
-                item["high_volume"],
-                item["low_volume"],
-                item["avg_price_5m"],
-                item["price_fluctuation"],
-                item["buy_limit"],
-                item["roi"]
-            ])
-            y.append(item["potential_profit"])
-
-        X = np.array(X)
-        y = np.array(y)
+        snapshot = ItemSnapshot.from_items(items_data)
+        stream = feature_engine is not None and len(feature_engine) > 0
+        X = model_inputs(snapshot, model_schema(stream=stream), feature_engine)
+        y = snapshot.potential_profit.copy()
 
         # Handle NaN or infinite values in y
         valid_indices = np.isfinite(y)
@@ -100,53 +148,36 @@ def prepare_training_data(items_data):
         print(f"Error occurred in prepare_training_data: {e}")
         return None, None
 
-def train_model(items_data, epochs=2):
+def train_model(items_data, epochs=None, search=None, feature_engine=None):
+    # epochs is accepted for backwards compatibility only: refitting the same
+    # estimator on the same data repeatedly does not change it.
+    from sklearn.metrics import mean_absolute_error
+    from sklearn.model_selection import train_test_split
+    from model_search import HyperparameterSearch
+
     try:
         print("Training model...")
-        X, y = prepare_training_data(items_data)
+        X, y = prepare_training_data(items_data, feature_engine)
         if X is None or y is None:
             print("Error occurred during data preparation. Aborting model training.")
             return None
 
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        models = [
-            RandomForestRegressor(random_state=42),
-            GradientBoostingRegressor(random_state=42)
-        ]
-
-        param_grid = {
-            'n_estimators': [50, 100, 200],
-            'max_depth': [None, 5, 10],
-            'min_samples_split': [2, 5, 10],
-            'min_samples_leaf': [1, 2, 4]
-        }
-
-        best_model = None
-        best_params = None
-        best_score = np.inf
-
-        for model in models:
-            grid_search = GridSearchCV(estimator=model, param_grid=param_grid, cv=5, scoring='neg_mean_absolute_error')
-            grid_search.fit(X_train, y_train)
-            best_params_current = grid_search.best_params_
-            best_score_current = -grid_search.best_score_
-
-            if best_score_current < best_score:
-                best_model = model
-                best_params = best_params_current
-                best_score = best_score_current
-
-        if best_model is not None:
-            best_model.set_params(**best_params)
-            for _ in range(epochs):
-                best_model.fit(X_train, y_train)
-
-            y_pred = best_model.predict(X_test)
-            mae = mean_absolute_error(y_test, y_pred)
-            print(f"Best Model: {type(best_model).__name__}")
-            print(f"Best Parameters: {best_params}")
-            print(f"Mean Absolute Error: {mae}")
+        search = search or HyperparameterSearch(build_pipeline)
+        result = search.search(X_train, y_train)
+        if result is None:
+            print("Hyperparameter search produced no model.")
+            return None
+
+        best_model = search.build_best(result)
+        best_model.fit(X_train, y_train)
+
+        y_pred = best_model.predict(X_test)
+        mae = mean_absolute_error(y_test, y_pred)
+        print(f"Best Model: {result['model']}")
+        print(f"Best Parameters: {result['params']}")
+        print(f"Mean Absolute Error: {mae}")
 
         return best_model
     except Exception as e:
@@ -165,11 +196,29 @@ def format_suggestions(suggestions):
         print(f"Error occurred in format_suggestions: {e}")
         return ""
 
+def format_budget_sweep(budgets, results):
+    # Budget-sensitivity table: one line per budget with what its basket
+    # spends and earns.
+    try:
+        lines = [f"{'Budget':>15}  {'Items':>5}  {'Spent':>15}  {'Total Profit':>13}  {'Return':>7}  Largest Item"]
+        for budget, suggestions in zip(budgets, results):
+            spent = sum(item["low_price"] * item["Max Quantity"] for item in suggestions)
+            profit = sum(item["Total Profit"] for item in suggestions)
+            largest = max(suggestions, key=lambda item: item["Total Profit"])["Item Name"] if suggestions else "-"
+            lines.append(
+                f"{budget:>15,.0f}  {len(suggestions):>5}  {spent:>15,.0f}  {profit:>13,.0f}  "
+                f"{profit / budget * 100:>6.2f}%  {largest}"
+            )
+        return "\n".join(lines)
+    except Exception as e:
+        print(f"Error occurred in format_budget_sweep: {e}")
+        return ""
+
 def load_model(model_file):
     try:
         print(f"Loading model from file: {model_file}")
         with open(model_file, "rb") as file:
-            model = pickle.load(file)
+            model, _ = unwrap_model(pickle.load(file))
         return model
     except FileNotFoundError:
         print(f"Model file not found: {model_file}")